@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Request, Depends
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Request, Depends, Form
+from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-from app.api.deps import get_current_active_superuser, get_db
+from app.api.deps import get_current_active_superuser, get_async_db, get_db
 from app.main import templates
 from app.models.user_model import User
 from app.models.service_model import Service
 from app.models.ticket import Ticket
-from sqlalchemy.orm import Session
+from app.models.subscription import Plan
+from app.crud import announcements as crud_announcements
+from sqlalchemy.orm import Session, joinedload
 
 router = APIRouter(
     prefix="/admin",
@@ -15,10 +20,10 @@ router = APIRouter(
 )
 
 @router.get("/dashboard", response_class=HTMLResponse)
-async def get_admin_dashboard(request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_active_superuser)):
-    total_users = db.query(User).count()
-    total_services = db.query(Service).count()
-    total_tickets = db.query(Ticket).count()
+async def get_admin_dashboard(request: Request, db: AsyncSession = Depends(get_async_db), user: User = Depends(get_current_active_superuser)):
+    total_users = await db.scalar(select(func.count()).select_from(User))
+    total_services = await db.scalar(select(func.count()).select_from(Service))
+    total_tickets = await db.scalar(select(func.count()).select_from(Ticket))
 
     stats = {
         "total_users": total_users,
@@ -29,42 +34,33 @@ async def get_admin_dashboard(request: Request, db: Session = Depends(get_db), u
     return templates.TemplateResponse("admin/dashboard.html", {"request": request, "user": user, "stats": stats})
 
 @router.get("/tickets", response_class=HTMLResponse)
-async def get_admin_tickets_page(request: Request, db: Session = Depends(get_db)):
-    tickets = db.query(Ticket).order_by(Ticket.created_at.desc()).all()
+async def get_admin_tickets_page(request: Request, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(Ticket).options(joinedload(Ticket.owner)).order_by(Ticket.created_at.desc()))
+    tickets = result.scalars().all()
     return templates.TemplateResponse("admin/tickets.html", {"request": request, "tickets": tickets})
 
 @router.get("/announcements", response_class=HTMLResponse)
-async def get_admin_announcements_page(request: Request, db: Session = Depends(get_db)):
-    announcements = db.query(Announcement).order_by(Announcement.created_at.desc()).all()
+def get_admin_announcements_page(request: Request, db: Session = Depends(get_db)):
+    announcements = crud_announcements.list_announcements(db)
     return templates.TemplateResponse("admin/announcements.html", {"request": request, "announcements": announcements})
 
 @router.post("/announcements")
-async def handle_create_announcement(
-    request: Request,
+def handle_create_announcement(
     content: str = Form(...),
-    is_active: bool = Form(True)
+    is_active: bool = Form(True),
+    db: Session = Depends(get_db)
 ):
-    cookies = request.cookies
-    api_url = f"{get_api_base_url(request)}/api/v1/announcements/"
-    async with httpx.AsyncClient() as client:
-        await client.post(
-            api_url,
-            json={"content": content, "is_active": is_active},
-            cookies=cookies,
-        )
+    crud_announcements.create_announcement(db, content, is_active)
     return RedirectResponse(url="/admin/announcements", status_code=303)
 
 @router.post("/announcements/{announcement_id}/delete")
-async def handle_delete_announcement(request: Request, announcement_id: str):
-    cookies = request.cookies
-    api_url = f"{get_api_base_url(request)}/api/v1/announcements/{announcement_id}"
-    async with httpx.AsyncClient() as client:
-        await client.delete(api_url, cookies=cookies)
+def handle_delete_announcement(announcement_id: str, db: Session = Depends(get_db)):
+    crud_announcements.delete_announcement(db, announcement_id)
     return RedirectResponse(url="/admin/announcements", status_code=303)
 
 @router.get("/plans", response_class=HTMLResponse)
-async def get_admin_plans_page(request: Request, db: Session = Depends(get_db)):
-    plans = db.query(Plan).all()
+async def get_admin_plans_page(request: Request, db: AsyncSession = Depends(get_async_db)):
+    plans = (await db.execute(select(Plan))).scalars().all()
     return templates.TemplateResponse("admin/plans.html", {"request": request, "plans": plans})
 
 @router.post("/plans")
@@ -85,6 +81,6 @@ async def handle_create_plan(
         name=name, price=price, stripe_price_id=stripe_price_id,
         ram_mb=ram_mb, cpu_vcore=cpu_vcore, disk_gb=disk_gb, max_services=max_services
     )
-    create_plan_logic(args)
+    await run_in_threadpool(create_plan_logic, args) # Uses its own sync session
 
     return RedirectResponse(url="/admin/plans", status_code=303)
\ No newline at end of file
@@ -1,10 +1,10 @@
-import uuid
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 from typing import List
 
 from app.api.deps import get_db, get_current_active_superuser
-from app.models.announcement import Announcement
+from app.core import announcement_cache
+from app.crud import announcements as crud_announcements
 from app.schemas.announcement import Announcement as AnnouncementSchema, AnnouncementCreate, AnnouncementUpdate
 
 router = APIRouter()
@@ -14,8 +14,7 @@ def list_active_announcements(db: Session = Depends(get_db)):
     """
     List all active announcements.
     """
-    announcements = db.query(Announcement).filter(Announcement.is_active == True).all()
-    return announcements
+    return announcement_cache.get_active_announcements(db)
 
 @router.post("/", response_model=AnnouncementSchema, status_code=status.HTTP_201_CREATED, dependencies=[Depends(get_current_active_superuser)])
 def create_announcement(
@@ -26,15 +25,7 @@ def create_announcement(
     """
     Create a new announcement (Superuser only).
     """
-    new_announcement = Announcement(
-        id=str(uuid.uuid4()),
-        content=announcement_in.content,
-        is_active=announcement_in.is_active
-    )
-    db.add(new_announcement)
-    db.commit()
-    db.refresh(new_announcement)
-    return new_announcement
+    return crud_announcements.create_announcement(db, announcement_in.content, announcement_in.is_active)
 
 @router.put("/{announcement_id}", response_model=AnnouncementSchema, dependencies=[Depends(get_current_active_superuser)])
 def update_announcement(
@@ -46,18 +37,8 @@ def update_announcement(
     """
     Update an announcement (Superuser only).
     """
-    announcement = db.query(Announcement).filter(Announcement.id == announcement_id).first()
-    if not announcement:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Announcement not found")
-
     update_data = announcement_in.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(announcement, field, value)
-
-    db.add(announcement)
-    db.commit()
-    db.refresh(announcement)
-    return announcement
+    return crud_announcements.update_announcement(db, announcement_id, update_data)
 
 @router.delete("/{announcement_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(get_current_active_superuser)])
 def delete_announcement(
@@ -68,10 +49,5 @@ def delete_announcement(
     """
     Delete an announcement (Superuser only).
     """
-    announcement = db.query(Announcement).filter(Announcement.id == announcement_id).first()
-    if not announcement:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Announcement not found")
-
-    db.delete(announcement)
-    db.commit()
+    crud_announcements.delete_announcement(db, announcement_id)
     return
\ No newline at end of file
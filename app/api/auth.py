@@ -1,11 +1,12 @@
 from authlib.integrations.starlette_client import OAuth, OAuthError
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 from starlette.responses import RedirectResponse
 
-from app.api.deps import get_db
+from app.api.deps import get_async_db
+from app.core import user_cache
 from app.core.config import settings
 from app.models.user_model import User
 from app.models.subscription import Plan, Subscription, SubscriptionStatus
@@ -31,7 +32,7 @@ async def login(request: Request):
     return await oauth.discord.authorize_redirect(request, redirect_uri)
 
 @router.get('/auth', name='auth_callback')
-async def auth_callback(request: Request, db: Session = Depends(get_db)):
+async def auth_callback(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Callback endpoint for Discord OAuth.
     Exchanges the authorization code for an access token, fetches user info,
@@ -53,7 +54,7 @@ async def auth_callback(request: Request, db: Session = Depends(get_db)):
 
     # Check if user exists
     statement = select(User).where(User.discord_id == discord_id)
-    db_user = db.execute(statement).scalars().first()
+    db_user = (await db.execute(statement)).scalars().first()
 
     if db_user:
         # Update existing user
@@ -69,10 +70,10 @@ async def auth_callback(request: Request, db: Session = Depends(get_db)):
             avatar=profile.get('avatar'),
         )
         db.add(db_user)
-        db.flush() # Flush to get the user ID
+        await db.flush() # Flush to get the user ID
 
         # Assign free plan on registration
-        free_plan = db.query(Plan).filter(Plan.name == "Free").first()
+        free_plan = (await db.execute(select(Plan).where(Plan.name == "Free"))).scalars().first()
         if free_plan:
             new_subscription = Subscription(
                 user_id=db_user.id,
@@ -83,8 +84,9 @@ async def auth_callback(request: Request, db: Session = Depends(get_db)):
             )
             db.add(new_subscription)
 
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    user_cache.invalidate(db_user.id) # Profile may have changed on this login
 
     # Store our internal user ID in the session
     request.session['user_id'] = db_user.id
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.api.deps import get_db, get_current_user
 from app.models.user_model import User
-from app.models.service import Service
 from app.models.backup import Backup
-from app.schemas.backup import Backup as BackupSchema
+from app.schemas.backup import Backup as BackupSchema, BackupCreate, BackupRestore
+from app.schemas.job import Job as JobSchema
 from app.core import backup_manager
+from app.crud import services as crud_services, backups as crud_backups
 
 router = APIRouter()
 
@@ -18,73 +19,66 @@ def list_backups_for_service(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    service = db.query(Service).filter(Service.id == service_id, Service.owner_id == current_user.id).first()
-    if not service:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
-
+    crud_services.get_service_for_user(db, service_id, current_user)
     return db.query(Backup).filter(Backup.service_id == service_id).all()
 
-@router.post("/services/{service_id}/backups", response_model=BackupSchema, status_code=status.HTTP_201_CREATED)
+@router.post("/services/{service_id}/backups", response_model=JobSchema, status_code=status.HTTP_202_ACCEPTED)
 def create_service_backup(
     service_id: int,
+    backup_in: Optional[BackupCreate] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    service = db.query(Service).filter(Service.id == service_id, Service.owner_id == current_user.id).first()
-    if not service:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
-
-    try:
-        filename, size_bytes = backup_manager.create_backup(service.id)
-
-        new_backup = Backup(
-            service_id=service.id,
-            filename=filename,
-            size_bytes=size_bytes
-        )
-        db.add(new_backup)
-        db.commit()
-        db.refresh(new_backup)
-        return new_backup
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create backup: {e}")
-
-@router.get("/backups/{backup_id}/download", response_class=FileResponse)
+    """
+    Start a backup of the service. The body may pick a codec (zstd, gzip or
+    none) and level. Poll the returned job for the result.
+    """
+    service = crud_services.get_service_for_user(db, service_id, current_user)
+    backup_in = backup_in or BackupCreate()
+    return crud_backups.create_backup(db, service, current_user, codec=backup_in.codec, level=backup_in.level)
+
+@router.get("/backups/{backup_id}/download")
 def download_backup(
     backup_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    backup = db.query(Backup).filter(Backup.id == backup_id).first()
-    if not backup:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Backup not found")
-
-    service = db.query(Service).filter(Service.id == backup.service_id, Service.owner_id == current_user.id).first()
-    if not service:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    """
+    Download a backup as a tar.gz. Deduplicated backups are assembled from
+    their chunks while streaming.
+    """
+    backup = crud_backups.get_backup_for_user(db, backup_id, current_user)
+    if backup_manager.is_legacy_backup(backup.filename):
+        backup_path = backup_manager.get_backup_path(backup.service_id, backup.filename)
+        return FileResponse(path=backup_path, filename=backup.filename, media_type='application/gzip')
 
-    backup_path = backup_manager.get_backup_path(backup.service_id, backup.filename)
-    return FileResponse(path=backup_path, filename=backup.filename, media_type='application/gzip')
-
-@router.post("/backups/{backup_id}/restore", status_code=status.HTTP_200_OK)
+    try:
+        archive = backup_manager.iter_backup_archive(backup.service_id, backup.filename)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Backup file not found")
+    except backup_manager.BackupBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    archive_name = backup_manager.get_archive_name(backup.filename)
+    return StreamingResponse(
+        archive,
+        media_type='application/gzip',
+        headers={"Content-Disposition": f'attachment; filename="{archive_name}"'},
+    )
+
+@router.post("/backups/{backup_id}/restore", response_model=JobSchema, status_code=status.HTTP_202_ACCEPTED)
 def restore_service_from_backup(
     backup_id: int,
+    restore_in: Optional[BackupRestore] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    backup = db.query(Backup).filter(Backup.id == backup_id).first()
-    if not backup:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Backup not found")
-
-    service = db.query(Service).filter(Service.id == backup.service_id, Service.owner_id == current_user.id).first()
-    if not service:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
-
-    try:
-        backup_manager.restore_from_backup(backup.service_id, backup.filename)
-        return {"status": "success", "detail": f"Service {service.id} restored from backup {backup.id}"}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to restore backup: {e}")
+    """
+    Start restoring the service from a backup. With a `path` in the body only
+    that file or directory is restored. Poll the returned job for the result.
+    """
+    backup = crud_backups.get_backup_for_user(db, backup_id, current_user)
+    path = restore_in.path if restore_in else None
+    return crud_backups.restore_backup(db, backup, current_user, path=path)
 
 @router.delete("/backups/{backup_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_backup(
@@ -92,18 +86,14 @@ def delete_backup(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    backup = db.query(Backup).filter(Backup.id == backup_id).first()
-    if not backup:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Backup not found")
-
-    service = db.query(Service).filter(Service.id == backup.service_id, Service.owner_id == current_user.id).first()
-    if not service:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    backup = crud_backups.get_backup_for_user(db, backup_id, current_user)
 
     try:
-        backup_manager.delete_backup_file(backup.service_id, backup.filename)
+        backup_manager.delete_backup(backup.service_id, backup.filename)
         db.delete(backup)
         db.commit()
         return
+    except backup_manager.BackupBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to delete backup: {e}")
\ No newline at end of file
@@ -1,19 +1,49 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from fastapi import Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from starlette.requests import Request
+from starlette.requests import HTTPConnection, Request
 
-from app.db.session import SessionLocal
+from app.db.session import AsyncSessionLocal, SessionLocal
 from app.models.user_model import User
+from app.core import announcement_cache, user_cache
 
-def get_db() -> Generator:
+# HTTP requests get one session, created by db_session_middleware (app/main.py)
+# and closed by it once the response is sent, so every dependency and the
+# handler share a unit of work. Websockets bypass that middleware and get a
+# session of their own.
+
+def get_db(connection: HTTPConnection) -> Generator:
+    db = getattr(connection.state, "db", None)
+    if db is not None:
+        yield db
+        return
+    db = SessionLocal()
     try:
-        db = SessionLocal()
         yield db
     finally:
         db.close()
 
-from sqlalchemy import select
+async def get_async_db(connection: HTTPConnection) -> AsyncGenerator:
+    """
+    Session for async routes; queries must be awaited.
+    """
+    if hasattr(connection.state, "db"):
+        # Created on first use; the middleware closes it with the sync one
+        db = getattr(connection.state, "async_db", None)
+        if db is None:
+            db = connection.state.async_db = AsyncSessionLocal()
+        yield db
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_announcements(db: Session = Depends(get_db)) -> list:
+    """
+    Active announcements for the banner in rendered pages, served from the
+    in-process cache.
+    """
+    return announcement_cache.get_active_announcements(db)
 
 def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
     user_id = request.session.get("user_id")
@@ -24,8 +54,7 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    statement = select(User).where(User.id == user_id)
-    user = db.execute(statement).scalars().first()
+    user = user_cache.get_user(db, user_id)
 
     if not user:
         # This might happen if the user was deleted after the session was created
@@ -37,6 +66,20 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
 
     return user
 
+async def get_current_user_async(connection: HTTPConnection, db: AsyncSession = Depends(get_async_db)) -> User:
+    """
+    get_current_user for async routes and websockets.
+    """
+    user_id = connection.session.get("user_id")
+    user = await user_cache.get_user_async(db, user_id) if user_id else None
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated" if not user_id else "User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
 def get_current_active_superuser(
     current_user: User = Depends(get_current_user),
 ) -> User:
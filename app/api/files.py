@@ -1,66 +1,276 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from fastapi.responses import StreamingResponse
-from typing import List
-import io
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Query
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+import itertools
+import json
+import posixpath
+from datetime import datetime, timezone
+from typing import Iterator, Optional
 
 from app.api.deps import get_db, get_current_user
 from app.models.user_model import User
-from app.models.service import Service
-from app.schemas.file import FileItem
-from app.core import file_manager
+from app.models.service_model import Service
+from app.schemas.file import FileListing, SearchResults, UploadCreate, UploadStatus
+from app.api.responses import RangeFileResponse
+from app.core import file_manager, search_index
+from app.crud import services as crud_services
 
 router = APIRouter()
 
-def get_service_for_user(service_id: int, db = Depends(get_db), user: User = Depends(get_current_user)) -> Service:
-    service = db.query(Service).filter(Service.id == service_id, Service.owner_id == user.id).first()
-    if not service:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found or you do not have permission to access it.")
-    return service
+def get_service_for_user(service_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)) -> Service:
+    return crud_services.get_service_for_user(db, service_id, user)
 
-@router.get("/{service_id}/files", response_model=List[FileItem])
+# Entries serialized per chunk of a streamed listing
+LISTING_CHUNK_ENTRIES = 256
+
+def _format_timestamp(timestamp: float) -> str:
+    # Same representation as FileItem.modified_at
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace("+00:00", "Z")
+
+def _iter_listing(page) -> Iterator[bytes]:
+    yield b'{"items":['
+    entries = iter(page)
+    separator = ""
+    while True:
+        chunk = ",".join(
+            json.dumps({
+                "name": entry.name,
+                "path": entry.path,
+                "is_dir": entry.is_dir,
+                "size_bytes": entry.size_bytes,
+                "modified_at": _format_timestamp(entry.modified_at),
+            })
+            for entry in itertools.islice(entries, LISTING_CHUNK_ENTRIES)
+        )
+        if not chunk:
+            break
+        yield (separator + chunk).encode()
+        separator = ","
+    yield f'],"next_cursor":{json.dumps(page.next_cursor)}}}'.encode()
+
+@router.get("/services/{service_id}/files", response_model=FileListing)
 def list_service_files(
     service: Service = Depends(get_service_for_user),
-    path: str = "/"
+    path: str = "/",
+    sort: str = Query("name", pattern="^(name|size|mtime)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    pattern: Optional[str] = Query(None, max_length=255, description="Glob on the entry name, e.g. *.jar"),
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=10000),
+):
+    """
+    List a page of files and directories for a service, directories first.
+    Pass `next_cursor` back as `cursor` for the next page. The page is
+    serialized while it is sent.
+    """
+    try:
+        page = file_manager.open_directory_page(service.id, path, sort, order == "desc", pattern, cursor, limit)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return StreamingResponse(_iter_listing(page), media_type="application/json")
+
+@router.get("/services/{service_id}/files/search", response_model=SearchResults)
+def search_service_files(
+    service: Service = Depends(get_service_for_user),
+    q: str = Query(..., min_length=search_index.MIN_QUERY_CHARS, max_length=256),
+    path: str = "/",
+    limit: int = Query(100, ge=1, le=1000),
 ):
     """
-    List files and directories for a service.
+    Find lines containing `q` (case-insensitive) in the service's text files
+    below `path`. Binary files, world data and files larger than the indexing
+    limit are not searched. The first search builds the service's index.
     """
     try:
-        return file_manager.list_files(service.id, path)
+        matches, truncated = search_index.search(service.id, q, path, limit)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"matches": matches, "truncated": truncated}
 
-@router.get("/{service_id}/files/download", response_class=StreamingResponse)
+_FILE_CONTENT = {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}}
+
+@router.get(
+    "/services/{service_id}/files/download",
+    response_class=Response,
+    responses={
+        200: {"description": "The whole file", "content": _FILE_CONTENT},
+        206: {"description": "The requested byte range", "content": _FILE_CONTENT},
+        304: {"description": "Not modified (If-None-Match)"},
+        416: {"description": "Requested range not satisfiable"},
+    },
+)
 def download_service_file(
+    request: Request,
     service: Service = Depends(get_service_for_user),
     path: str = "/"
 ):
     """
-    Download a file from a service.
+    Download a file from a service. The file is streamed from disk and
+    supports Range/If-Range requests for resumable downloads.
     """
     try:
-        file_bytes = file_manager.read_file(service.id, path)
-        return StreamingResponse(io.BytesIO(file_bytes), media_type="application/octet-stream")
+        file, stat_result = file_manager.open_file(service.id, path)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return RangeFileResponse(file, stat_result, request.headers, filename=posixpath.basename(path.rstrip("/")))
 
-@router.post("/{service_id}/files/upload")
+@router.get("/services/{service_id}/files/archive")
+def download_service_archive(
+    service: Service = Depends(get_service_for_user),
+    path: str = "/",
+    archive_format: str = Query("tar.zst", alias="format"),
+    level: Optional[int] = None,
+):
+    """
+    Download a file or directory of a service as a tar.zst, tar or zip,
+    compressed while it streams. `level` trades CPU for size (zstd 1-19,
+    zip 0-9); on a fast link a low level keeps the download from being
+    CPU-bound.
+    """
+    try:
+        filename, media_type, archive = file_manager.open_archive(service.id, path, archive_format, level)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return StreamingResponse(
+        archive,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/services/{service_id}/files/upload")
 async def upload_service_file(
     service: Service = Depends(get_service_for_user),
+    db: Session = Depends(get_db),
     path: str = "/",
     file: UploadFile = File(...)
 ):
     """
-    Upload a file to a service's directory.
+    Upload a file to a service's directory in a single request.
+    For large files use the chunked upload endpoints below.
     """
+    await run_in_threadpool(crud_services.ensure_disk_space, db, service, file.size or 0)
     try:
-        contents = await file.read()
-        file_manager.write_file(service.id, f"{path}/{file.filename}", contents)
+        await run_in_threadpool(file_manager.save_file, service.id, f"{path}/{file.filename}", file.file)
         return {"filename": file.filename, "path": path}
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-@router.delete("/{service_id}/files")
+@router.post("/services/{service_id}/files/uploads", response_model=UploadStatus, status_code=status.HTTP_201_CREATED)
+def create_chunked_upload(
+    upload_in: UploadCreate,
+    service: Service = Depends(get_service_for_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Start a chunked upload. Send the data with PUT requests at increasing
+    offsets, then finalize it.
+    """
+    crud_services.ensure_disk_space(db, service, upload_in.size)
+    try:
+        return file_manager.create_upload(service.id, upload_in.path, upload_in.size)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/services/{service_id}/files/uploads/{upload_id}", response_model=UploadStatus)
+def get_chunked_upload(
+    upload_id: str,
+    service: Service = Depends(get_service_for_user)
+):
+    """
+    Get the state of a chunked upload. After a dropped connection the client
+    resumes by sending data from the returned offset.
+    """
+    try:
+        return file_manager.get_upload(service.id, upload_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.put("/services/{service_id}/files/uploads/{upload_id}", response_model=UploadStatus)
+async def put_upload_chunk(
+    request: Request,
+    upload_id: str,
+    offset: int,
+    service: Service = Depends(get_service_for_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Write the request body to a chunked upload at `offset`. The body is
+    streamed to disk on the threadpool and never held in memory as a whole.
+    """
+    try:
+        upload = await run_in_threadpool(file_manager.get_upload, service.id, upload_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # Bytes already on disk past `offset` are discarded, so they count as free
+    remaining = await run_in_threadpool(crud_services.ensure_disk_space, db, service, 0)
+    remaining += upload["offset"] - offset
+    max_length = upload["size"] - offset
+
+    try:
+        handle = await run_in_threadpool(file_manager.open_upload, service.id, upload_id, offset)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    written = 0
+    buffer = bytearray()
+    try:
+        async for data in request.stream():
+            written += len(data)
+            if written > max_length:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Chunk extends past the declared upload size.")
+            if written > remaining:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Disk quota exceeded for your plan.")
+            buffer += data
+            if len(buffer) >= file_manager.READ_CHUNK_SIZE:
+                await run_in_threadpool(handle.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(handle.write, bytes(buffer))
+    finally:
+        await run_in_threadpool(handle.close)
+
+    return await run_in_threadpool(file_manager.get_upload, service.id, upload_id)
+
+@router.post("/services/{service_id}/files/uploads/{upload_id}/finalize")
+def finalize_chunked_upload(
+    upload_id: str,
+    service: Service = Depends(get_service_for_user)
+):
+    """
+    Move a complete chunked upload into place with an atomic rename.
+    """
+    try:
+        upload = file_manager.get_upload(service.id, upload_id)
+        file_manager.finalize_upload(service.id, upload_id)
+        return {"filename": upload["path"].rstrip("/").split("/")[-1], "path": upload["path"]}
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.delete("/services/{service_id}/files/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+def abort_chunked_upload(
+    upload_id: str,
+    service: Service = Depends(get_service_for_user)
+):
+    """
+    Abort a chunked upload and discard the data received so far.
+    """
+    try:
+        file_manager.abort_upload(service.id, upload_id)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return
+
+@router.delete("/services/{service_id}/files")
 def delete_service_file(
     service: Service = Depends(get_service_for_user),
     path: str = "/"
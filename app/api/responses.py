@@ -0,0 +1,117 @@
+import os
+from email.utils import formatdate
+from typing import BinaryIO, Mapping, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.concurrency import iterate_in_threadpool
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core import file_manager
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single-range `Range: bytes=...` header into an inclusive
+    (start, end) pair. Returns None when the header should be ignored
+    (malformed or multiple ranges) and raises ValueError when the range
+    cannot be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        start = int(start_str) if start_str else None
+        end = int(end_str) if end_str else None
+    except ValueError:
+        return None
+    if start is None:
+        # Suffix range: the last `end` bytes
+        if not end or size == 0:
+            raise ValueError("Requested range not satisfiable.")
+        return max(size - end, 0), size - 1
+    if end is None:
+        end = size - 1
+    elif end < start:
+        return None
+    if start >= size:
+        raise ValueError("Requested range not satisfiable.")
+    return start, min(end, size - 1)
+
+class RangeFileResponse(Response):
+    """
+    Sends an open file in constant memory with ETag, Range and If-Range
+    support, closing it once sent. When the ASGI server advertises the zero-copy send extension the
+    kernel copies the file straight to the socket, otherwise the file is
+    read in chunks on the threadpool.
+    """
+
+    def __init__(self, file: BinaryIO, stat_result: os.stat_result, request_headers: Mapping[str, str], filename: Optional[str] = None, media_type: str = "application/octet-stream"):
+        self.file = file
+        self.media_type = media_type
+        self.background = None
+        self.body = b""
+
+        size = stat_result.st_size
+        etag = file_manager.make_etag(stat_result)
+        last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": last_modified,
+        }
+        if filename:
+            headers["content-disposition"] = f"attachment; filename*=UTF-8''{quote(filename)}"
+
+        self.offset, self.length = 0, size
+        self.status_code = 200
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            self.status_code, self.length = 304, 0
+        else:
+            range_header = request_headers.get("range")
+            if_range = request_headers.get("if-range")
+            # If-Range only allows a partial response when the validator still matches
+            if range_header and (not if_range or if_range.strip() in (etag, last_modified)):
+                try:
+                    byte_range = parse_range(range_header, size)
+                except ValueError:
+                    self.status_code, self.length = 416, 0
+                    headers["content-range"] = f"bytes */{size}"
+                    byte_range = None
+                if byte_range:
+                    start, end = byte_range
+                    self.status_code = 206
+                    self.offset, self.length = start, end - start + 1
+                    headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        if self.status_code != 304:
+            headers["content-length"] = str(self.length)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if self.length == 0 or scope.get("method") == "HEAD":
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": self.file.fileno(),
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+                return
+
+            chunks = file_manager.iter_file(self.file, self.offset, self.length)
+            async for chunk in iterate_in_threadpool(chunks):
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            self.file.close()
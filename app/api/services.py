@@ -1,22 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_async_db, get_db, get_current_user, get_current_user_async
 from app.models.user_model import User
-from app.models.service_model import Service, ServiceType
-from app.models.subscription import Subscription, SubscriptionStatus, Plan
-from app.schemas.service import Service as ServiceSchema, ServiceCreate
-from app.core import docker_manager, libvirt_manager
+from app.schemas.job import Job as JobSchema
+from app.schemas.service import Service as ServiceSchema, ServiceCreate, ServiceStatus, ServiceMetrics, DiskUsage
+from app.crud import services as crud_services
+from app.core import disk_usage, status_cache, status_monitor, service_metrics
+from app.core.config import settings
 
 router = APIRouter()
 
-IMAGE_MAP = {
-    ServiceType.MINECRAFT_PAPER: "itzg/minecraft-server",
-    # We can add other images here later
-}
+# Comment lines sent on idle event streams so proxies keep the connection open
+SSE_KEEPALIVE_SECONDS = 15
 
-@router.post("/", response_model=ServiceSchema, status_code=status.HTTP_201_CREATED)
+@router.post("/", response_model=JobSchema, status_code=status.HTTP_202_ACCEPTED)
 def create_service(
     *,
     db: Session = Depends(get_db),
@@ -25,60 +29,9 @@ def create_service(
 ):
     """
     Create a new service for the current user, checking plan limits.
+    The backend is provisioned in the background; poll the returned job.
     """
-    # 1. Check user's subscription and plan
-    subscription = db.query(Subscription).filter(Subscription.user_id == current_user.id, Subscription.status == SubscriptionStatus.ACTIVE).first()
-    if not subscription:
-        raise HTTPException(status_code=403, detail="No active subscription found.")
-
-    plan = db.query(Plan).filter(Plan.id == subscription.plan_id).first()
-
-    # 2. Check service count limit
-    service_count = db.query(Service).filter(Service.owner_id == current_user.id).count()
-    if service_count >= plan.max_services:
-        raise HTTPException(status_code=403, detail=f"Service limit reached for your plan ({plan.max_services} services).")
-
-    # 3. Create service in DB
-    new_service = Service(name=service_in.name, service_type=service_in.service_type, owner_id=current_user.id)
-    db.add(new_service)
-    db.commit()
-    db.refresh(new_service)
-
-    try:
-        # 4. Create backend (Docker or KVM) with plan resources
-        if service_in.service_type == ServiceType.VPS:
-            domain_name = f"cz7host-vps-{new_service.id}"
-            # This is a simplified call. Real implementation would pass plan resources to libvirt_manager
-            libvirt_manager.create_vm(domain_name)
-            new_service.libvirt_domain_name = domain_name
-        else:
-            image_name = IMAGE_MAP.get(service_in.service_type)
-            if not image_name:
-                raise HTTPException(status_code=400, detail="Unsupported service type")
-
-            container_name = f"cz7host-container-{new_service.id}"
-            environment = {}
-            if service_in.service_type in [ServiceType.MINECRAFT_PAPER, ServiceType.MINECRAFT_FORGE, ServiceType.MINECRAFT_VANILLA]:
-                environment["EULA"] = "TRUE"
-
-            container = docker_manager.create_container(
-                service_id=new_service.id,
-                image=image_name,
-                name=container_name,
-                environment=environment,
-                mem_limit=f"{plan.ram_mb}m",
-                cpu_shares=int(plan.cpu_vcore * 1024) # Convert vCore share to Docker's relative value
-            )
-            new_service.docker_container_id = container.id
-
-        db.commit()
-        db.refresh(new_service)
-    except RuntimeError as e:
-        db.delete(new_service)
-        db.commit()
-        raise HTTPException(status_code=500, detail=f"Failed to create service backend: {e}")
-
-    return new_service
+    return crud_services.create_service(db, current_user, service_in.name, service_in.service_type, template=service_in.template)
 
 @router.get("/", response_model=List[ServiceSchema])
 def list_services(
@@ -88,44 +41,140 @@ def list_services(
     """
     List services for the current user.
     """
-    return db.query(Service).filter(Service.owner_id == current_user.id).all()
+    return crud_services.list_services(db, current_user)
 
-@router.post("/{service_id}/start", response_model=ServiceSchema)
-def start_service(
-    service_id: int,
+@router.get("/status", response_model=List[ServiceStatus])
+def list_service_statuses(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Start a specific service.
+    Get the status of every service of the current user in one call.
     """
-    service = db.query(Service).filter(Service.id == service_id, Service.owner_id == current_user.id).first()
-    if not service:
-        raise HTTPException(status_code=404, detail="Service not found")
-
-    if service.service_type == ServiceType.VPS:
-        libvirt_manager.start_vm(service.libvirt_domain_name)
-    else:
-        docker_manager.start_container(service.docker_container_id)
+    services = crud_services.list_services(db, current_user)
+    statuses = crud_services.get_service_statuses(services)
+    return [{"service_id": service_id, "status": status} for service_id, status in statuses.items()]
+
+@router.get("/events")
+async def stream_service_events(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    Server-Sent Events stream of status changes for the current user's
+    services. The current status of each service is sent first.
+    """
+    services = await crud_services.list_services_async(db, current_user)
+    await db.close() # Don't hold a pooled connection for the lifetime of the stream
+    service_ids = {status_cache.status_key(service): service.id for service in services}
+    queue = status_monitor.subscribe()
+    initial = await crud_services.get_service_statuses_async(services)
+
+    def format_event(service_id: int, service_status: str) -> str:
+        data = json.dumps({"service_id": service_id, "status": service_status})
+        return f"event: status\ndata: {data}\n\n"
+
+    async def event_stream():
+        try:
+            for service_id, service_status in initial.items():
+                yield format_event(service_id, service_status)
+            while not await request.is_disconnected():
+                try:
+                    key, service_status = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                service_id = service_ids.get(key)
+                if service_id is not None:
+                    yield format_event(service_id, service_status)
+        finally:
+            status_monitor.unsubscribe(queue)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
+@router.post("/{service_id}/start", response_model=ServiceSchema)
+async def start_service(
+    service_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    Start a specific service.
+    """
+    service = await crud_services.get_service_for_user_async(db, service_id, current_user)
+    await crud_services.start_service_async(service)
     return service
 
 @router.post("/{service_id}/stop", response_model=ServiceSchema)
-def stop_service(
+async def stop_service(
+    service_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    service = await crud_services.get_service_for_user_async(db, service_id, current_user)
+    await crud_services.stop_service_async(service)
+    return service
+
+@router.post("/{service_id}/flatten", response_model=JobSchema, status_code=status.HTTP_202_ACCEPTED)
+def flatten_service_disk(
     service_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    service = db.query(Service).filter(Service.id == service_id, Service.owner_id == current_user.id).first()
-    if not service:
-        raise HTTPException(status_code=404, detail="Service not found")
-
-    if service.service_type == ServiceType.VPS:
-        libvirt_manager.stop_vm(service.libvirt_domain_name)
-    else:
-        docker_manager.stop_container(service.docker_container_id)
+    """
+    Start copying a VPS's template data into its own disk. Poll the returned job.
+    """
+    service = crud_services.get_service_for_user(db, service_id, current_user)
+    return crud_services.flatten_service_disk(db, service, current_user)
 
-    return service
+@router.get("/{service_id}/metrics", response_model=ServiceMetrics)
+def get_service_metrics(
+    service_id: int,
+    window: int = Query(900, ge=1, le=settings.SERVICE_METRICS_RETENTION_SECONDS),
+    points: int = Query(120, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get CPU, memory, disk and network usage of a service for the last
+    `window` seconds, alongside the limits of the owner's plan.
+    """
+    service = crud_services.get_service_for_user(db, service_id, current_user)
+    plan = crud_services.get_active_plan(db, service.owner_id)
+    series = service_metrics.get_history(service.id, window, points)
+    return {
+        "service_id": service.id,
+        "window": window,
+        "plan_ram_mb": plan.ram_mb if plan else None,
+        "plan_cpu_vcore": plan.cpu_vcore if plan else None,
+        **series,
+    }
+
+@router.get("/{service_id}/usage", response_model=DiskUsage)
+def get_service_disk_usage(
+    service_id: int,
+    path: str = "/",
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get the bytes and inodes used below a directory of the service (the
+    whole service by default) and by its largest subdirectories, alongside
+    the disk quota of the owner's plan.
+    """
+    service = crud_services.get_service_for_user(db, service_id, current_user)
+    try:
+        usage = disk_usage.get_usage(service.id, path)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {
+        "service_id": service.id,
+        "quota_bytes": crud_services.get_disk_quota_bytes(db, service),
+        **usage,
+    }
 
 @router.delete("/{service_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_service(
@@ -133,15 +182,6 @@ def delete_service(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    service = db.query(Service).filter(Service.id == service_id, Service.owner_id == current_user.id).first()
-    if not service:
-        raise HTTPException(status_code=404, detail="Service not found")
-
-    if service.service_type == ServiceType.VPS:
-        libvirt_manager.remove_vm(service.libvirt_domain_name)
-    else:
-        docker_manager.remove_container(service.docker_container_id)
-
-    db.delete(service)
-    db.commit()
-    return
\ No newline at end of file
+    service = crud_services.get_service_for_user(db, service_id, current_user)
+    crud_services.delete_service(db, service)
+    return
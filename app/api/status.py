@@ -1,24 +1,62 @@
-import psutil
-from fastapi import APIRouter
+from typing import List
 
-from app.schemas.status import SystemStatus
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from app.api.deps import get_current_active_superuser
+from app.schemas.status import DatabasePoolStatus, SystemStatus, SystemStatusHistory
+from app.core import host_metrics
+from app.db import pool_metrics
 
 router = APIRouter()
 
+GB = 1024 ** 3
+
 @router.get("/", response_model=SystemStatus)
 def get_system_status():
     """
-    Get the current system status (CPU and Memory).
+    Get the latest sampled system status (CPU, memory, disk and network).
     """
-    cpu_percent = psutil.cpu_percent(interval=1)
+    sample = host_metrics.latest()
+    if sample is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="No metrics sampled yet.")
 
-    mem = psutil.virtual_memory()
-    mem_total_gb = round(mem.total / (1024**3), 2)
-    mem_used_gb = round(mem.used / (1024**3), 2)
+    return {
+        "cpu_percent": sample["cpu_percent"],
+        "mem_total_gb": round(sample["mem_total_bytes"] / GB, 2),
+        "mem_used_gb": round(sample["mem_used_bytes"] / GB, 2),
+        "mem_percent": sample["mem_percent"],
+        "disk_total_gb": round(sample["disk_total_bytes"] / GB, 2),
+        "disk_used_gb": round(sample["disk_used_bytes"] / GB, 2),
+        "disk_percent": sample["disk_percent"],
+        "net_sent_bytes_per_s": sample["net_sent_bytes_per_s"],
+        "net_recv_bytes_per_s": sample["net_recv_bytes_per_s"],
+        "sampled_at": sample["timestamp"],
+    }
 
+@router.get("/history", response_model=SystemStatusHistory)
+def get_system_status_history(
+    window: int = Query(900, ge=1, le=host_metrics.SAMPLE_INTERVAL_SECONDS * host_metrics.HISTORY_SIZE),
+    points: int = Query(120, ge=1, le=host_metrics.HISTORY_SIZE)
+):
+    """
+    Get sampled system metrics for the last `window` seconds, downsampled
+    to at most `points` points per series.
+    """
+    series = host_metrics.history(window, points)
     return {
-        "cpu_percent": cpu_percent,
-        "mem_total_gb": mem_total_gb,
-        "mem_used_gb": mem_used_gb,
-        "mem_percent": mem.percent,
-    }
\ No newline at end of file
+        "window": window,
+        "timestamps": series["timestamps"],
+        "cpu_percent": series["cpu_percent"],
+        "mem_percent": series["mem_percent"],
+        "disk_percent": series["disk_percent"],
+        "net_sent_bytes_per_s": series["net_sent_bytes_per_s"],
+        "net_recv_bytes_per_s": series["net_recv_bytes_per_s"],
+    }
+
+@router.get("/database", response_model=List[DatabasePoolStatus], dependencies=[Depends(get_current_active_superuser)])
+def get_database_pool_status():
+    """
+    Get connection pool gauges of the sync and async database engines:
+    connections in use and idle, and how long checkouts waited for one.
+    """
+    return pool_metrics.snapshot()
@@ -1,8 +1,11 @@
 import stripe
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_async_db, get_db, get_current_user
 from app.core.config import settings
 from app.models.user_model import User
 from app.models.subscription import Plan, Subscription, SubscriptionStatus
@@ -53,7 +56,7 @@ def create_checkout_session(
         )
 
 @router.post("/stripe-webhook")
-async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
+async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_async_db)):
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
     event = None
@@ -79,8 +82,8 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
             raise HTTPException(status_code=400, detail="Missing metadata in webhook event.")
 
         # Retrieve subscription details from Stripe to get plan and period end
-        stripe_sub = stripe.Subscription.retrieve(stripe_subscription_id)
-        plan_id = db.query(Plan.id).filter(Plan.stripe_price_id == stripe_sub.items.data[0].price.id).scalar()
+        stripe_sub = await run_in_threadpool(stripe.Subscription.retrieve, stripe_subscription_id)
+        plan_id = await db.scalar(select(Plan.id).where(Plan.stripe_price_id == stripe_sub.items.data[0].price.id))
 
         # Create a new subscription record in our DB
         new_subscription = Subscription(
@@ -91,6 +94,6 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
             current_period_end=datetime.fromtimestamp(stripe_sub.current_period_end)
         )
         db.add(new_subscription)
-        db.commit()
+        await db.commit()
 
     return {"status": "success"}
\ No newline at end of file
@@ -1,11 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Query, status
 from sqlalchemy.orm import Session
 from typing import List
 
 from app.api.deps import get_db, get_current_user
 from app.models.user_model import User
-from app.models.ticket import Ticket, TicketMessage
-from app.schemas.ticket import Ticket as TicketSchema, TicketCreate, TicketMessageCreate
+from app.schemas.ticket import Ticket as TicketSchema, TicketCreate, TicketMessageCreate, TicketSummary, TicketDetail
+from app.crud import tickets as crud_tickets
 
 router = APIRouter()
 
@@ -19,19 +19,7 @@ def create_ticket(
     """
     Create a new ticket with an initial message.
     """
-    new_ticket = Ticket(title=ticket_in.title, owner_id=current_user.id)
-    db.add(new_ticket)
-    db.flush()
-
-    first_message = TicketMessage(
-        content=ticket_in.initial_message,
-        ticket_id=new_ticket.id,
-        author_id=current_user.id
-    )
-    db.add(first_message)
-    db.commit()
-    db.refresh(new_ticket)
-    return new_ticket
+    return crud_tickets.create_ticket(db, current_user, ticket_in.title, ticket_in.initial_message)
 
 @router.get("/", response_model=List[TicketSchema])
 def read_tickets(
@@ -43,24 +31,44 @@ def read_tickets(
     """
     Retrieve tickets for the current user.
     """
-    tickets = db.query(Ticket).filter(Ticket.owner_id == current_user.id).offset(skip).limit(limit).all()
-    return tickets
+    return crud_tickets.list_tickets(db, current_user, skip=skip, limit=limit)
+
+@router.get("/summary", response_model=List[TicketSummary])
+def read_ticket_summaries(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    skip: int = 0,
+    limit: int = Query(100, le=500)
+):
+    """
+    Retrieve a lightweight list of the current user's tickets: message
+    count, last activity and a preview of the last message.
+    """
+    return crud_tickets.list_ticket_summaries(db, current_user, skip=skip, limit=limit)
 
-@router.get("/{ticket_id}", response_model=TicketSchema)
+@router.get("/{ticket_id}", response_model=TicketDetail)
 def read_ticket(
     ticket_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    after_id: int | None = None,
+    limit: int = Query(50, ge=1, le=200)
 ):
     """
-    Get a specific ticket by ID.
+    Get a specific ticket by ID with a page of its messages.
     """
-    ticket = db.query(Ticket).filter(Ticket.id == ticket_id).first()
-    if not ticket:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
-    if ticket.owner_id != current_user.id and not current_user.is_superuser:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
-    return ticket
+    ticket = crud_tickets.get_ticket_for_user(db, ticket_id, current_user)
+    messages, next_after_id = crud_tickets.get_ticket_messages(db, ticket, after_id=after_id, limit=limit)
+    return {
+        "id": ticket.id,
+        "title": ticket.title,
+        "owner_id": ticket.owner_id,
+        "status": ticket.status,
+        "created_at": ticket.created_at,
+        "updated_at": ticket.updated_at,
+        "messages": messages,
+        "next_after_id": next_after_id,
+    }
 
 @router.post("/{ticket_id}/messages", response_model=TicketSchema)
 def add_message_to_ticket(
@@ -73,18 +81,4 @@ def add_message_to_ticket(
     """
     Add a new message to an existing ticket.
     """
-    ticket = db.query(Ticket).filter(Ticket.id == ticket_id).first()
-    if not ticket:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
-    if ticket.owner_id != current_user.id and not current_user.is_superuser:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
-
-    new_message = TicketMessage(
-        content=message_in.content,
-        ticket_id=ticket.id,
-        author_id=current_user.id
-    )
-    db.add(new_message)
-    db.commit()
-    db.refresh(ticket)
-    return ticket
\ No newline at end of file
+    return crud_tickets.add_message(db, ticket_id, current_user, message_in.content)
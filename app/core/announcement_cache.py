@@ -0,0 +1,49 @@
+import threading
+import time
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from app.models.announcement import Announcement
+from app.schemas.announcement import Announcement as AnnouncementSchema
+
+# Announcements change a few times a week, so each worker keeps the active set
+# in memory. Writes in this process bump the version and the next read reloads;
+# the TTL bounds how stale a worker can be after another worker's write.
+CACHE_TTL_SECONDS = 60
+
+_lock = threading.Lock()
+_version = 0
+_loaded_version = -1
+_loaded_at = 0.0
+_announcements: List[AnnouncementSchema] = []
+
+def invalidate():
+    """
+    Marks the cached announcements as stale so the next read reloads them.
+    """
+    global _version
+    with _lock:
+        _version += 1
+
+def get_active_announcements(db: Session) -> List[AnnouncementSchema]:
+    """
+    Returns the active announcements, querying the database only when the
+    cache was invalidated or its TTL has expired.
+    """
+    global _loaded_version, _loaded_at, _announcements
+    now = time.monotonic()
+    if _loaded_version == _version and now - _loaded_at < CACHE_TTL_SECONDS:
+        return _announcements
+
+    with _lock:
+        # Another thread may have refreshed the cache while we waited
+        if _loaded_version == _version and now - _loaded_at < CACHE_TTL_SECONDS:
+            return _announcements
+
+        version = _version
+        rows = db.query(Announcement).filter(Announcement.is_active == True).all()
+        _announcements = [AnnouncementSchema.model_validate(row) for row in rows]
+        _loaded_version = version
+        _loaded_at = time.monotonic()
+        return _announcements
@@ -1,79 +1,685 @@
+import contextlib
+import fcntl
+import hashlib
+import json
 import os
+import re
 import shutil
+import sqlite3
+import stat
 import tarfile
+import threading
+import uuid
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
 
-from app.core.file_manager import get_service_path
+from app.core import compression, sandbox
+from app.core.config import settings
+from app.core.file_manager import get_service_path, notify_changed, READ_CHUNK_SIZE, UPLOAD_DIR_NAME
 
 BASE_BACKUP_PATH = Path("/var/lib/cz7host/backups")
 
+# Backups are deduplicated. Files are split into content-defined chunks, each
+# chunk is stored once per service under chunks/ named by its SHA-256, and a
+# backup is only a JSON manifest listing the chunks of every file. index.db
+# records each chunk's codec and counts how many manifests reference it, so
+# deleting a backup frees exactly the chunks no other backup uses. Archives written before this
+# (backup_*.tar.gz) are still restored, downloaded and deleted as plain files.
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = ".json"
+LEGACY_SUFFIX = ".tar.gz"
+
+# A chunk ends at the first anchor byte after MIN_CHUNK_SIZE where the CRC of
+# the preceding BOUNDARY_WINDOW bytes has its low bits clear. Boundaries depend
+# only on nearby content, so an insertion only changes the chunks around it,
+# and testing anchor bytes only keeps the per-byte scan inside the regex
+# engine. The anchors are rare in text, where chunks fall back to
+# MAX_CHUNK_SIZE; on binary data they average about 512 KiB.
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+BOUNDARY_WINDOW = 48
+_BOUNDARY_MASK = (1 << 12) - 1
+_ANCHOR_RE = re.compile(rb"[\x8e\x9c\xd7\xf1]")
+
+_MANIFEST_NAME_RE = re.compile(r"backup_[0-9_-]+\.json")
+
 def get_backup_path(service_id: int, filename: str) -> Path:
     """
-    Constructs the absolute path for a backup file.
+    Constructs the absolute path for a legacy backup archive.
     """
     return BASE_BACKUP_PATH / str(service_id) / filename
 
-def create_backup(service_id: int) -> (str, int):
+def is_legacy_backup(filename: str) -> bool:
+    return filename.endswith(LEGACY_SUFFIX)
+
+def get_archive_name(filename: str) -> str:
+    """
+    Returns the file name a backup is downloaded as.
+    """
+    if is_legacy_backup(filename):
+        return filename
+    return filename[:-len(MANIFEST_SUFFIX)] + LEGACY_SUFFIX
+
+def _get_store_path(service_id: int) -> Path:
+    return BASE_BACKUP_PATH / str(service_id)
+
+def _get_manifest_path(store: Path, filename: str) -> Path:
+    if not _MANIFEST_NAME_RE.fullmatch(filename):
+        raise FileNotFoundError("Backup file not found.")
+    return store / "manifests" / filename
+
+def _get_chunk_path(store: Path, digest: str) -> Path:
+    return store / "chunks" / digest[:2] / digest
+
+class BackupBusyError(RuntimeError):
+    """
+    The service's backups are locked by another backup, restore, delete or
+    download.
+    """
+
+@contextlib.contextmanager
+def _locked(store: Path, shared: bool = False, wait: bool = True):
+    """
+    Serializes backups, restores and deletes of one service, across processes.
+    Downloads only read chunks and take the lock `shared`. Without `wait`
+    BackupBusyError is raised instead of blocking, for callers on a request
+    thread.
+    """
+    store.mkdir(parents=True, exist_ok=True)
+    with open(store / ".lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            raise BackupBusyError("Another operation on this service's backups is in progress. Try again once it has finished.")
+        yield
+
+def _open_index(store: Path) -> sqlite3.Connection:
+    index = sqlite3.connect(str(store / "index.db"))
+    index.execute(
+        "CREATE TABLE IF NOT EXISTS chunks ("
+        "digest TEXT PRIMARY KEY, stored_size INTEGER NOT NULL, codec TEXT NOT NULL, refs INTEGER NOT NULL)"
+    )
+    return index
+
+def _load_codecs(store: Path) -> Dict[str, str]:
+    index = _open_index(store)
+    try:
+        return dict(index.execute("SELECT digest, codec FROM chunks"))
+    finally:
+        index.close()
+
+def _find_boundary(data: bytes) -> int:
+    if len(data) <= MIN_CHUNK_SIZE:
+        return len(data)
+    for match in _ANCHOR_RE.finditer(data, MIN_CHUNK_SIZE, MAX_CHUNK_SIZE):
+        end = match.end()
+        if not zlib.crc32(data[end - BOUNDARY_WINDOW:end]) & _BOUNDARY_MASK:
+            return end
+    return min(len(data), MAX_CHUNK_SIZE)
+
+def iter_chunks(fileobj: BinaryIO) -> Iterator[bytes]:
+    """
+    Splits a file into content-defined chunks.
     """
-    Creates a new backup for a service.
-    Returns the filename and size of the backup.
+    buffer = b""
+    while True:
+        while len(buffer) < MAX_CHUNK_SIZE:
+            data = fileobj.read(MAX_CHUNK_SIZE - len(buffer))
+            if not data:
+                break
+            buffer += data
+        if not buffer:
+            return
+        cut = _find_boundary(buffer)
+        yield buffer[:cut]
+        buffer = buffer[cut:]
+
+def _write_chunk(store: Path, digest: str, data: bytes, codec: str, level: int) -> int:
+    chunk_path = _get_chunk_path(store, digest)
+    chunk_path.parent.mkdir(parents=True, exist_ok=True)
+    compressed = compression.compress(codec, data, level)
+    temp_path = chunk_path.with_name(chunk_path.name + ".tmp")
+    with open(temp_path, "wb") as f:
+        f.write(compressed)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, chunk_path)
+    return len(compressed)
+
+def _read_chunk(store: Path, digest: str, codecs: Dict[str, str]) -> bytes:
+    try:
+        with open(_get_chunk_path(store, digest), "rb") as f:
+            return compression.decompress(codecs[digest], f.read())
+    except (FileNotFoundError, KeyError):
+        raise RuntimeError(f"Backup chunk {digest} is missing.")
+
+class _ChunkWriter:
+    """
+    Compresses and writes new chunks on a thread pool while the caller keeps
+    reading and hashing. At most 2 * workers chunks wait in memory.
+    """
+
+    def __init__(self, store: Path, codec: str, level: int, workers: int):
+        self.store = store
+        self.codec = codec
+        self.level = level
+        self._futures: Dict[str, Future] = {}
+        self._error: Optional[BaseException] = None
+        self._slots = threading.BoundedSemaphore(2 * workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backup-chunks")
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._futures
+
+    def _done(self, future: Future):
+        self._slots.release()
+        if future.exception() is not None and self._error is None:
+            self._error = future.exception()
+
+    def submit(self, digest: str, data: bytes):
+        if self._error is not None:
+            raise self._error
+        self._slots.acquire()
+        future = self._executor.submit(_write_chunk, self.store, digest, data, self.codec, self.level)
+        self._futures[digest] = future
+        future.add_done_callback(self._done)
+
+    def finish(self) -> Dict[str, int]:
+        """
+        Waits for every write. Returns the stored size of each new chunk.
+        """
+        return {digest: future.result() for digest, future in self._futures.items()}
+
+    def discard(self):
+        """
+        Removes every chunk written so far.
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        for digest in self._futures:
+            _get_chunk_path(self.store, digest).unlink(missing_ok=True)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+def _store_file(index: sqlite3.Connection, service_path: Path, relative_path: str, writer: _ChunkWriter) -> List[Tuple[str, int]]:
+    """
+    Chunks a file, writing the chunks the store does not have yet.
+    Returns the file's list of (digest, length). Raises FileNotFoundError if
+    it is gone or no longer a regular file.
+    """
+    # Opened through the sandbox: the service can swap any component of the
+    # path for a symlink after the scan
+    try:
+        with sandbox.resolve(service_path, relative_path) as target:
+            fd = target.open(os.O_RDONLY | os.O_NONBLOCK)
+    except (NotADirectoryError, PermissionError):
+        raise FileNotFoundError(f"'{relative_path}' was replaced while backing up.")
+    chunks = []
+    with os.fdopen(fd, "rb") as f:
+        if not stat.S_ISREG(os.fstat(fd).st_mode):
+            raise FileNotFoundError(f"'{relative_path}' was replaced while backing up.")
+        for data in iter_chunks(f):
+            digest = hashlib.sha256(data).hexdigest()
+            if digest not in writer and index.execute("SELECT 1 FROM chunks WHERE digest = ?", (digest,)).fetchone() is None:
+                writer.submit(digest, data)
+            chunks.append((digest, len(data)))
+    return chunks
+
+def _scan(service_path: Path) -> List[dict]:
+    """
+    Lists every directory, regular file and symlink under the service path.
+    The tree is walked with descriptors, so symlinks are never followed.
+    """
+    entries = []
+    with sandbox.open_directory(service_path, "/") as root_fd:
+        for dirpath, dirs, files, dir_fd in os.fwalk(".", dir_fd=root_fd):
+            if dirpath == "." and UPLOAD_DIR_NAME in dirs:
+                dirs.remove(UPLOAD_DIR_NAME)
+            prefix = dirpath[2:]
+            for name in dirs + files:
+                try:
+                    entry_stat = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+                except FileNotFoundError:
+                    continue # Removed while scanning
+                entry = {
+                    "path": f"{prefix}/{name}" if prefix else name,
+                    "mode": stat.S_IMODE(entry_stat.st_mode),
+                    "mtime_ns": entry_stat.st_mtime_ns,
+                }
+                if stat.S_ISLNK(entry_stat.st_mode):
+                    try:
+                        entry.update(type="symlink", target=os.readlink(name, dir_fd=dir_fd))
+                    except OSError:
+                        continue # Removed or replaced while scanning
+                elif stat.S_ISDIR(entry_stat.st_mode):
+                    entry.update(type="dir")
+                elif stat.S_ISREG(entry_stat.st_mode):
+                    entry.update(type="file", size=entry_stat.st_size)
+                else:
+                    continue # Sockets, FIFOs and devices are not backed up
+                entries.append(entry)
+    entries.sort(key=lambda entry: entry["path"])
+    return entries
+
+def _load_manifest(path: Path) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError("Backup file not found.")
+
+def _load_latest_manifest(store: Path) -> Optional[dict]:
+    manifests = sorted((store / "manifests").glob("backup_*" + MANIFEST_SUFFIX))
+    return _load_manifest(manifests[-1]) if manifests else None
+
+def _new_manifest_path(store: Path) -> Path:
+    (store / "manifests").mkdir(parents=True, exist_ok=True)
+    stem = "backup_" + datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    path = store / "manifests" / (stem + MANIFEST_SUFFIX)
+    n = 1
+    while path.exists():
+        path = store / "manifests" / f"{stem}_{n}{MANIFEST_SUFFIX}"
+        n += 1
+    return path
+
+def _manifest_digests(manifest: dict) -> set:
+    return {digest for entry in manifest["entries"] for digest, _ in entry.get("chunks", ())}
+
+def create_backup(
+    service_id: int,
+    codec: str,
+    level: int,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[str, int]:
+    """
+    Creates a new backup for a service, compressing new chunks with `codec`.
+    Files whose size and mtime match the previous backup reuse its chunks
+    without being read. `progress` is called with (bytes done, bytes total)
+    as files are processed.
+    Returns the filename and the total size of the backed up files.
     """
     service_path = get_service_path(service_id)
     if not service_path.exists() or not service_path.is_dir():
         raise ValueError("Service directory does not exist.")
 
-    backup_dir = BASE_BACKUP_PATH / str(service_id)
-    backup_dir.mkdir(parents=True, exist_ok=True)
+    store = _get_store_path(service_id)
+    with _locked(store):
+        index = _open_index(store)
+        writer = _ChunkWriter(store, codec, level, settings.COMPRESSION_WORKERS)
+        committed = False
+        try:
+            previous = _load_latest_manifest(store)
+            previous_files = {entry["path"]: entry for entry in previous["entries"] if entry["type"] == "file"} if previous else {}
+
+            entries = _scan(service_path)
+            total = sum(entry["size"] for entry in entries if entry["type"] == "file")
+            done = 0
+            for entry in entries:
+                if entry["type"] != "file":
+                    continue
+                old = previous_files.get(entry["path"])
+                if old and old["size"] == entry["size"] and old["mtime_ns"] == entry["mtime_ns"]:
+                    entry["chunks"] = old["chunks"]
+                else:
+                    try:
+                        entry["chunks"] = _store_file(index, service_path, entry["path"], writer)
+                    except FileNotFoundError:
+                        entry["chunks"] = [] # Removed or replaced while backing up
+                    # The file may have changed size since it was scanned
+                    entry["size"] = sum(length for _, length in entry["chunks"])
+                done += entry["size"]
+                if progress:
+                    progress(done, total)
 
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    filename = f"backup_{timestamp}.tar.gz"
-    backup_filepath = backup_dir / filename
+            new_chunks = writer.finish()
+            manifest = {
+                "version": MANIFEST_VERSION,
+                "service_id": service_id,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "codec": codec,
+                "size_bytes": sum(entry.get("size", 0) for entry in entries),
+                "stored_bytes": sum(new_chunks.values()),
+                "entries": entries,
+            }
+            manifest_path = _new_manifest_path(store)
+            temp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+            with open(temp_path, "w") as f:
+                json.dump(manifest, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
 
-    with tarfile.open(backup_filepath, "w:gz") as tar:
-        tar.add(str(service_path), arcname=os.path.basename(service_path))
+            # References are committed before the manifest appears: a crash in
+            # between leaks chunks instead of leaving a backup whose chunks a
+            # later delete could free.
+            with index:
+                index.executemany(
+                    "INSERT INTO chunks (digest, stored_size, codec, refs) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT (digest) DO UPDATE SET refs = refs + 1",
+                    [(digest, new_chunks.get(digest, 0), codec) for digest in _manifest_digests(manifest)],
+                )
+            committed = True
+            os.replace(temp_path, manifest_path)
+        except BaseException:
+            if not committed:
+                # Chunks written by this run are not referenced by anything yet
+                writer.discard()
+            raise
+        finally:
+            writer.close()
+            index.close()
 
-    size_bytes = backup_filepath.stat().st_size
-    return filename, size_bytes
+    return manifest_path.name, manifest["size_bytes"]
 
-def restore_from_backup(service_id: int, filename: str):
+def normalize_restore_path(path: str) -> str:
     """
-    Restores a service from a backup file.
+    Normalizes a path inside a backup for selective restore.
+    Raises ValueError if it points outside the service directory.
     """
-    service_path = get_service_path(service_id)
-    backup_filepath = get_backup_path(service_id, filename)
+    normalized = os.path.normpath(path.strip("/"))
+    if normalized in (".", "") or normalized == ".." or normalized.startswith("../"):
+        raise ValueError("Invalid path to restore.")
+    return normalized
+
+def _split_entry_path(relative_path: str) -> Tuple[str, ...]:
+    normalized = os.path.normpath(relative_path)
+    if os.path.isabs(normalized) or normalized in (".", "..") or normalized.startswith("../"):
+        raise RuntimeError(f"Backup manifest contains an invalid path: {relative_path}")
+    return tuple(normalized.split("/"))
+
+def _is_within(relative_path: str, path: Optional[str]) -> bool:
+    return path is None or relative_path == path or relative_path.startswith(path + "/")
+
+# Restores never touch the live tree until the end. Files are extracted into a
+# staging directory next to the service directory (same filesystem, so no
+# copies), which is then renamed into place. The replaced tree is renamed aside
+# and deleted on a background thread, so a failed restore leaves the service
+# as it was and a successful one does not wait for a large rmtree.
+def _new_sibling(service_path: Path, kind: str) -> Path:
+    return service_path.parent / f".{service_path.name}.{kind}-{uuid.uuid4().hex}"
+
+def _remove(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+def _remove_leftovers(service_path: Path):
+    """
+    Removes staging and replaced trees left behind by an interrupted restore.
+    """
+    for kind in ("restore", "replaced"):
+        for leftover in service_path.parent.glob(f".{service_path.name}.{kind}-*"):
+            _remove(leftover)
+
+def _remove_in_background(path: Path):
+    threading.Thread(target=_remove, args=(path,), name="restore-cleanup", daemon=True).start()
+
+def _swap_in(service_path: Path, staged: Path, dir_fd: int, name: str):
+    """
+    Renames `staged` to `name` in the directory `dir_fd`, moving whatever
+    was there aside.
+    """
+    replaced = None
+    try:
+        os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+    except FileNotFoundError:
+        pass
+    else:
+        replaced = _new_sibling(service_path, "replaced")
+        os.rename(name, replaced, src_dir_fd=dir_fd)
+    try:
+        os.rename(staged, name, dst_dir_fd=dir_fd)
+    except OSError:
+        if replaced is not None:
+            os.rename(replaced, name, dst_dir_fd=dir_fd)
+        raise
+    if replaced is not None:
+        _remove_in_background(replaced)
+
+_STAGING_DIR_FLAGS = os.O_PATH | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+
+def _open_staging_dir(root_fd: int, parts: Tuple[str, ...], opened: Dict[Tuple[str, ...], int]) -> int:
+    """
+    Returns a descriptor of the directory `parts` below the staging directory,
+    creating it and its parents. Components are opened with O_NOFOLLOW, so no
+    entry of a backup can place anything outside the staging directory.
+    """
+    if not parts:
+        return root_fd
+    fd = opened.get(parts)
+    if fd is None:
+        parent_fd = _open_staging_dir(root_fd, parts[:-1], opened)
+        try:
+            os.mkdir(parts[-1], dir_fd=parent_fd)
+        except FileExistsError:
+            pass
+        fd = opened[parts] = os.open(parts[-1], _STAGING_DIR_FLAGS, dir_fd=parent_fd)
+    return fd
+
+def _extract(
+    store: Path,
+    entries: List[dict],
+    codecs: Dict[str, str],
+    root: Path,
+    progress: Optional[Callable[[int, int], None]] = None,
+):
+    total = sum(entry["size"] for entry in entries if entry["type"] == "file")
+    done = 0
+    directories = []
+    symlinks = []
+    root_fd = os.open(root, _STAGING_DIR_FLAGS)
+    opened: Dict[Tuple[str, ...], int] = {}
+    try:
+        for entry in entries:
+            parts = _split_entry_path(entry["path"])
+            if entry["type"] == "dir":
+                _open_staging_dir(root_fd, parts, opened)
+                directories.append((parts, entry))
+            elif entry["type"] == "symlink":
+                symlinks.append((parts, entry))
+            else:
+                fd = os.open(
+                    parts[-1],
+                    os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW | os.O_CLOEXEC,
+                    0o600,
+                    dir_fd=_open_staging_dir(root_fd, parts[:-1], opened),
+                )
+                with os.fdopen(fd, "wb") as f:
+                    for digest, _ in entry["chunks"]:
+                        f.write(_read_chunk(store, digest, codecs))
+                    os.fchmod(fd, entry["mode"])
+                    # Restoring mtimes lets the next backup skip these files
+                    os.utime(fd, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+                done += entry["size"]
+                if progress:
+                    progress(done, total)
 
+        # Symlinks are created once everything else is in place, so none can
+        # redirect a later entry
+        for parts, entry in symlinks:
+            os.symlink(entry["target"], parts[-1], dir_fd=_open_staging_dir(root_fd, parts[:-1], opened))
+
+        # Directory mtimes change as their contents are created, so set them last
+        for parts, entry in reversed(directories):
+            fd = os.open(parts[-1], os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC, dir_fd=_open_staging_dir(root_fd, parts[:-1], opened))
+            try:
+                os.fchmod(fd, entry["mode"])
+                os.utime(fd, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            finally:
+                os.close(fd)
+    finally:
+        for fd in opened.values():
+            os.close(fd)
+        os.close(root_fd)
+
+def _extract_archive(service_id: int, filename: str, root: Path, path: Optional[str]) -> bool:
+    """
+    Streams the members of a legacy tar.gz below `path` into `root`.
+    Returns whether anything was extracted.
+    """
+    backup_filepath = get_backup_path(service_id, filename)
     if not backup_filepath.exists():
         raise FileNotFoundError("Backup file not found.")
 
-    # Clear the service directory before restoring
-    if service_path.exists():
-        shutil.rmtree(service_path)
-    service_path.mkdir(parents=True)
-
-    with tarfile.open(backup_filepath, "r:gz") as tar:
-        # The archive contains a single top-level directory. We need to extract its contents.
-        # This is a bit complex, so we'll do it carefully.
-        import tempfile
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tar.extractall(path=tmpdir)
-
-            # This assumes the archive was created with a single directory inside
-            # named after the service path's basename.
-            extracted_folder = Path(tmpdir) / service_path.name
-            if extracted_folder.exists() and extracted_folder.is_dir():
-                # Move contents from the extracted folder to the service path
-                for item in extracted_folder.iterdir():
-                    shutil.move(str(item), str(service_path))
+    # Legacy archives hold a single top-level directory named after the service
+    prefix = f"{service_id}/"
+    extracted = False
+    with tarfile.open(backup_filepath, "r|gz") as tar:
+        for member in tar:
+            if not member.name.startswith(prefix):
+                continue
+            member.name = member.name[len(prefix):]
+            if _is_within(member.name, path) and not _is_within(member.name, UPLOAD_DIR_NAME):
+                tar.extract(member, root, filter="tar")
+                extracted = True
+    return extracted
+
+def restore_from_backup(
+    service_id: int,
+    filename: str,
+    path: Optional[str] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+):
+    """
+    Restores a service from a backup: the whole directory, or only the file
+    or directory at `path` (see normalize_restore_path). The rest of the tree
+    is left untouched by a selective restore. Running services keep the old
+    files open until restarted.
+    """
+    service_path = get_service_path(service_id)
+    store = _get_store_path(service_id)
+    with _locked(store):
+        service_path.parent.mkdir(parents=True, exist_ok=True)
+        _remove_leftovers(service_path)
+        staging = _new_sibling(service_path, "restore")
+        staging.mkdir()
+        try:
+            if is_legacy_backup(filename):
+                found = _extract_archive(service_id, filename, staging, path)
+                if not found and path is None:
+                    raise RuntimeError("Backup archive is not in the expected format.")
+            else:
+                manifest = _load_manifest(_get_manifest_path(store, filename))
+                entries = [entry for entry in manifest["entries"] if _is_within(entry["path"], path)]
+                found = bool(entries)
+                _extract(store, entries, _load_codecs(store), staging, progress)
+            if not found and path is not None:
+                raise FileNotFoundError(f"'{path}' is not in this backup.")
+
+            if path is None:
+                # Keep uploads in progress across the restore
+                live_uploads = service_path / UPLOAD_DIR_NAME
+                if live_uploads.is_dir() and not live_uploads.is_symlink():
+                    os.rename(live_uploads, staging / UPLOAD_DIR_NAME)
+                parent_fd = os.open(service_path.parent, os.O_PATH | os.O_DIRECTORY | os.O_CLOEXEC)
+                try:
+                    _swap_in(service_path, staging, parent_fd, service_path.name)
+                except OSError:
+                    if (staging / UPLOAD_DIR_NAME).is_dir():
+                        os.rename(staging / UPLOAD_DIR_NAME, live_uploads)
+                    raise
+                finally:
+                    os.close(parent_fd)
             else:
-                raise RuntimeError("Backup archive is not in the expected format.")
+                # The live tree may contain symlinks planted by the service,
+                # so the target's parents are walked without following them
+                with sandbox.resolve(service_path, path, create_parents=True) as target:
+                    _swap_in(service_path, staging / path, target.dir_fd, target.name)
+        finally:
+            if staging.exists():
+                _remove_in_background(staging)
+    notify_changed(service_id, path or "")
 
-def delete_backup_file(service_id: int, filename: str):
+def get_restore_size(service_id: int, filename: str, path: Optional[str] = None) -> Optional[int]:
     """
-    Deletes a backup file from the filesystem.
+    Returns the bytes a restore of the backup (or of `path` in it) writes,
+    or None for legacy archives, whose contents are not indexed.
     """
-    backup_filepath = get_backup_path(service_id, filename)
-    if backup_filepath.exists():
-        backup_filepath.unlink()
-    else:
-        raise FileNotFoundError("Backup file not found.")
\ No newline at end of file
+    if is_legacy_backup(filename):
+        return None
+    manifest = _load_manifest(_get_manifest_path(_get_store_path(service_id), filename))
+    return sum(entry.get("size", 0) for entry in manifest["entries"] if entry["type"] == "file" and _is_within(entry["path"], path))
+
+def iter_backup_archive(service_id: int, filename: str) -> Iterator[bytes]:
+    """
+    Returns an iterator producing a backup as a tar.gz, built on the fly from
+    its manifest and laid out like the legacy archives. Raises
+    FileNotFoundError or BackupBusyError before streaming starts if the backup
+    does not exist or is being deleted.
+    """
+    store = _get_store_path(service_id)
+    # A shared lock held until the stream ends keeps a concurrent delete from
+    # freeing chunks that are still to be read
+    lock = contextlib.ExitStack()
+    lock.enter_context(_locked(store, shared=True, wait=False))
+    try:
+        manifest = _load_manifest(_get_manifest_path(store, filename))
+        codecs = _load_codecs(store)
+    except BaseException:
+        lock.close()
+        raise
+    tar_blocks = compression.coalesce(_iter_tar_blocks(store, manifest, codecs, str(service_id)), READ_CHUNK_SIZE)
+    return _iter_locked(lock, compression.parallel_compress(tar_blocks, "gzip", compression.DEFAULT_LEVELS["gzip"], settings.COMPRESSION_WORKERS))
+
+def _iter_locked(lock: contextlib.ExitStack, blocks: Iterator[bytes]) -> Iterator[bytes]:
+    # Releases the lock once the stream is exhausted or closed; a stream that
+    # is never started releases it when garbage collected, with its lock file
+    with lock:
+        yield from blocks
+
+def _iter_tar_blocks(store: Path, manifest: dict, codecs: Dict[str, str], root: str) -> Iterator[bytes]:
+    for entry in manifest["entries"]:
+        info = tarfile.TarInfo(f"{root}/{entry['path']}")
+        info.mode = entry["mode"]
+        info.mtime = entry["mtime_ns"] // 1_000_000_000
+        if entry["type"] == "dir":
+            info.type = tarfile.DIRTYPE
+        elif entry["type"] == "symlink":
+            info.type = tarfile.SYMTYPE
+            info.linkname = entry["target"]
+        else:
+            info.size = entry["size"]
+
+        yield info.tobuf(tarfile.PAX_FORMAT)
+        if entry["type"] == "file":
+            for digest, _ in entry["chunks"]:
+                yield _read_chunk(store, digest, codecs)
+            if entry["size"] % tarfile.BLOCKSIZE:
+                yield b"\0" * (tarfile.BLOCKSIZE - entry["size"] % tarfile.BLOCKSIZE)
+
+    yield b"\0" * (2 * tarfile.BLOCKSIZE)
+
+def delete_backup(service_id: int, filename: str):
+    """
+    Deletes a backup and frees the chunks no other backup references. Raises
+    BackupBusyError instead of waiting while the service's backups are in use.
+    """
+    if is_legacy_backup(filename):
+        backup_filepath = get_backup_path(service_id, filename)
+        if backup_filepath.exists():
+            backup_filepath.unlink()
+        else:
+            raise FileNotFoundError("Backup file not found.")
+        return
+
+    store = _get_store_path(service_id)
+    with _locked(store, wait=False):
+        manifest_path = _get_manifest_path(store, filename)
+        digests = _manifest_digests(_load_manifest(manifest_path))
+
+        # The manifest goes first: it must never outlive its chunks
+        manifest_path.unlink()
+        index = _open_index(store)
+        try:
+            with index:
+                index.executemany("UPDATE chunks SET refs = refs - 1 WHERE digest = ?", [(digest,) for digest in digests])
+                freed = [digest for (digest,) in index.execute("SELECT digest FROM chunks WHERE refs <= 0")]
+                index.execute("DELETE FROM chunks WHERE refs <= 0")
+        finally:
+            index.close()
+
+        for digest in freed:
+            _get_chunk_path(store, digest).unlink(missing_ok=True)
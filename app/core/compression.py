@@ -0,0 +1,101 @@
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+import zstandard
+
+# Codecs for backup chunks and streamed archives. Data is compressed in
+# independent blocks so several threads can work at once (zlib and zstandard
+# release the GIL); concatenated gzip members and zstd frames are themselves
+# valid gzip and zstd streams, so the blocks can simply be sent one after the
+# other.
+CODECS = ("zstd", "gzip", "none")
+DEFAULT_LEVELS = {"zstd": 3, "gzip": 6, "none": 0}
+LEVEL_RANGES = {"zstd": (1, 19), "gzip": (1, 9), "none": (0, 0)}
+FILE_SUFFIXES = {"zstd": ".zst", "gzip": ".gz", "none": ""}
+MEDIA_TYPES = {"zstd": "application/zstd", "gzip": "application/gzip", "none": "application/octet-stream"}
+
+_local = threading.local()
+
+def validate(codec: str, level: Optional[int] = None) -> int:
+    """
+    Checks a codec and level, returning the level to use.
+    Raises ValueError if either is not supported.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression codec '{codec}'. Use one of: {', '.join(CODECS)}.")
+    if level is None:
+        return DEFAULT_LEVELS[codec]
+    low, high = LEVEL_RANGES[codec]
+    if not low <= level <= high:
+        raise ValueError(f"Compression level for {codec} must be between {low} and {high}.")
+    return level
+
+def _zstd_compressor(level: int) -> zstandard.ZstdCompressor:
+    # Compressors are not thread-safe but are cheap to keep around per thread
+    compressors = getattr(_local, "zstd", None)
+    if compressors is None:
+        compressors = _local.zstd = {}
+    compressor = compressors.get(level)
+    if compressor is None:
+        compressor = compressors[level] = zstandard.ZstdCompressor(level=level)
+    return compressor
+
+def compress(codec: str, data: bytes, level: int) -> bytes:
+    """
+    Compresses one self-contained block: a gzip member or a zstd frame.
+    """
+    if codec == "zstd":
+        return _zstd_compressor(level).compress(data)
+    if codec == "gzip":
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31) # wbits=31 writes a gzip member
+        return compressor.compress(data) + compressor.flush()
+    return data
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return zlib.decompress(data, 47) # Accepts both gzip and zlib headers
+    return data
+
+def coalesce(pieces: Iterable[bytes], block_size: int) -> Iterator[bytes]:
+    """
+    Joins small pieces into blocks of at least `block_size` bytes, so that
+    headers and padding do not each become a compression block of their own.
+    """
+    pending = []
+    pending_size = 0
+    for piece in pieces:
+        pending.append(piece)
+        pending_size += len(piece)
+        if pending_size >= block_size:
+            yield b"".join(pending)
+            pending, pending_size = [], 0
+    if pending:
+        yield b"".join(pending)
+
+def parallel_compress(blocks: Iterable[bytes], codec: str, level: int, workers: int) -> Iterator[bytes]:
+    """
+    Compresses blocks on a pool of `workers` threads and yields them in order.
+    At most 2 * workers blocks are in flight, so memory stays bounded when the
+    consumer is slower than the producer.
+    """
+    if codec == "none":
+        yield from blocks
+        return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compress") as executor:
+        pending = deque()
+        try:
+            for block in blocks:
+                pending.append(executor.submit(compress, codec, block, level))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -1,3 +1,7 @@
+import os
+import socket
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -13,12 +17,64 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str
+    DB_POOL_SIZE: int = 10 # Per engine; the sync and async engines each have a pool
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_TIMEOUT_SECONDS: float = 30
 
     # Stripe
     STRIPE_PUBLIC_KEY: str
     STRIPE_SECRET_KEY: str
     STRIPE_WEBHOOK_SECRET: str
 
+    # Per-service resource metrics
+    SERVICE_METRICS_INTERVAL_SECONDS: int = 10
+    SERVICE_METRICS_RETENTION_SECONDS: int = 3600
+    SERVICE_METRICS_WORKERS: int = 8
+
+    # Background jobs
+    NODE_NAME: str = socket.gethostname()
+    JOB_WORKERS: int = 8
+    # Enforced per panel worker process: with several uvicorn workers a node
+    # runs up to this many jobs per worker
+    JOB_CONCURRENCY_PER_NODE: int = 2
+    # A running job whose worker has not refreshed its heartbeat for
+    # JOB_LEASE_SECONDS is considered orphaned and failed
+    JOB_HEARTBEAT_SECONDS: int = 15
+    JOB_LEASE_SECONDS: int = 60
+
+    # Backups
+    BACKUP_CODEC: str = "zstd"
+    BACKUP_COMPRESSION_LEVEL: Optional[int] = None # None uses the codec's default
+    COMPRESSION_WORKERS: int = os.cpu_count() or 1
+
+    # Disk usage accounting
+    DISK_USAGE_WATCH: bool = True # inotify watches on service directories
+    DISK_USAGE_FLUSH_INTERVAL_SECONDS: float = 1 # How often watched changes are applied
+    DISK_USAGE_RESCAN_INTERVAL_SECONDS: int = 6 * 3600
+
+    # File search
+    SEARCH_MAX_FILE_BYTES: int = 1024 * 1024 # Larger files are not indexed
+    SEARCH_REFRESH_SECONDS: float = 30 # Index age after which a search re-checks mtimes
+
+    # VM provisioning
+    VM_DISK_CLONE_MODE: str = "auto" # auto, reflink or overlay
+    VM_FLATTEN_AFTER_PROVISION: bool = False
+    VM_HUGEPAGES: bool = False # Back guest memory with preallocated host hugepages
+    VM_IOTHREADS: int = 1
+
+    # libvirt connections
+    LIBVIRT_WORKERS: int = 4 # Executor threads (and connections) every libvirt call runs on
+    LIBVIRT_KEEPALIVE_INTERVAL: int = 5 # Seconds between keepalive probes
+    LIBVIRT_KEEPALIVE_COUNT: int = 3 # Unanswered probes before the connection is dropped
+    LIBVIRT_RECONNECT_DELAY_SECONDS: float = 2
+
+    # Docker engine API
+    DOCKER_SOCKET: str = "/var/run/docker.sock"
+    DOCKER_API_VERSION: str = "1.41"
+    DOCKER_POOL_SIZE: int = 16 # Keep-alive connections to the daemon
+    DOCKER_KEEPALIVE_SECONDS: float = 30
+    DOCKER_TIMEOUT_SECONDS: float = 60
 
     class Config:
         case_sensitive = True
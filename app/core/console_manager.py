@@ -0,0 +1,236 @@
+import asyncio
+import codecs
+import threading
+from collections import deque
+from typing import Dict, Optional, Set, Tuple
+
+from docker.errors import NotFound, APIError
+from docker.utils.socket import frames_iter
+
+from app.core.docker_manager import get_docker_client
+
+# Output chunks buffered per viewer. When a slow client falls this far behind
+# the oldest chunks are dropped and the viewer is told how many were lost.
+VIEWER_BUFFER_SIZE = 256
+# Recent output replayed to a viewer that joins an already attached console
+SCROLLBACK_SIZE = 200
+
+class ConsoleViewer:
+    """
+    One WebSocket client of a console. Output is pushed from the event loop and
+    sent in coalesced batches, so a burst of lines becomes a single frame.
+    """
+
+    def __init__(self):
+        self._chunks = deque()
+        self._dropped = 0
+        self._closed = False
+        self._event = asyncio.Event()
+
+    def push(self, text: str):
+        if len(self._chunks) >= VIEWER_BUFFER_SIZE:
+            self._chunks.popleft()
+            self._dropped += 1
+        self._chunks.append(text)
+        self._event.set()
+
+    def close(self):
+        self._closed = True
+        self._event.set()
+
+    async def next_batch(self) -> Optional[str]:
+        """
+        Waits for output and returns everything buffered since the last call,
+        or None once the console has ended.
+        """
+        while not self._chunks:
+            if self._closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        batch = "".join(self._chunks)
+        self._chunks.clear()
+        if self._dropped:
+            batch = f"[... {self._dropped} messages dropped ...]\n{batch}"
+            self._dropped = 0
+        return batch
+
+class ConsoleSession:
+    """
+    A single attach to a container's stdio, shared by every viewer of that
+    container. The socket is read on a dedicated thread so the event loop
+    never blocks on docker.
+    """
+
+    def __init__(self, container_id: str, loop: asyncio.AbstractEventLoop):
+        self.container_id = container_id
+        self.viewers = set()
+        self._loop = loop
+        self._scrollback = deque(maxlen=SCROLLBACK_SIZE)
+        self._socket = None
+        self._tty = False
+        self._attached = asyncio.Event()
+        self._attach_error: Optional[Exception] = None
+        self._attach_task = None
+        self._detached = False
+        self.finished = False
+        self.joining = 0 # Viewers waiting in join() for the attach
+
+    def attach(self):
+        """
+        Opens the attach socket and starts the reader thread. Blocking.
+        """
+        d_client = get_docker_client()
+        try:
+            container = d_client.containers.get(self.container_id)
+            self._tty = container.attrs.get("Config", {}).get("Tty", False)
+            self._socket = container.attach_socket(
+                params={"stdin": 1, "stdout": 1, "stderr": 1, "stream": 1, "logs": 1}
+            )
+        except NotFound:
+            raise RuntimeError("Container not found.")
+        except APIError as e:
+            raise RuntimeError(f"Failed to attach to container: {e}")
+
+        threading.Thread(target=self._pump, name=f"console-{self.container_id[:12]}", daemon=True).start()
+
+    def _pump(self):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            for _stream, data in frames_iter(self._socket, self._tty):
+                text = decoder.decode(data)
+                if text:
+                    self._loop.call_soon_threadsafe(self._publish, text)
+        except (OSError, ValueError):
+            pass  # Socket closed by detach() or the container went away
+        finally:
+            self._loop.call_soon_threadsafe(self._finish)
+
+    def _publish(self, text: str):
+        self._scrollback.append(text)
+        for viewer in self.viewers:
+            viewer.push(text)
+
+    def _finish(self):
+        self.finished = True
+        for viewer in self.viewers:
+            viewer.close()
+        self.viewers.clear()
+        if _sessions.get(self.container_id) is self:
+            del _sessions[self.container_id]
+
+    def start_attach(self):
+        """
+        Attaches on the executor. Runs as its own task so a viewer that goes
+        away meanwhile cannot abandon a half-open socket.
+        """
+        self._attach_task = self._loop.create_task(self._attach())
+
+    async def _attach(self):
+        try:
+            await self._loop.run_in_executor(None, self.attach)
+        except Exception as e:
+            self._attach_error = e
+            self._finish()
+            return
+        finally:
+            self._attached.set()
+        # Everyone who asked for it went away while docker was attaching
+        await _release(self)
+
+    async def wait_attached(self):
+        """
+        Waits until the container is attached; raises the attach error.
+        """
+        await self._attached.wait()
+        if self._attach_error is not None:
+            raise self._attach_error
+
+    def add_viewer(self, viewer: ConsoleViewer):
+        for text in self._scrollback:
+            viewer.push(text)
+        if self.finished:
+            # E.g. a stopped container: the logs were replayed and the socket closed
+            viewer.close()
+        else:
+            self.viewers.add(viewer)
+
+    def write(self, data: bytes):
+        """
+        Writes to the container's stdin. Blocking.
+        """
+        raw_socket = getattr(self._socket, "_sock", self._socket)
+        raw_socket.sendall(data)
+
+    def detach(self):
+        """
+        Closes the attach socket, which also ends the reader thread. Blocking.
+        """
+        raw_socket = getattr(self._socket, "_sock", self._socket)
+        try:
+            raw_socket.shutdown(2)
+        except OSError:
+            pass
+        self._socket.close()
+
+_sessions: Dict[str, ConsoleSession] = {}
+_sessions_lock = asyncio.Lock()
+# Releases scheduled from join() while it was being cancelled
+_cleanups: Set[asyncio.Future] = set()
+
+async def join(container_id: str) -> Tuple[ConsoleSession, ConsoleViewer]:
+    """
+    Registers a new viewer for a container console, attaching to the
+    container only if no other viewer is already attached.
+    """
+    # The session is registered before attaching, so the reader thread can
+    # always find (and unregister) it, and the lock is not held while
+    # docker is called, so one slow attach does not hold up other consoles
+    async with _sessions_lock:
+        session = _sessions.get(container_id)
+        if session is None:
+            session = _sessions[container_id] = ConsoleSession(container_id, asyncio.get_running_loop())
+            session.start_attach()
+        session.joining += 1
+    viewer = None
+    try:
+        await session.wait_attached()
+        viewer = ConsoleViewer()
+        session.add_viewer(viewer)
+    finally:
+        session.joining -= 1
+        if viewer is None and session._attached.is_set():
+            # Disconnected (or failed) before getting a viewer. If the
+            # attach is still running, _attach releases the session itself.
+            cleanup = asyncio.ensure_future(_release(session))
+            _cleanups.add(cleanup)
+            cleanup.add_done_callback(_cleanups.discard)
+    return session, viewer
+
+async def leave(session: ConsoleSession, viewer: ConsoleViewer):
+    """
+    Unregisters a viewer, detaching from the container when it was the last one.
+    """
+    session.viewers.discard(viewer)
+    await _release(session)
+
+async def _release(session: ConsoleSession):
+    """
+    Detaches a session nobody views or waits for any more.
+    """
+    async with _sessions_lock:
+        if session.viewers or session.joining or session._detached:
+            return
+        session._detached = True
+        if _sessions.get(session.container_id) is session:
+            del _sessions[session.container_id]
+    if session._socket is not None:
+        await asyncio.get_running_loop().run_in_executor(None, session.detach)
+
+async def send_input(session: ConsoleSession, command: str):
+    """
+    Sends a command line to the container's stdin.
+    """
+    if not command.endswith("\n"):
+        command += "\n"
+    await asyncio.get_running_loop().run_in_executor(None, session.write, command.encode("utf-8"))
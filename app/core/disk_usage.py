@@ -0,0 +1,450 @@
+import errno
+import os
+import select
+import stat
+import threading
+import time
+from typing import Dict, List, Optional, Set, Union
+
+import psutil
+
+from app.core import file_manager, inotify, sandbox
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.service_model import Service
+
+# Keeps byte and inode totals of every service directory, per directory, so a
+# quota check reads one number instead of walking the tree. The index of a
+# service is a tree of directory nodes, each holding the sizes of its files
+# and the recursive totals of everything below it.
+#
+# Updates are state-based: a changed path is lstat'ed again (or rescanned if
+# it is a directory) and the difference is applied up the tree, so the same
+# change reported twice is harmless. Changes come from the file manager
+# itself (see file_manager.add_change_listener) and from inotify watches on
+# every directory, which catch writes made by containers. Events are
+# coalesced and applied every DISK_USAGE_FLUSH_INTERVAL_SECONDS. A niced
+# background thread rescans every service periodically to correct whatever
+# the watches missed (queue overflows, the watch limit, renamed trees).
+_WATCH_MASK = (
+    inotify.IN_CREATE | inotify.IN_DELETE | inotify.IN_MODIFY | inotify.IN_CLOSE_WRITE
+    | inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO | inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF
+    | inotify.IN_ONLYDIR
+)
+_DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+
+class _Dir:
+    __slots__ = ("parent", "name", "dirs", "files", "size_bytes", "inodes")
+
+    def __init__(self, parent: Optional["_Dir"], name: str):
+        self.parent = parent
+        self.name = name
+        self.dirs: Dict[str, _Dir] = {}
+        self.files: Dict[str, int] = {}
+        self.size_bytes = 0 # Files below this directory, recursively
+        self.inodes = 0 # Files and directories below this directory
+
+def _adjust(node: _Dir, size_delta: int, inode_delta: int):
+    while node is not None:
+        node.size_bytes += size_delta
+        node.inodes += inode_delta
+        node = node.parent
+
+class _Index:
+    __slots__ = ("root", "pending", "touched", "lock", "rescan_lock")
+
+    def __init__(self):
+        self.root: Optional[_Dir] = None
+        self.pending: Optional[_Dir] = None # Tree being built by a rescan
+        self.touched: Optional[Set[str]] = None # Paths refreshed during a rescan
+        self.lock = threading.Lock()
+        self.rescan_lock = threading.Lock()
+
+_indexes: Dict[int, _Index] = {}
+_indexes_lock = threading.Lock()
+
+_inotify: Optional[inotify.Inotify] = None
+_watches: Dict[int, tuple] = {} # wd -> (service_id, _Dir)
+_watch_lock = threading.Lock()
+_watch_limit_reached = False
+
+_dirty: Dict[int, Set[str]] = {}
+_dirty_lock = threading.Lock()
+_stopping = threading.Event()
+
+def _watch(service_id: int, node: _Dir, fd: int):
+    global _watch_limit_reached
+    if _inotify is None or _watch_limit_reached:
+        return
+    try:
+        # Watching through the descriptor cannot be redirected by a symlink
+        wd = _inotify.add_watch(f"/proc/self/fd/{fd}", _WATCH_MASK)
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            _watch_limit_reached = True
+            print("Disk usage: inotify watch limit reached (fs.inotify.max_user_watches), relying on rescans.")
+        return
+    with _watch_lock:
+        _watches[wd] = (service_id, node)
+
+def _read_dir(service_id: int, node: _Dir, fd: int) -> List[str]:
+    _watch(service_id, node, fd)
+    subdirs = []
+    with os.scandir(fd) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    node.dirs[entry.name] = _Dir(node, entry.name)
+                    subdirs.append(entry.name)
+                else:
+                    node.files[entry.name] = entry.stat(follow_symlinks=False).st_size
+            except FileNotFoundError:
+                pass # Removed while scanning
+    return subdirs
+
+def _scan_tree(service_id: int, root: _Dir, fd: int) -> _Dir:
+    """
+    Fills `root` from the directory open at `fd`, which is closed. Only one
+    descriptor per level is open at a time.
+    """
+    order = [root]
+    stack = []
+    try:
+        stack.append((root, fd, iter(_read_dir(service_id, root, fd))))
+        while stack:
+            node, dir_fd, pending = stack[-1]
+            name = next(pending, None)
+            if name is None:
+                stack.pop()
+                os.close(dir_fd)
+                continue
+            child = node.dirs[name]
+            try:
+                child_fd = os.open(name, _DIR_FLAGS, dir_fd=dir_fd)
+            except OSError:
+                del node.dirs[name] # Removed or replaced while scanning
+                continue
+            order.append(child)
+            stack.append((child, child_fd, iter(_read_dir(service_id, child, child_fd))))
+    finally:
+        for _, dir_fd, _ in stack:
+            os.close(dir_fd)
+
+    # Children were appended after their parents, so this sums bottom-up
+    for node in reversed(order):
+        node.size_bytes += sum(node.files.values())
+        node.inodes += len(node.files) + len(node.dirs)
+        if node.parent is not None and node is not root:
+            node.parent.size_bytes += node.size_bytes
+            node.parent.inodes += node.inodes
+    return root
+
+def _stat_entry(service_id: int, relative_path: str) -> Union[None, int, _Dir]:
+    """
+    Returns None if the path is gone, the size of a file or a scanned
+    directory tree.
+    """
+    try:
+        with sandbox.resolve(file_manager.get_service_path(service_id), relative_path) as target:
+            entry_stat = target.lstat()
+            if not stat.S_ISDIR(entry_stat.st_mode):
+                return entry_stat.st_size
+            fd = target.open(_DIR_FLAGS)
+            name = target.name
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return None
+    return _scan_tree(service_id, _Dir(None, name), fd)
+
+def _get_index(service_id: int) -> _Index:
+    with _indexes_lock:
+        index = _indexes.get(service_id)
+        if index is None:
+            index = _indexes[service_id] = _Index()
+        return index
+
+def _ensure_index(service_id: int) -> _Index:
+    index = _get_index(service_id)
+    if index.root is None:
+        rescan(service_id)
+    return index
+
+def rescan(service_id: int):
+    """
+    Rebuilds the index of a service from disk. Blocking.
+    """
+    index = _get_index(service_id)
+    with index.rescan_lock:
+        tree = _Dir(None, "")
+        with index.lock:
+            index.touched = set()
+            index.pending = tree
+        try:
+            with sandbox.open_directory(file_manager.get_service_path(service_id), "/") as fd:
+                _scan_tree(service_id, tree, os.dup(fd))
+        except BaseException:
+            with index.lock:
+                index.pending = index.touched = None
+            raise
+        with index.lock:
+            index.root, index.pending = tree, None
+            touched, index.touched = index.touched, None
+    # Changes applied to the old tree while this one was being built
+    for path in touched:
+        refresh(service_id, path)
+
+def refresh(service_id: int, relative_path: str):
+    """
+    Brings the index up to date with one path after it changed on disk. A
+    no-op for services that are not indexed yet.
+    """
+    index = _indexes.get(service_id)
+    if index is None:
+        return
+    parts = sandbox.split_path(relative_path)
+    if not parts:
+        if index.root is not None:
+            rescan(service_id)
+        return
+
+    with index.lock:
+        if index.touched is not None:
+            index.touched.add("/".join(parts))
+        if index.root is None:
+            return # The first scan is running and will replay this path
+        new = _stat_entry(service_id, "/".join(parts))
+
+        parent = index.root
+        for part in parts[:-1]:
+            child = parent.dirs.get(part)
+            if child is None:
+                if new is None:
+                    return
+                # Its own event will rescan it; until then it only holds this entry
+                replaced = parent.files.pop(part, None)
+                if replaced is not None:
+                    _adjust(parent, -replaced, -1)
+                child = parent.dirs[part] = _Dir(parent, part)
+                _adjust(parent, 0, 1)
+            parent = child
+
+        name = parts[-1]
+        old_size = parent.files.pop(name, None)
+        if old_size is not None:
+            _adjust(parent, -old_size, -1)
+        old_dir = parent.dirs.pop(name, None)
+        if old_dir is not None:
+            old_dir.parent = None # Detached: its watches no longer map into the tree
+            _adjust(parent, -old_dir.size_bytes, -(old_dir.inodes + 1))
+
+        if isinstance(new, _Dir):
+            new.parent = parent
+            parent.dirs[name] = new
+            _adjust(parent, new.size_bytes, new.inodes + 1)
+        elif new is not None:
+            parent.files[name] = new
+            _adjust(parent, new, 1)
+
+file_manager.add_change_listener(refresh)
+
+def forget(service_id: int):
+    """
+    Drops the index and watches of a service, e.g. when it is deleted.
+    """
+    with _indexes_lock:
+        _indexes.pop(service_id, None)
+    with _watch_lock:
+        wds = [wd for wd, (watched_id, _) in _watches.items() if watched_id == service_id]
+        for wd in wds:
+            del _watches[wd]
+    instance = _inotify
+    for wd in wds if instance is not None else ():
+        try:
+            instance.rm_watch(wd)
+        except OSError:
+            pass # Already gone with its directory
+
+def get_service_bytes(service_id: int) -> int:
+    """
+    Returns the bytes used by a service's files. O(1) once the service is
+    indexed; the first call after startup may have to scan it.
+    """
+    return _ensure_index(service_id).root.size_bytes
+
+def get_path_bytes(service_id: int, path: str) -> int:
+    """
+    Returns the bytes used by a file or directory of a service, 0 if it
+    does not exist.
+    """
+    node = _ensure_index(service_id).root
+    parts = sandbox.split_path(path)
+    for part in parts[:-1]:
+        node = node.dirs.get(part)
+        if node is None:
+            return 0
+    if not parts:
+        return node.size_bytes
+    child = node.dirs.get(parts[-1])
+    if child is not None:
+        return child.size_bytes
+    return node.files.get(parts[-1], 0)
+
+def get_usage(service_id: int, path: str = "/", max_directories: int = 100) -> dict:
+    """
+    Returns the bytes and inodes used below a directory of a service, with
+    its largest subdirectories.
+    """
+    node = _ensure_index(service_id).root
+    parts = sandbox.split_path(path)
+    for part in parts:
+        node = node.dirs.get(part)
+        if node is None:
+            raise FileNotFoundError("Directory not found.")
+    prefix = "/".join(parts)
+    largest = sorted(list(node.dirs.values()), key=lambda child: child.size_bytes, reverse=True)[:max_directories]
+    return {
+        "path": prefix,
+        "size_bytes": node.size_bytes,
+        "inodes": node.inodes,
+        "directories": [
+            {
+                "name": child.name,
+                "path": f"{prefix}/{child.name}" if prefix else child.name,
+                "size_bytes": child.size_bytes,
+                "inodes": child.inodes,
+            }
+            for child in largest
+        ],
+    }
+
+def _mark(service_id: int, relative_path: str):
+    with _dirty_lock:
+        _dirty.setdefault(service_id, set()).add(relative_path)
+
+def _path_in_index(index: _Index, node: _Dir) -> Optional[str]:
+    parts = []
+    while node.parent is not None:
+        parts.append(node.name)
+        node = node.parent
+    if node is not index.root and node is not index.pending:
+        return None # Removed or replaced since it was watched
+    return "/".join(reversed(parts))
+
+def _handle(event: inotify.Event):
+    if event.mask & inotify.IN_Q_OVERFLOW:
+        with _indexes_lock:
+            service_ids = list(_indexes)
+        for service_id in service_ids:
+            _mark(service_id, "")
+        return
+    with _watch_lock:
+        if event.mask & inotify.IN_IGNORED:
+            _watches.pop(event.wd, None)
+            return
+        watched = _watches.get(event.wd)
+    if watched is None:
+        return
+    service_id, node = watched
+    index = _indexes.get(service_id)
+    if index is None:
+        return
+    if event.mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF):
+        if node is index.root:
+            _mark(service_id, "") # The whole directory was swapped, e.g. by a restore
+        return
+    base = _path_in_index(index, node)
+    if base is not None:
+        _mark(service_id, f"{base}/{event.name}" if base else event.name)
+
+def _read_events(instance: inotify.Inotify):
+    try:
+        while not _stopping.is_set():
+            ready, _, _ = select.select([instance.fd], [], [], 1.0)
+            if ready:
+                for event in instance.read():
+                    _handle(event)
+    finally:
+        instance.close()
+
+def flush():
+    """
+    Applies the changes reported by the watches since the last flush.
+    """
+    global _dirty
+    with _dirty_lock:
+        dirty, _dirty = _dirty, {}
+    for service_id, paths in dirty.items():
+        if "" in paths:
+            paths = {""}
+        for path in sorted(paths):
+            try:
+                refresh(service_id, path)
+            except Exception as e:
+                print(f"Disk usage refresh of service {service_id} failed: {e}")
+
+def _run_flush():
+    while not _stopping.wait(settings.DISK_USAGE_FLUSH_INTERVAL_SECONDS):
+        flush()
+
+def _lower_priority():
+    # Per-thread on Linux: only this thread yields CPU and disk time
+    thread_id = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, thread_id, 19)
+        psutil.Process(thread_id).ionice(psutil.IOPRIO_CLASS_IDLE)
+    except (AttributeError, OSError, psutil.Error):
+        pass
+
+def reconcile():
+    """
+    Rescans every service and drops the indexes of deleted ones. Blocking.
+    """
+    db = SessionLocal()
+    try:
+        service_ids = [service_id for service_id, in db.query(Service.id).all()]
+    finally:
+        db.close()
+    live_ids = set(service_ids)
+    with _indexes_lock:
+        removed = [service_id for service_id in _indexes if service_id not in live_ids]
+    for service_id in removed:
+        forget(service_id)
+    for service_id in service_ids:
+        if _stopping.is_set():
+            return
+        try:
+            rescan(service_id)
+        except Exception as e:
+            print(f"Disk usage rescan of service {service_id} failed: {e}")
+
+def _run_reconcile():
+    _lower_priority()
+    while not _stopping.is_set():
+        started = time.monotonic()
+        try:
+            reconcile()
+        except Exception as e:
+            print(f"Disk usage rescan failed: {e}")
+        _stopping.wait(max(0, settings.DISK_USAGE_RESCAN_INTERVAL_SECONDS - (time.monotonic() - started)))
+
+def start():
+    """
+    Starts the watches and the flush and rescan threads. The first rescan
+    indexes every service.
+    """
+    global _inotify
+    _stopping.clear()
+    if settings.DISK_USAGE_WATCH and _inotify is None:
+        _inotify = inotify.open_instance(inotify.IN_NONBLOCK | inotify.IN_CLOEXEC)
+        if _inotify is None:
+            print("Disk usage: inotify is not available, relying on rescans.")
+    if _inotify is not None:
+        threading.Thread(target=_read_events, args=(_inotify,), name="disk-usage-events", daemon=True).start()
+        threading.Thread(target=_run_flush, name="disk-usage-flush", daemon=True).start()
+    threading.Thread(target=_run_reconcile, name="disk-usage-rescan", daemon=True).start()
+
+def stop():
+    global _inotify
+    _stopping.set()
+    _inotify = None # Closed by the events thread
+    with _watch_lock:
+        _watches.clear()
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from app.core.config import settings
+
+# Thin asyncio client for the Docker Engine API over the daemon's unix socket.
+# Requests act on container ids directly (docker-py's containers.get() costs an
+# extra inspect round-trip per call) and share a pool of keep-alive
+# connections. The session lives on a dedicated I/O loop thread so it can be
+# used both from the panel's event loop (run_async) and from worker threads
+# (run), without either blocking on the other.
+
+class DockerError(RuntimeError):
+    """
+    An error response from the Docker daemon, or the daemon being unreachable.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_session: Optional[aiohttp.ClientSession] = None
+_loop_lock = threading.Lock()
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="docker-api", daemon=True).start()
+            _loop = loop
+        return _loop
+
+def _get_session() -> aiohttp.ClientSession:
+    # Only called on the I/O loop, so no locking is needed
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.UnixConnector(
+            path=settings.DOCKER_SOCKET,
+            limit=settings.DOCKER_POOL_SIZE,
+            keepalive_timeout=settings.DOCKER_KEEPALIVE_SECONDS,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=settings.DOCKER_TIMEOUT_SECONDS),
+        )
+    return _session
+
+def _submit(coro: Coroutine) -> Future:
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+def run(coro: Coroutine) -> Any:
+    """
+    Runs one of this module's coroutines from synchronous code. Blocking.
+    """
+    return _submit(coro).result()
+
+async def run_async(coro: Coroutine) -> Any:
+    """
+    Awaits one of this module's coroutines from another event loop, e.g.
+    `await docker_api.run_async(docker_api.start_container(container_id))`.
+    """
+    return await asyncio.wrap_future(_submit(coro))
+
+async def request(method: str, path: str, params: Optional[dict] = None, body: Any = None, timeout: Optional[float] = None) -> Tuple[int, Any]:
+    """
+    Sends one API request and returns (status, decoded JSON body or None).
+    Raises DockerError for 4xx/5xx responses other than 304 and 404, which
+    callers treat as "nothing to do" and "not found".
+    """
+    kwargs = {"params": params, "json": body}
+    if timeout is not None:
+        kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+    try:
+        url = f"http://docker/v{settings.DOCKER_API_VERSION}/{path.lstrip('/')}"
+        async with _get_session().request(method, url, **kwargs) as response:
+            raw = await response.read()
+            status = response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+        raise DockerError(f"Docker is not available: {str(e) or type(e).__name__}")
+
+    data = json.loads(raw) if raw else None
+    if status >= 400 and status != 404:
+        message = data.get("message") if isinstance(data, dict) else None
+        raise DockerError(message or f"HTTP {status}", status)
+    return status, data
+
+async def _action(container_id: str, action: str, params: Optional[dict] = None, timeout: Optional[float] = None) -> bool:
+    status, _ = await request("POST", f"containers/{container_id}/{action}", params=params, timeout=timeout)
+    return status != 404
+
+async def start_container(container_id: str) -> bool:
+    """
+    Starts a container. Returns False if it does not exist.
+    """
+    return await _action(container_id, "start")
+
+async def stop_container(container_id: str, grace_seconds: int = 10) -> bool:
+    """
+    Stops a container, killing it after `grace_seconds`. Returns False if it does not exist.
+    """
+    return await _action(container_id, "stop", {"t": grace_seconds}, timeout=settings.DOCKER_TIMEOUT_SECONDS + grace_seconds)
+
+async def restart_container(container_id: str, grace_seconds: int = 10) -> bool:
+    return await _action(container_id, "restart", {"t": grace_seconds}, timeout=settings.DOCKER_TIMEOUT_SECONDS + grace_seconds)
+
+async def remove_container(container_id: str, force: bool = True) -> bool:
+    """
+    Removes a container, stopping it first if `force`. Returns False if it does not exist.
+    """
+    status, _ = await request("DELETE", f"containers/{container_id}", params={"force": "1" if force else "0"})
+    return status != 404
+
+async def get_container_status(container_id: str) -> str:
+    status, data = await request("GET", f"containers/{container_id}/json")
+    if status == 404:
+        return "not_found"
+    return data["State"]["Status"]
+
+async def list_container_statuses(container_ids: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Returns the status of every container, or only of `container_ids`, with
+    a single list call. Containers that do not exist are left out.
+    """
+    params = {"all": "1"}
+    if container_ids is not None:
+        params["filters"] = json.dumps({"id": container_ids})
+    _, data = await request("GET", "containers/json", params=params)
+    return {container["Id"]: container["State"] for container in data or []}
+
+async def get_container_stats(container_id: str) -> Optional[dict]:
+    """
+    Returns one raw stats sample (with precpu_stats), or None if the container does not exist.
+    """
+    status, data = await request("GET", f"containers/{container_id}/stats", params={"stream": "0"})
+    return None if status == 404 else data
+
+async def _close():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+def close():
+    """
+    Closes the connection pool and stops the I/O loop. Called on shutdown.
+    """
+    global _loop
+    with _loop_lock:
+        loop, _loop = _loop, None
+    if loop is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout=5)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
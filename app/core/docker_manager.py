@@ -1,18 +1,29 @@
+import threading
+
 import docker
-from docker.errors import NotFound, APIError
+from docker.errors import APIError, DockerException
 
-# Initialize Docker client
-try:
-    client = docker.from_env()
-except APIError:
-    client = None
+from app.core import docker_api
+from app.core.config import settings
+from app.core.file_manager import get_service_path
 
-def get_docker_client():
-    if client is None:
-        raise RuntimeError("Docker is not available or not configured correctly.")
-    return client
+# Container actions, status and stats go through docker_api's pooled asyncio
+# client; the functions here are its blocking wrappers for worker threads.
+# docker-py is still used, created on first use, for container creation,
+# attach sockets and the events stream.
 
-from app.core.file_manager import get_service_path
+_client = None
+_client_lock = threading.Lock()
+
+def get_docker_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            try:
+                _client = docker.DockerClient(base_url=f"unix://{settings.DOCKER_SOCKET}", version=settings.DOCKER_API_VERSION)
+            except DockerException:
+                raise RuntimeError("Docker is not available or not configured correctly.")
+        return _client
 
 def create_container(service_id: int, image: str, name: str, command: str = None, ports: dict = None, environment: dict = None, mem_limit: str = "256m", cpu_shares: int = 512):
     """
@@ -35,6 +46,7 @@ def create_container(service_id: int, image: str, name: str, command: str = None
             environment=environment,
             mem_limit=mem_limit,
             cpu_shares=cpu_shares, # Relative weight, 1024 is the default
+            stdin_open=True, # Keep stdin open so the web console can send commands
             detach=True,
         )
         return container
@@ -42,71 +54,79 @@ def create_container(service_id: int, image: str, name: str, command: str = None
         # Handle creation errors, e.g., name conflict
         raise RuntimeError(f"Failed to create container: {e}")
 
+def _call(coro, failure: str):
+    try:
+        return docker_api.run(coro)
+    except docker_api.DockerError as e:
+        raise RuntimeError(f"{failure}: {e}")
+
 def start_container(container_id: str):
     """
     Starts a Docker container.
     """
-    d_client = get_docker_client()
-    try:
-        container = d_client.containers.get(container_id)
-        container.start()
-        return True
-    except NotFound:
-        return False
-    except APIError as e:
-        raise RuntimeError(f"Failed to start container: {e}")
+    return _call(docker_api.start_container(container_id), "Failed to start container")
 
 def stop_container(container_id: str):
     """
     Stops a Docker container.
     """
-    d_client = get_docker_client()
-    try:
-        container = d_client.containers.get(container_id)
-        container.stop()
-        return True
-    except NotFound:
-        return False
-    except APIError as e:
-        raise RuntimeError(f"Failed to stop container: {e}")
+    return _call(docker_api.stop_container(container_id), "Failed to stop container")
 
 def restart_container(container_id: str):
     """
     Restarts a Docker container.
     """
-    d_client = get_docker_client()
-    try:
-        container = d_client.containers.get(container_id)
-        container.restart()
-        return True
-    except NotFound:
-        return False
-    except APIError as e:
-        raise RuntimeError(f"Failed to restart container: {e}")
+    return _call(docker_api.restart_container(container_id), "Failed to restart container")
 
 def remove_container(container_id: str):
     """
     Removes a Docker container.
     """
-    d_client = get_docker_client()
-    try:
-        container = d_client.containers.get(container_id)
-        container.remove(force=True) # Force removal even if running
-        return True
-    except NotFound:
-        return False
-    except APIError as e:
-        raise RuntimeError(f"Failed to remove container: {e}")
+    return _call(docker_api.remove_container(container_id, force=True), "Failed to remove container")
 
 def get_container_status(container_id: str):
     """
     Gets the status of a Docker container.
     """
-    d_client = get_docker_client()
-    try:
-        container = d_client.containers.get(container_id)
-        return container.status
-    except NotFound:
-        return "not_found"
-    except APIError as e:
-        raise RuntimeError(f"Failed to get container status: {e}")
\ No newline at end of file
+    return _call(docker_api.get_container_status(container_id), "Failed to get container status")
+
+def get_container_statuses(container_ids: list) -> dict:
+    """
+    Gets the status of many Docker containers with a single list call.
+    Returns a dict of container id to status; missing containers map to "not_found".
+    """
+    container_ids = [c for c in container_ids if c]
+    if not container_ids:
+        return {}
+    found = _call(docker_api.list_container_statuses(container_ids), "Failed to list containers")
+    return {container_id: found.get(container_id, "not_found") for container_id in container_ids}
+
+def get_container_stats(container_id: str):
+    """
+    Takes a one-off resource usage snapshot of a container.
+    CPU is a percentage of one core; disk and network are cumulative byte counters.
+    Returns None if the container does not exist.
+    """
+    stats = _call(docker_api.get_container_stats(container_id), "Failed to get container stats")
+    if stats is None:
+        return None
+
+    cpu = stats.get("cpu_stats") or {}
+    precpu = stats.get("precpu_stats") or {}
+    cpu_delta = cpu.get("cpu_usage", {}).get("total_usage", 0) - precpu.get("cpu_usage", {}).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    online_cpus = cpu.get("online_cpus") or len(cpu.get("cpu_usage", {}).get("percpu_usage") or [None])
+    cpu_percent = cpu_delta / system_delta * online_cpus * 100 if system_delta > 0 and cpu_delta > 0 else 0.0
+
+    memory = stats.get("memory_stats") or {}
+    blkio = (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []
+    networks = (stats.get("networks") or {}).values()
+    return {
+        "cpu_percent": cpu_percent,
+        "mem_used_bytes": memory.get("usage", 0),
+        "mem_limit_bytes": memory.get("limit", 0),
+        "disk_read_bytes": sum(e.get("value", 0) for e in blkio if e.get("op", "").lower() == "read"),
+        "disk_write_bytes": sum(e.get("value", 0) for e in blkio if e.get("op", "").lower() == "write"),
+        "net_rx_bytes": sum(n.get("rx_bytes", 0) for n in networks),
+        "net_tx_bytes": sum(n.get("tx_bytes", 0) for n in networks),
+    }
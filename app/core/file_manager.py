@@ -1,79 +1,542 @@
+import json
 import os
+import posixpath
+import queue
+import re
 import shutil
+import stat
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
 from pathlib import Path
-from typing import List
+from typing import BinaryIO, Callable, Iterator, List, NamedTuple, Optional, Tuple
 
+from app.core import compression, listing, sandbox
+from app.core.config import settings
 from app.schemas.file import FileItem
 
 BASE_SERVICE_PATH = Path("/var/lib/cz7host/services")
 
-def _get_safe_path(service_id: int, relative_path: str) -> Path:
+# Size of each read when streaming a file; large enough to keep syscalls
+# cheap, small enough that a download never holds more than this in memory.
+READ_CHUNK_SIZE = 1024 * 1024
+
+# In-progress chunked uploads live inside the service directory so that the
+# final rename is atomic (same filesystem) and survives a panel restart.
+UPLOAD_DIR_NAME = ".cz7-uploads"
+_UPLOAD_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+_change_listeners: List[Callable[[int, str], None]] = []
+
+def get_service_path(service_id: int) -> Path:
     """
-    Constructs a safe, absolute path within a service's directory and prevents traversal.
+    Returns the root directory of a service's files.
     """
-    service_base_path = BASE_SERVICE_PATH / str(service_id)
+    return BASE_SERVICE_PATH / str(service_id)
 
-    # Ensure the base directory for the service exists
-    service_base_path.mkdir(parents=True, exist_ok=True)
+def _resolve(service_id: int, path: str, create_parents: bool = False) -> sandbox.ResolvedPath:
+    """
+    Resolves a user path inside a service's directory (see app.core.sandbox).
+    """
+    return sandbox.resolve(get_service_path(service_id), path, create_parents)
 
-    # Normalize the relative path to prevent '..' traversal
-    # os.path.normpath is used here to resolve path components like '.' or '..'
-    # before joining, but the final check is the most important.
-    safe_relative_path = os.path.normpath(relative_path.lstrip('/'))
+def list_directory(
+    service_id: int,
+    path: str,
+    sort: str = "name",
+    descending: bool = False,
+    pattern: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = listing.DEFAULT_PAGE_SIZE,
+) -> Tuple[List[listing.ListingEntry], Optional[str]]:
+    """
+    Returns a page of a service directory and the cursor of the next page.
+    See app.core.listing for sorting, filtering and caching.
+    """
+    return listing.list_directory(get_service_path(service_id), path, sort, descending, pattern, cursor, limit, skip=UPLOAD_DIR_NAME)
 
-    absolute_path = (service_base_path / safe_relative_path).resolve()
+def open_directory_page(
+    service_id: int,
+    path: str,
+    sort: str = "name",
+    descending: bool = False,
+    pattern: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = listing.DEFAULT_PAGE_SIZE,
+) -> listing.ListingPage:
+    """
+    Like list_directory, but the page is produced while it is iterated.
+    """
+    return listing.open_page(get_service_path(service_id), path, sort, descending, pattern, cursor, limit, skip=UPLOAD_DIR_NAME)
 
-    # Security check: Ensure the resolved path is within the service's directory
-    if not str(absolute_path).startswith(str(service_base_path.resolve())):
-        raise PermissionError("Access denied: Path is outside the service directory.")
+def list_files(service_id: int, path: str) -> List[FileItem]:
+    """
+    Lists all files and directories in a given path for a service.
+    """
+    entries, _ = list_directory(service_id, path, limit=None)
+    return [FileItem(**entry._asdict()) for entry in entries]
 
-    return absolute_path
+def add_change_listener(listener: Callable[[int, str], None]):
+    """
+    Registers `listener(service_id, relative_path)` to be called after the
+    file manager (or a restore) changes a path, e.g. to keep an index current.
+    """
+    _change_listeners.append(listener)
 
-def list_files(service_id: int, path: str) -> List[FileItem]:
+def notify_changed(service_id: int, relative_path: str):
+    """
+    Reports that a path of a service changed on disk ("" for all of it).
     """
-    Lists files and directories in a given path for a service.
-    """
-    target_path = _get_safe_path(service_id, path)
-    if not target_path.is_dir():
-        raise ValueError("Path is not a directory.")
-
-    items = []
-    for entry in target_path.iterdir():
-        stat = entry.stat()
-        items.append(
-            FileItem(
-                name=entry.name,
-                path=str(entry.relative_to(BASE_SERVICE_PATH / str(service_id))),
-                is_dir=entry.is_dir(),
-                size_bytes=stat.st_size,
-                modified_at=stat.st_mtime,
-            )
-        )
-    return items
+    listing.invalidate(get_service_path(service_id), posixpath.dirname(relative_path))
+    for listener in _change_listeners:
+        try:
+            listener(service_id, relative_path)
+        except Exception as e:
+            print(f"File change listener failed for service {service_id}: {e}")
 
 def read_file(service_id: int, path: str) -> bytes:
     """
     Reads the content of a file for a service.
     """
-    file_path = _get_safe_path(service_id, path)
-    if not file_path.is_file():
+    with open_file(service_id, path)[0] as f:
+        return f.read()
+
+def open_file(service_id: int, path: str) -> Tuple[BinaryIO, os.stat_result]:
+    """
+    Opens a regular file of a service for reading and returns it with its
+    stat result. The caller must close it.
+    """
+    with _resolve(service_id, path) as target:
+        fd = target.open(os.O_RDONLY)
+    stat_result = os.fstat(fd)
+    if not stat.S_ISREG(stat_result.st_mode):
+        os.close(fd)
         raise ValueError("Path is not a file.")
-    return file_path.read_bytes()
+    return os.fdopen(fd, "rb"), stat_result
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """
+    Builds a strong ETag from the file's inode, size and modification time.
+    """
+    return f'"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+def iter_file(f: BinaryIO, offset: int = 0, length: Optional[int] = None, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yields the content of an open file in chunks, starting at `offset` and
+    stopping after `length` bytes (or at end of file).
+    """
+    f.seek(offset)
+    remaining = length
+    while remaining is None or remaining > 0:
+        to_read = chunk_size if remaining is None else min(chunk_size, remaining)
+        chunk = f.read(to_read)
+        if not chunk:
+            break
+        if remaining is not None:
+            remaining -= len(chunk)
+        yield chunk
 
 def write_file(service_id: int, path: str, content: bytes):
     """
     Writes content to a file for a service.
     """
-    file_path = _get_safe_path(service_id, path)
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    file_path.write_bytes(content)
+    with _resolve(service_id, path, create_parents=True) as target:
+        fd = target.open(os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    notify_changed(service_id, target.relative)
+
+def get_disk_usage(service_id: int) -> int:
+    """
+    Returns the total size in bytes of all files in a service's directory.
+    """
+    total = 0
+    with sandbox.open_directory(get_service_path(service_id), "/") as root_fd:
+        # fwalk never follows symlinks and stats relative to each directory
+        for _, _, files, dir_fd in os.fwalk(".", dir_fd=root_fd):
+            for name in files:
+                try:
+                    total += os.stat(name, dir_fd=dir_fd, follow_symlinks=False).st_size
+                except FileNotFoundError:
+                    pass
+    return total
+
+def save_file(service_id: int, path: str, fileobj: BinaryIO):
+    """
+    Copies a file object to a service path in chunks, writing to a temporary
+    file first and renaming it into place so readers never see a partial file.
+    """
+    with _resolve(service_id, path, create_parents=True) as target, _upload_dir(service_id) as upload_fd:
+        if target.is_root:
+            raise ValueError("Path is not a file.")
+        tmp_name = f"{uuid.uuid4().hex}.tmp"
+        try:
+            with os.fdopen(os.open(tmp_name, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_CLOEXEC, 0o644, dir_fd=upload_fd), "wb") as f:
+                shutil.copyfileobj(fileobj, f, READ_CHUNK_SIZE)
+            os.replace(tmp_name, target.name, src_dir_fd=upload_fd, dst_dir_fd=target.dir_fd)
+        finally:
+            _unlink_quietly(tmp_name, upload_fd)
+    notify_changed(service_id, target.relative)
+
+def _upload_dir(service_id: int, create: bool = True):
+    return sandbox.open_directory(get_service_path(service_id), UPLOAD_DIR_NAME, create=create)
+
+def _upload_names(upload_id: str) -> Tuple[str, str]:
+    """
+    Returns the data and metadata file names of a chunked upload.
+    """
+    if not _UPLOAD_ID_RE.fullmatch(upload_id):
+        raise ValueError("Invalid upload id.")
+    return f"{upload_id}.part", f"{upload_id}.json"
+
+def _unlink_quietly(name: str, dir_fd: int):
+    try:
+        os.unlink(name, dir_fd=dir_fd)
+    except FileNotFoundError:
+        pass
+
+def create_upload(service_id: int, path: str, size: int) -> dict:
+    """
+    Starts a chunked upload of `size` bytes to `path` and returns its state.
+    """
+    # Reject bad targets before any data is sent
+    with _resolve(service_id, path, create_parents=True) as target:
+        if target.is_root:
+            raise ValueError("Path is not a file.")
+    upload_id = uuid.uuid4().hex
+    part_name, meta_name = _upload_names(upload_id)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_CLOEXEC
+    with _upload_dir(service_id) as upload_fd:
+        os.close(os.open(part_name, flags, 0o644, dir_fd=upload_fd))
+        with os.fdopen(os.open(meta_name, flags, 0o644, dir_fd=upload_fd), "w") as f:
+            f.write(json.dumps({"path": path, "size": size}))
+    notify_changed(service_id, UPLOAD_DIR_NAME)
+    return {"upload_id": upload_id, "path": path, "size": size, "offset": 0}
+
+def _read_upload(upload_fd: int, upload_id: str) -> dict:
+    part_name, meta_name = _upload_names(upload_id)
+    try:
+        with os.fdopen(os.open(meta_name, os.O_RDONLY | os.O_NOFOLLOW | os.O_CLOEXEC, dir_fd=upload_fd)) as f:
+            meta = json.loads(f.read())
+        offset = os.stat(part_name, dir_fd=upload_fd, follow_symlinks=False).st_size
+    except FileNotFoundError:
+        raise FileNotFoundError("Upload not found.")
+    return {"upload_id": upload_id, "path": meta["path"], "size": meta["size"], "offset": offset}
+
+def get_upload(service_id: int, upload_id: str) -> dict:
+    """
+    Returns the state of a chunked upload. The offset is the number of bytes
+    already on disk, which is where a client resumes after a dropped connection.
+    """
+    _upload_names(upload_id)
+    try:
+        with _upload_dir(service_id, create=False) as upload_fd:
+            return _read_upload(upload_fd, upload_id)
+    except FileNotFoundError:
+        raise FileNotFoundError("Upload not found.")
+
+def open_upload(service_id: int, upload_id: str, offset: int) -> BinaryIO:
+    """
+    Opens an upload for writing at `offset`. Data after the offset is discarded
+    so a chunk that was only partially received can simply be sent again.
+    """
+    upload = get_upload(service_id, upload_id)
+    if offset > upload["offset"]:
+        raise ValueError(f"Offset {offset} is past the received data ({upload['offset']} bytes).")
+    part_name, _ = _upload_names(upload_id)
+    with _upload_dir(service_id) as upload_fd:
+        f = os.fdopen(os.open(part_name, os.O_RDWR | os.O_NOFOLLOW | os.O_CLOEXEC, dir_fd=upload_fd), "r+b")
+    f.truncate(offset)
+    f.seek(offset)
+    return f
+
+def finalize_upload(service_id: int, upload_id: str) -> Path:
+    """
+    Atomically moves a complete upload to its target path.
+    """
+    part_name, meta_name = _upload_names(upload_id)
+    with _upload_dir(service_id) as upload_fd:
+        upload = _read_upload(upload_fd, upload_id)
+        if upload["offset"] != upload["size"]:
+            raise ValueError(f"Upload is incomplete ({upload['offset']} of {upload['size']} bytes).")
+        fd = os.open(part_name, os.O_RDONLY | os.O_NOFOLLOW | os.O_CLOEXEC, dir_fd=upload_fd)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        with _resolve(service_id, upload["path"], create_parents=True) as target:
+            os.replace(part_name, target.name, src_dir_fd=upload_fd, dst_dir_fd=target.dir_fd)
+            file_path = target.path
+        os.unlink(meta_name, dir_fd=upload_fd)
+    notify_changed(service_id, UPLOAD_DIR_NAME)
+    notify_changed(service_id, target.relative)
+    return file_path
+
+def abort_upload(service_id: int, upload_id: str):
+    """
+    Discards a chunked upload and its data.
+    """
+    part_name, meta_name = _upload_names(upload_id)
+    try:
+        with _upload_dir(service_id, create=False) as upload_fd:
+            _unlink_quietly(part_name, upload_fd)
+            _unlink_quietly(meta_name, upload_fd)
+    except FileNotFoundError:
+        return
+    notify_changed(service_id, UPLOAD_DIR_NAME)
 
 def delete_file(service_id: int, path: str):
     """
     Deletes a file or directory for a service.
     """
-    file_path = _get_safe_path(service_id, path)
-    if file_path.is_dir():
-        shutil.rmtree(file_path)
+    with _resolve(service_id, path) as target:
+        if target.is_root:
+            raise PermissionError("The service directory itself cannot be deleted.")
+        if stat.S_ISDIR(target.lstat().st_mode):
+            shutil.rmtree(target.name, dir_fd=target.dir_fd)
+        else:
+            os.unlink(target.name, dir_fd=target.dir_fd)
+    notify_changed(service_id, target.relative)
+
+# Archives of a directory are streamed straight from disk. Tar output is cut
+# into READ_CHUNK_SIZE blocks and compressed through the bounded parallel
+# pipeline; zip entries are written by zipfile on a producer thread into a
+# bounded queue of chunks. Neither needs a temp file, and memory stays at a
+# few chunks whatever the size of the tree.
+#
+# The tree is walked with descriptors (os.fwalk) and every entry is opened
+# with O_NOFOLLOW relative to its parent, so a container swapping a file or
+# directory for a symlink mid-walk cannot get host files into the archive.
+ARCHIVE_FORMATS = {
+    "tar.zst": ("zstd", "application/zstd"),
+    "tar": ("none", "application/x-tar"),
+    "zip": ("zip", "application/zip"),
+}
+ZIP_LEVELS = (0, 9) # 0 stores files uncompressed
+DEFAULT_ZIP_LEVEL = 6
+ZIP_QUEUE_CHUNKS = 4
+
+class _ArchiveEntry(NamedTuple):
+    name: str # Name inside the archive
+    stat: os.stat_result # lstat taken during the walk
+    dir_fd: int # Parent directory; only valid until the next entry is produced
+    entry_name: str # Name relative to dir_fd
+
+def _iter_tree(root_path: Path, relative: str, top: str) -> Iterator[_ArchiveEntry]:
+    """
+    Yields `relative` and everything below it. Symlinks are reported,
+    never followed.
+    """
+    with sandbox.resolve(root_path, relative) as target:
+        top_stat = target.lstat()
+        yield _ArchiveEntry(top, top_stat, target.dir_fd, target.name)
+        if not stat.S_ISDIR(top_stat.st_mode):
+            return
+        skip = UPLOAD_DIR_NAME if target.is_root else None
+        top_fd = target.open(os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        for dirpath, dirnames, filenames, dir_fd in os.fwalk(".", dir_fd=top_fd):
+            if dirpath == "." and skip in dirnames:
+                dirnames.remove(skip)
+            dirnames.sort()
+            prefix = f"{top}/{dirpath[2:]}" if dirpath != "." else top
+            for name in dirnames + sorted(filenames):
+                try:
+                    entry_stat = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+                except FileNotFoundError:
+                    continue # Removed while archiving
+                yield _ArchiveEntry(f"{prefix}/{name}", entry_stat, dir_fd, name)
+    finally:
+        os.close(top_fd)
+
+def _open_entry(entry: _ArchiveEntry) -> Optional[BinaryIO]:
+    """
+    Opens a regular file of the walk, or returns None if it was removed or
+    replaced (e.g. by a symlink or a FIFO) since it was listed.
+    """
+    try:
+        fd = os.open(entry.entry_name, os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK | os.O_CLOEXEC, dir_fd=entry.dir_fd)
+    except OSError:
+        return None
+    if not stat.S_ISREG(os.fstat(fd).st_mode):
+        os.close(fd)
+        return None
+    return os.fdopen(fd, "rb")
+
+def _read_link(entry: _ArchiveEntry) -> Optional[str]:
+    try:
+        return os.readlink(entry.entry_name, dir_fd=entry.dir_fd)
+    except OSError:
+        return None # Removed or no longer a symlink
+
+def _iter_tar_blocks(entries: Iterator[_ArchiveEntry]) -> Iterator[bytes]:
+    for entry in entries:
+        entry_stat = entry.stat
+        info = tarfile.TarInfo(entry.name)
+        info.mode = stat.S_IMODE(entry_stat.st_mode)
+        info.mtime = int(entry_stat.st_mtime)
+        f = None
+        if stat.S_ISDIR(entry_stat.st_mode):
+            info.type = tarfile.DIRTYPE
+        elif stat.S_ISLNK(entry_stat.st_mode):
+            info.type = tarfile.SYMTYPE
+            info.linkname = _read_link(entry)
+            if info.linkname is None:
+                continue
+        elif stat.S_ISREG(entry_stat.st_mode):
+            f = _open_entry(entry)
+            if f is None:
+                continue
+            info.size = entry_stat.st_size
+        else:
+            continue # Sockets, FIFOs and devices
+
+        yield info.tobuf(tarfile.PAX_FORMAT)
+        if f is None:
+            continue
+        with f:
+            # The header already promised st_size bytes: stop there if the
+            # file grew and pad with zeros if it shrank.
+            remaining = info.size
+            while remaining > 0:
+                chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+            if remaining:
+                yield b"\0" * remaining
+        if info.size % tarfile.BLOCKSIZE:
+            yield b"\0" * (tarfile.BLOCKSIZE - info.size % tarfile.BLOCKSIZE)
+
+    yield b"\0" * (2 * tarfile.BLOCKSIZE)
+
+class _ArchiveCancelled(Exception):
+    pass
+
+class _ZipSink:
+    """
+    Write-only file object zipfile writes into, handing READ_CHUNK_SIZE
+    pieces to the consumer. Without tell() or seek() zipfile switches to
+    streaming mode and writes data descriptors.
+    """
+
+    def __init__(self, chunks: queue.Queue, cancelled: threading.Event):
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self._parts = []
+        self._size = 0
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._size += len(data)
+        if self._size >= READ_CHUNK_SIZE:
+            self.drain()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        if self._parts:
+            self.put(b"".join(self._parts))
+            self._parts, self._size = [], 0
+
+    def put(self, item):
+        # Blocks while the consumer is behind; gives up once it went away
+        while True:
+            if self._cancelled.is_set():
+                raise _ArchiveCancelled()
+            try:
+                self._chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+def _write_zip(entries: Iterator[_ArchiveEntry], level: int, sink: _ZipSink):
+    compress_type = zipfile.ZIP_DEFLATED if level else zipfile.ZIP_STORED
+    try:
+        with zipfile.ZipFile(sink, "w", compression=compress_type, compresslevel=level or None, strict_timestamps=False) as archive:
+            for entry in entries:
+                entry_stat = entry.stat
+                mode = stat.S_IMODE(entry_stat.st_mode)
+                zinfo = zipfile.ZipInfo(entry.name, date_time=_zip_date_time(entry_stat.st_mtime))
+                if stat.S_ISDIR(entry_stat.st_mode):
+                    zinfo.filename = entry.name + "/"
+                    zinfo.external_attr = (stat.S_IFDIR | mode) << 16 | 0x10 # MS-DOS directory flag
+                    archive.writestr(zinfo, b"")
+                elif stat.S_ISLNK(entry_stat.st_mode):
+                    link = _read_link(entry)
+                    if link is not None:
+                        zinfo.external_attr = (stat.S_IFLNK | 0o777) << 16
+                        archive.writestr(zinfo, link)
+                elif stat.S_ISREG(entry_stat.st_mode):
+                    f = _open_entry(entry)
+                    if f is None:
+                        continue
+                    with f:
+                        # Through the descriptor opened above, never the path.
+                        # write() applies the archive's level and streams in chunks.
+                        archive.write(f"/proc/self/fd/{f.fileno()}", entry.name)
+        sink.drain() # Central directory, written on close
+        sink.put(None)
+    except _ArchiveCancelled:
+        pass
+    except Exception as e:
+        try:
+            sink.put(e)
+        except _ArchiveCancelled:
+            pass
+    finally:
+        entries.close()
+
+def _generate_zip(entries: Iterator[_ArchiveEntry], level: int) -> Iterator[bytes]:
+    chunks = queue.Queue(maxsize=ZIP_QUEUE_CHUNKS)
+    cancelled = threading.Event()
+    threading.Thread(target=_write_zip, args=(entries, level, _ZipSink(chunks, cancelled)), name="zip-archive", daemon=True).start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        cancelled.set()
+
+def _zip_date_time(timestamp: float) -> tuple:
+    # Zip timestamps cannot go before 1980
+    return max(tuple(time.localtime(timestamp)[:6]), (1980, 1, 1, 0, 0, 0))
+
+def open_archive(service_id: int, path: str, archive_format: str, level: Optional[int] = None) -> Tuple[str, str, Iterator[bytes]]:
+    """
+    Prepares a streamed archive of a file or directory for a service.
+    Returns (file name, media type, iterator of the archive's bytes). Raises
+    ValueError for an unknown format or level and FileNotFoundError if the
+    path does not exist, before any byte is produced.
+    """
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unknown archive format '{archive_format}'. Use one of: {', '.join(ARCHIVE_FORMATS)}.")
+    codec, media_type = ARCHIVE_FORMATS[archive_format]
+    if codec == "zip":
+        level = DEFAULT_ZIP_LEVEL if level is None else level
+        if not ZIP_LEVELS[0] <= level <= ZIP_LEVELS[1]:
+            raise ValueError(f"Compression level for zip must be between {ZIP_LEVELS[0]} and {ZIP_LEVELS[1]}.")
+    else:
+        level = compression.validate(codec, level)
+
+    with _resolve(service_id, path) as target:
+        target.lstat() # FileNotFoundError if missing
+        relative = target.relative
+        top = f"service-{service_id}" if target.is_root else target.name
+    entries = _iter_tree(get_service_path(service_id), relative, top)
+
+    if codec == "zip":
+        stream = _generate_zip(entries, level)
     else:
-        file_path.unlink()
\ No newline at end of file
+        blocks = compression.coalesce(_iter_tar_blocks(entries), READ_CHUNK_SIZE)
+        stream = compression.parallel_compress(blocks, codec, level, settings.COMPRESSION_WORKERS)
+    return f"{top}.{archive_format}", media_type, stream
@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+import psutil
+
+from app.core.ring_buffer import RingBuffer
+
+# Host metrics are sampled on a background thread so /status never waits on
+# psutil.cpu_percent(interval=...). One hour of history at the default rate.
+SAMPLE_INTERVAL_SECONDS = 2
+HISTORY_SIZE = 1800
+DISK_PATH = "/"
+
+FIELDS = (
+    "cpu_percent",
+    "mem_total_bytes",
+    "mem_used_bytes",
+    "mem_percent",
+    "disk_total_bytes",
+    "disk_used_bytes",
+    "disk_percent",
+    "net_sent_bytes_per_s",
+    "net_recv_bytes_per_s",
+)
+
+_buffer = RingBuffer(FIELDS, HISTORY_SIZE)
+_stopping = threading.Event()
+_last_net = None
+
+def _sample():
+    global _last_net
+    now = time.time()
+    # With interval=None psutil compares against the previous call, which is
+    # exactly one sampling period ago.
+    cpu = psutil.cpu_percent(interval=None)
+    mem = psutil.virtual_memory()
+    disk = psutil.disk_usage(DISK_PATH)
+    net = psutil.net_io_counters()
+
+    sent_rate = recv_rate = 0.0
+    if _last_net is not None:
+        elapsed = now - _last_net[0]
+        if elapsed > 0:
+            sent_rate = (net.bytes_sent - _last_net[1]) / elapsed
+            recv_rate = (net.bytes_recv - _last_net[2]) / elapsed
+    _last_net = (now, net.bytes_sent, net.bytes_recv)
+
+    _buffer.append(now, (
+        cpu,
+        mem.total, mem.used, mem.percent,
+        disk.total, disk.used, disk.percent,
+        sent_rate, recv_rate,
+    ))
+
+def _run():
+    psutil.cpu_percent(interval=None)  # Prime the CPU counters
+    while not _stopping.wait(SAMPLE_INTERVAL_SECONDS):
+        _sample()
+
+def start():
+    """
+    Starts the background sampler thread.
+    """
+    _stopping.clear()
+    threading.Thread(target=_run, name="host-metrics", daemon=True).start()
+
+def stop():
+    _stopping.set()
+
+def latest() -> Optional[Dict[str, float]]:
+    """
+    Returns the most recent sample, or None before the first one is taken.
+    """
+    return _buffer.latest()
+
+def history(window_seconds: float, max_points: int) -> Dict[str, List[float]]:
+    """
+    Returns the samples of the last `window_seconds`, downsampled to at most
+    `max_points` points per series.
+    """
+    return _buffer.series(time.time() - window_seconds, max_points)
@@ -0,0 +1,92 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+from typing import Iterator, NamedTuple, Optional
+
+# Minimal inotify(7) binding through libc; the standard library has none.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+class Event(NamedTuple):
+    wd: int
+    mask: int
+    cookie: int
+    name: str
+
+_libc = None
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    return _libc
+
+def _check(result: int) -> int:
+    if result < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return result
+
+def is_supported() -> bool:
+    try:
+        return hasattr(_get_libc(), "inotify_init1")
+    except OSError:
+        return False
+
+class Inotify:
+    """
+    An inotify instance. `read()` blocks until events arrive (or returns
+    nothing if opened with IN_NONBLOCK).
+    """
+
+    def __init__(self, flags: int = IN_CLOEXEC):
+        self.fd = _check(_get_libc().inotify_init1(flags))
+
+    def add_watch(self, path: str, mask: int) -> int:
+        return _check(_get_libc().inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask)))
+
+    def rm_watch(self, wd: int):
+        _check(_get_libc().inotify_rm_watch(self.fd, wd))
+
+    def read(self, size: int = 64 * 1024) -> Iterator[Event]:
+        try:
+            data = os.read(self.fd, size)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            yield Event(wd, mask, cookie, os.fsdecode(name))
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def open_instance(flags: int = IN_CLOEXEC) -> Optional[Inotify]:
+    """
+    Returns a new inotify instance, or None where inotify is unavailable.
+    """
+    if not is_supported():
+        return None
+    return Inotify(flags)
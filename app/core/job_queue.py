@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional, Set
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.job import Job, JobStatus
+
+# Slow service operations (provisioning, backups, restores) run here instead of
+# inside the HTTP request. Jobs are persisted, so their state survives a
+# restart, and each node runs at most JOB_CONCURRENCY_PER_NODE at a time so a
+# burst of requests cannot saturate one host's disk. That limit is a semaphore
+# per worker process, so with several uvicorn workers it applies to each.
+#
+# Every worker process may schedule any pending job of its node; a job only
+# runs where the conditional PENDING -> RUNNING update claims it. The claiming
+# worker then refreshes the job's heartbeat, and a running job whose heartbeat
+# is older than JOB_LEASE_SECONDS lost its worker and is failed.
+
+# Progress callbacks from long-running work write to the job row at most this often
+PROGRESS_INTERVAL_SECONDS = 2
+
+_handlers: Dict[str, Callable] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+_node_slots: Dict[str, threading.BoundedSemaphore] = {}
+_node_slots_lock = threading.Lock()
+_worker_id: Optional[str] = None
+# Jobs queued on this process's executor, so they are not queued twice
+_submitted: Set[int] = set()
+_submitted_lock = threading.Lock()
+_stopping = threading.Event()
+
+class JobContext:
+    """
+    Passed to job handlers: a DB session of their own and progress reporting.
+    """
+
+    def __init__(self, db: Session, job: Job):
+        self.db = db
+        self.job = job
+
+    @property
+    def params(self) -> dict:
+        return self.job.params or {}
+
+    def report_progress(self, progress: int, message: Optional[str] = None):
+        self.job.progress = max(0, min(100, progress))
+        if message is not None:
+            self.job.message = message
+        self.db.commit()
+
+    def progress_reporter(self) -> Callable[[int, int], None]:
+        """
+        Returns a throttled (done, total) callback mapped onto 5-95% progress.
+        """
+        last_report = time.monotonic()
+
+        def on_progress(done: int, total: int):
+            nonlocal last_report
+            now = time.monotonic()
+            if total and now - last_report >= PROGRESS_INTERVAL_SECONDS:
+                self.report_progress(5 + 90 * done // total)
+                last_report = now
+        return on_progress
+
+def register(kind: str):
+    """
+    Decorator registering the handler that runs jobs of the given kind.
+    The handler receives a JobContext and returns a JSON-serializable result.
+    """
+    def decorator(func: Callable):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+def _get_node_slots(node: str) -> threading.BoundedSemaphore:
+    with _node_slots_lock:
+        slots = _node_slots.get(node)
+        if slots is None:
+            slots = _node_slots[node] = threading.BoundedSemaphore(settings.JOB_CONCURRENCY_PER_NODE)
+        return slots
+
+def enqueue(db: Session, kind: str, owner_id: int, service_id: Optional[int] = None, params: Optional[dict] = None) -> Job:
+    """
+    Persists a new job and schedules it on the worker pool.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = Job(
+        kind=kind,
+        status=JobStatus.PENDING,
+        node=settings.NODE_NAME,
+        owner_id=owner_id,
+        service_id=service_id,
+        params=params or {},
+        progress=0,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _submit(job.id, job.node)
+    return job
+
+def _submit(job_id: int, node: str):
+    if _executor is None:
+        raise RuntimeError("Job workers are not running.")
+    with _submitted_lock:
+        if job_id in _submitted:
+            return
+        _submitted.add(job_id)
+    _executor.submit(_run, job_id, node)
+
+def _claim(db: Session, job_id: int) -> bool:
+    """
+    Marks a pending job as running on this worker. False if another worker
+    claimed it first, or it is not pending anymore.
+    """
+    now = datetime.now(timezone.utc)
+    claimed = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == JobStatus.PENDING)
+        .values(status=JobStatus.RUNNING, started_at=now, worker_id=_worker_id, heartbeat_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    db.commit()
+    return claimed
+
+def _run(job_id: int, node: str):
+    with _get_node_slots(node):
+        # Off the queue: from here on the claim keeps it from running twice
+        with _submitted_lock:
+            _submitted.discard(job_id)
+        db = SessionLocal()
+        try:
+            if not _claim(db, job_id):
+                return
+            job = db.query(Job).filter(Job.id == job_id).one()
+
+            try:
+                result = _handlers[job.kind](JobContext(db, job))
+                job.status = JobStatus.SUCCEEDED
+                job.progress = 100
+                job.result = result
+            except Exception as e:
+                db.rollback()
+                traceback.print_exc()
+                job.status = JobStatus.FAILED
+                job.message = str(e)
+            job.finished_at = datetime.now(timezone.utc)
+            db.commit()
+        finally:
+            db.close()
+
+def _heartbeat(db: Session):
+    db.execute(
+        update(Job)
+        .where(Job.worker_id == _worker_id, Job.status == JobStatus.RUNNING)
+        .values(heartbeat_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+def _recover(db: Session, all_pending: bool):
+    """
+    Fails this node's running jobs whose worker stopped (a crash or a panel
+    restart) and schedules its pending jobs: all of them at startup, later
+    only those left unclaimed for a whole lease, e.g. queued on a worker that
+    died before running them.
+    """
+    now = datetime.now(timezone.utc)
+    expired = now - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    db.execute(
+        update(Job)
+        .where(
+            Job.node == settings.NODE_NAME,
+            Job.status == JobStatus.RUNNING,
+            or_(Job.heartbeat_at.is_(None), Job.heartbeat_at < expired),
+        )
+        .values(status=JobStatus.FAILED, message="Interrupted: the panel worker running it stopped.", finished_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    pending = db.query(Job.id).filter(Job.node == settings.NODE_NAME, Job.status == JobStatus.PENDING)
+    if not all_pending:
+        pending = pending.filter(Job.created_at < expired)
+    for (job_id,) in pending.order_by(Job.id).all():
+        _submit(job_id, settings.NODE_NAME)
+
+def _supervise():
+    while not _stopping.wait(settings.JOB_HEARTBEAT_SECONDS):
+        db = SessionLocal()
+        try:
+            _heartbeat(db)
+            _recover(db, all_pending=False)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            db.close()
+
+def start():
+    """
+    Starts the worker pool and picks up jobs left over from a previous run.
+    """
+    global _executor, _worker_id
+    # Job handlers live next to the logic they run and register on import
+    from app.crud import services, backups  # noqa: F401
+    # Set here rather than on import, so forked workers get their own
+    _worker_id = f"{settings.NODE_NAME}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    _executor = ThreadPoolExecutor(max_workers=settings.JOB_WORKERS, thread_name_prefix="jobs")
+    _stopping.clear()
+    db = SessionLocal()
+    try:
+        _recover(db, all_pending=True)
+    finally:
+        db.close()
+    threading.Thread(target=_supervise, name="jobs-heartbeat", daemon=True).start()
+
+def stop():
+    _stopping.set()
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
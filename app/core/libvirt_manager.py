@@ -1,20 +1,186 @@
-import libvirt
+import asyncio
+import contextlib
+import errno
+import fcntl
+import functools
+import json
+import math
+import os
+import re
+import subprocess
 import sys
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import libvirt
+
+from app.core.config import settings
+
+LIBVIRT_URI = 'qemu:///system'
+
+# Each thread that talks to libvirt gets a connection of its own, opened on
+# first use. Connections send keepalives, so a restarted or hung libvirtd is
+# noticed by isAlive() and the next call transparently reconnects; a call that
+# fails because the connection dropped under it is retried once on a fresh one.
+# The public functions run on a dedicated executor whatever thread calls them:
+# async code awaits them through run_async, sync callers (request threadpool,
+# jobs, metrics) block on the result. Only its LIBVIRT_WORKERS threads, plus
+# the status monitor's own thread, ever hold a connection.
+
+# libvirt error codes meaning the connection itself is unusable
+_DISCONNECT_ERRORS = {
+    libvirt.VIR_ERR_SYSTEM_ERROR,
+    libvirt.VIR_ERR_NO_CONNECT,
+    libvirt.VIR_ERR_INVALID_CONN,
+    libvirt.VIR_ERR_RPC,
+}
+
+_local = threading.local()
+_connections: Dict[threading.Thread, libvirt.virConnect] = {}
+_connections_lock = threading.Lock()
+_last_failure = 0.0
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_event_loop_lock = threading.Lock()
+_event_loop_started = False
+
+def ensure_event_loop():
+    """
+    Registers libvirt's default event implementation and runs it on a
+    background thread. Keepalives and domain event callbacks need it, and it
+    must be registered before the connections that use it are opened.
+    """
+    global _event_loop_started
+    with _event_loop_lock:
+        if _event_loop_started:
+            return
+        libvirt.virEventRegisterDefaultImpl()
+        threading.Thread(target=_run_event_loop, name="libvirt-events", daemon=True).start()
+        _event_loop_started = True
+
+def _run_event_loop():
+    while True:
+        libvirt.virEventRunDefaultImpl()
 
-# Connect to the local QEMU/KVM daemon
-try:
-    conn = libvirt.open('qemu:///system')
-except libvirt.libvirtError as e:
-    # We can't do anything if we can't connect, so we'll print an error and exit
-    # In a real app, this should be handled more gracefully (e.g., logging)
-    print(f'Failed to open connection to qemu:///system: {e}', file=sys.stderr)
-    conn = None
-
-def get_libvirt_connection():
-    if conn is None:
+def _open_connection() -> libvirt.virConnect:
+    global _last_failure
+    # Don't hammer a daemon that is down: fail fast until the backoff expires
+    if time.monotonic() - _last_failure < settings.LIBVIRT_RECONNECT_DELAY_SECONDS:
         raise RuntimeError("Failed to connect to libvirt. Is the daemon running?")
-    return conn
+    ensure_event_loop()
+    try:
+        lv_conn = libvirt.open(LIBVIRT_URI)
+    except libvirt.libvirtError as e:
+        _last_failure = time.monotonic()
+        print(f'Failed to open connection to {LIBVIRT_URI}: {e}', file=sys.stderr)
+        raise RuntimeError("Failed to connect to libvirt. Is the daemon running?")
+    try:
+        lv_conn.setKeepAlive(settings.LIBVIRT_KEEPALIVE_INTERVAL, settings.LIBVIRT_KEEPALIVE_COUNT)
+    except libvirt.libvirtError:
+        pass # Keepalive is best effort; reconnect-on-error still applies
+
+    current = threading.current_thread()
+    with _connections_lock:
+        # Close the connections of threads that have exited
+        for thread in [thread for thread in _connections if not thread.is_alive()]:
+            _close_quietly(_connections.pop(thread))
+        _connections[current] = lv_conn
+    return lv_conn
+
+def _close_quietly(lv_conn: libvirt.virConnect):
+    try:
+        lv_conn.close()
+    except libvirt.libvirtError:
+        pass
+
+def _discard_connection():
+    lv_conn = getattr(_local, "conn", None)
+    _local.conn = None
+    if lv_conn is not None:
+        with _connections_lock:
+            _connections.pop(threading.current_thread(), None)
+        _close_quietly(lv_conn)
+
+def get_libvirt_connection() -> libvirt.virConnect:
+    """
+    Returns this thread's libvirt connection, (re)connecting if it is missing
+    or dead. Raises RuntimeError if libvirtd cannot be reached.
+    """
+    lv_conn = getattr(_local, "conn", None)
+    if lv_conn is not None:
+        try:
+            if lv_conn.isAlive():
+                return lv_conn
+        except libvirt.libvirtError:
+            pass
+        _discard_connection()
+    lv_conn = _local.conn = _open_connection()
+    return lv_conn
+
+def _is_broken(error: Optional[libvirt.libvirtError] = None) -> bool:
+    if error is not None and error.get_error_code() in _DISCONNECT_ERRORS:
+        return True
+    lv_conn = getattr(_local, "conn", None)
+    try:
+        return lv_conn is not None and not lv_conn.isAlive()
+    except libvirt.libvirtError:
+        return True
+
+def _reconnecting(func: Callable) -> Callable:
+    """
+    Retries a call once on a fresh connection if the current one turned out
+    to be dead, whether the call raised or swallowed the error.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            result = func(*args, **kwargs)
+            if not _is_broken():
+                return result
+        except libvirt.libvirtError as e:
+            if not _is_broken(e):
+                raise
+        _discard_connection()
+        return func(*args, **kwargs)
+    return wrapper
+
+def _mark_executor_thread():
+    _local.on_executor = True
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.LIBVIRT_WORKERS, thread_name_prefix="libvirt", initializer=_mark_executor_thread)
+        return _executor
+
+def _on_executor(func: Callable) -> Callable:
+    """
+    Runs a call on the libvirt executor, unless it already runs there, and
+    waits for its result.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if getattr(_local, "on_executor", False):
+            return func(*args, **kwargs)
+        return _get_executor().submit(func, *args, **kwargs).result()
+    return wrapper
+
+async def run_async(func: Callable, *args, **kwargs):
+    """
+    Runs a blocking libvirt_manager function on the libvirt executor, so a
+    slow hypervisor never blocks the event loop, e.g.
+    `await libvirt_manager.run_async(libvirt_manager.get_vm_status, name)`.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
 
+@_on_executor
+@_reconnecting
 def list_vms():
     """
     Lists all virtual machines (domains) managed by libvirt.
@@ -23,6 +189,20 @@ def list_vms():
     domains = lv_conn.listAllDomains(0)
     return [domain.name() for domain in domains]
 
+# Map state integer to a human-readable string
+STATE_MAP = {
+    libvirt.VIR_DOMAIN_NOSTATE: 'nostate',
+    libvirt.VIR_DOMAIN_RUNNING: 'running',
+    libvirt.VIR_DOMAIN_BLOCKED: 'blocked',
+    libvirt.VIR_DOMAIN_PAUSED: 'paused',
+    libvirt.VIR_DOMAIN_SHUTDOWN: 'shutdown',
+    libvirt.VIR_DOMAIN_SHUTOFF: 'shutoff',
+    libvirt.VIR_DOMAIN_CRASHED: 'crashed',
+    libvirt.VIR_DOMAIN_PMSUSPENDED: 'pmsuspended',
+}
+
+@_on_executor
+@_reconnecting
 def get_vm_status(domain_name: str):
     """
     Gets the status of a specific virtual machine.
@@ -31,79 +211,239 @@ def get_vm_status(domain_name: str):
     try:
         domain = lv_conn.lookupByName(domain_name)
         state, reason = domain.state()
-        # Map state integer to a human-readable string
-        state_map = {
-            libvirt.VIR_DOMAIN_NOSTATE: 'nostate',
-            libvirt.VIR_DOMAIN_RUNNING: 'running',
-            libvirt.VIR_DOMAIN_BLOCKED: 'blocked',
-            libvirt.VIR_DOMAIN_PAUSED: 'paused',
-            libvirt.VIR_DOMAIN_SHUTDOWN: 'shutdown',
-            libvirt.VIR_DOMAIN_SHUTOFF: 'shutoff',
-            libvirt.VIR_DOMAIN_CRASHED: 'crashed',
-            libvirt.VIR_DOMAIN_PMSUSPENDED: 'pmsuspended',
-        }
-        return state_map.get(state, 'unknown')
+        return STATE_MAP.get(state, 'unknown')
     except libvirt.libvirtError:
         return "not_found"
 
-import os
-import shutil
-import uuid
+@_on_executor
+@_reconnecting
+def get_vm_statuses(domain_names: list) -> dict:
+    """
+    Gets the status of many virtual machines with a single domain listing.
+    Returns a dict of domain name to status; missing domains map to "not_found".
+    """
+    lv_conn = get_libvirt_connection()
+    wanted = {name for name in domain_names if name}
+    statuses = {name: "not_found" for name in wanted}
+    for domain in lv_conn.listAllDomains(0):
+        name = domain.name()
+        if name in wanted:
+            try:
+                state, reason = domain.state()
+                statuses[name] = STATE_MAP.get(state, 'unknown')
+            except libvirt.libvirtError:
+                pass # Domain disappeared between the listing and the state call
+    return statuses
 
-# ... (previous code) ...
+@_on_executor
+@_reconnecting
+def get_vm_stats(domain_name: str):
+    """
+    Takes a resource usage snapshot of a running VM. CPU time and disk are
+    cumulative counters. Returns None if the VM does not exist or is not running.
+    """
+    lv_conn = get_libvirt_connection()
+    try:
+        domain = lv_conn.lookupByName(domain_name)
+        if not domain.isActive():
+            return None
+        cpu_time_ns = domain.getCPUStats(True)[0].get("cpu_time", 0)
+        memory = domain.memoryStats()
+        rd_req, rd_bytes, wr_req, wr_bytes, errs = domain.blockStats("vda")
+    except libvirt.libvirtError:
+        return None
+    return {
+        "cpu_time_ns": cpu_time_ns,
+        "mem_used_bytes": memory.get("rss", 0) * 1024,
+        "mem_limit_bytes": memory.get("actual", 0) * 1024,
+        "disk_read_bytes": rd_bytes,
+        "disk_write_bytes": wr_bytes,
+        "net_rx_bytes": 0,
+        "net_tx_bytes": 0,
+    }
 
 BASE_IMAGE_PATH = "/var/lib/libvirt/images/base.qcow2"
 VM_DISK_DIR = "/var/lib/libvirt/images"
 
-VM_XML_TEMPLATE = """
-<domain type='kvm'>
-  <name>{name}</name>
-  <uuid>{uuid}</uuid>
-  <memory unit='KiB'>1048576</memory>
-  <currentMemory unit='KiB'>1048576</currentMemory>
-  <vcpu placement='static'>1</vcpu>
-  <os>
-    <type arch='x86_64' machine='pc-q35-8.2'>hvm</type>
-    <boot dev='hd'/>
-  </os>
-  <devices>
-    <disk type='file' device='disk'>
-      <driver name='qemu' type='qcow2'/>
-      <source file='{disk_path}'/>
-      <target dev='vda' bus='virtio'/>
-    </disk>
-    <interface type='network'>
-      <source network='default'/>
-      <model type='virtio'/>
-    </interface>
-    <graphics type='vnc' port='-1' autoport='yes' listen='127.0.0.1'>
-      <listen type='address' address='127.0.0.1'/>
-    </graphics>
-  </devices>
-</domain>
-"""
-
-def create_vm(domain_name: str):
-    """
-    Creates a new VM by cloning a base image and defining a new domain.
+# New VM disks are thin clones of a named template: a reflink copy where the
+# filesystem supports it (btrfs, XFS), otherwise a qcow2 overlay backed by the
+# template. Either way provisioning takes well under a second and a new disk
+# starts out using almost no space. Templates must never be modified once VMs
+# are cloned from them; add a new template instead.
+VM_TEMPLATE_DIR = "/var/lib/libvirt/images/templates"
+DEFAULT_TEMPLATE = "base"
+_TEMPLATE_NAME_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*")
+_FICLONE = 0x40049409 # ioctl from linux/fs.h
+
+# Scheduler period for the CPU cap of fractional-vCore plans
+CPU_PERIOD_US = 100000
+
+def build_domain_xml(
+    name: str,
+    vm_uuid: str,
+    disk_path: str,
+    ram_mb: int,
+    cpu_vcore: float,
+    hugepages: bool = False,
+    iothreads: int = 1,
+) -> str:
+    """
+    Builds the domain XML of a VM sized from its plan.
+    Fractional vCores get ceil(cpu_vcore) vCPUs capped to cpu_vcore cores of
+    host time. The disk is virtio-blk with no host cache and native AIO, on
+    its own iothread unless `iothreads` is 0; the NIC gets one virtio queue
+    per vCPU.
+    """
+    vcpus = max(1, math.ceil(cpu_vcore))
+
+    domain = ET.Element("domain", type="kvm")
+    ET.SubElement(domain, "name").text = name
+    ET.SubElement(domain, "uuid").text = vm_uuid
+    ET.SubElement(domain, "memory", unit="KiB").text = str(ram_mb * 1024)
+    ET.SubElement(domain, "currentMemory", unit="KiB").text = str(ram_mb * 1024)
+    if hugepages:
+        memory_backing = ET.SubElement(domain, "memoryBacking")
+        ET.SubElement(memory_backing, "hugepages")
+    ET.SubElement(domain, "vcpu", placement="static").text = str(vcpus)
+    if iothreads >= 1:
+        ET.SubElement(domain, "iothreads").text = str(iothreads)
+    if cpu_vcore < vcpus:
+        cputune = ET.SubElement(domain, "cputune")
+        ET.SubElement(cputune, "global_period").text = str(CPU_PERIOD_US)
+        ET.SubElement(cputune, "global_quota").text = str(int(cpu_vcore * CPU_PERIOD_US))
+
+    os_element = ET.SubElement(domain, "os")
+    ET.SubElement(os_element, "type", arch="x86_64", machine="pc-q35-8.2").text = "hvm"
+    ET.SubElement(os_element, "boot", dev="hd")
+    features = ET.SubElement(domain, "features")
+    ET.SubElement(features, "acpi")
+    ET.SubElement(features, "apic")
+    cpu = ET.SubElement(domain, "cpu", mode="host-passthrough", check="none", migratable="off")
+    ET.SubElement(cpu, "topology", sockets="1", dies="1", cores=str(vcpus), threads="1")
+
+    devices = ET.SubElement(domain, "devices")
+    disk = ET.SubElement(devices, "disk", type="file", device="disk")
+    driver = ET.SubElement(disk, "driver", name="qemu", type="qcow2", cache="none", io="native", discard="unmap")
+    if iothreads >= 1:
+        driver.set("iothread", "1")
+    ET.SubElement(disk, "source", file=disk_path)
+    ET.SubElement(disk, "target", dev="vda", bus="virtio")
+
+    interface = ET.SubElement(devices, "interface", type="network")
+    ET.SubElement(interface, "source", network="default")
+    ET.SubElement(interface, "model", type="virtio")
+    if vcpus > 1:
+        ET.SubElement(interface, "driver", name="vhost", queues=str(vcpus))
+
+    graphics = ET.SubElement(devices, "graphics", type="vnc", port="-1", autoport="yes", listen="127.0.0.1")
+    ET.SubElement(graphics, "listen", type="address", address="127.0.0.1")
+    return ET.tostring(domain, encoding="unicode")
+
+def list_templates() -> List[str]:
+    """
+    Lists the names of the available VM templates.
+    """
+    names = set()
+    if os.path.isdir(VM_TEMPLATE_DIR):
+        names.update(name[:-len(".qcow2")] for name in os.listdir(VM_TEMPLATE_DIR) if name.endswith(".qcow2"))
+    if os.path.exists(BASE_IMAGE_PATH):
+        names.add(DEFAULT_TEMPLATE)
+    return sorted(names)
+
+def get_template_path(template: str) -> str:
+    """
+    Returns the image path of a VM template. Raises ValueError if it does not exist.
+    """
+    if not _TEMPLATE_NAME_RE.fullmatch(template):
+        raise ValueError("Invalid template name.")
+    path = os.path.join(VM_TEMPLATE_DIR, f"{template}.qcow2")
+    if template == DEFAULT_TEMPLATE and not os.path.exists(path):
+        path = BASE_IMAGE_PATH # Where the single base image lived before named templates
+    if not os.path.exists(path):
+        raise ValueError(f"VM template '{template}' not found.")
+    return path
+
+def _qemu_img(*args: str) -> str:
+    try:
+        result = subprocess.run(["qemu-img", *args], check=True, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise RuntimeError("qemu-img is not installed.")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"qemu-img {args[0]} failed: {e.stderr.strip()}")
+    return result.stdout
+
+def _reflink(source_path: str, target_path: str) -> bool:
+    """
+    Clones a file by sharing its extents. Returns False if the filesystem
+    cannot do that.
+    """
+    with open(source_path, "rb") as source, open(target_path, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+            return True
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY):
+                raise
+    os.remove(target_path)
+    return False
+
+def clone_disk(template_path: str, disk_path: str, disk_gb: Optional[int] = None) -> str:
+    """
+    Creates a VM disk from a template according to VM_DISK_CLONE_MODE
+    ("auto", "reflink" or "overlay"), grown to `disk_gb` if that is larger
+    than the template. Returns the method used, "reflink" or "overlay".
+    """
+    mode = settings.VM_DISK_CLONE_MODE
+    try:
+        size = None
+        if disk_gb:
+            template_size = json.loads(_qemu_img("info", "-U", "--output=json", template_path))["virtual-size"]
+            if disk_gb * 1024 ** 3 > template_size:
+                size = f"{disk_gb}G"
+
+        if mode in ("auto", "reflink") and _reflink(template_path, disk_path):
+            if size:
+                _qemu_img("resize", "-f", "qcow2", disk_path, size)
+            return "reflink"
+        if mode == "reflink":
+            raise RuntimeError(f"The filesystem of {VM_DISK_DIR} does not support reflinks.")
+
+        args = ["create", "-f", "qcow2", "-F", "qcow2", "-b", template_path, disk_path]
+        if size:
+            args.append(size)
+        _qemu_img(*args)
+        return "overlay"
+    except (OSError, RuntimeError) as e:
+        if os.path.exists(disk_path):
+            os.remove(disk_path)
+        raise RuntimeError(f"Failed to clone VM template: {e}")
+
+@_on_executor
+def create_vm(domain_name: str, ram_mb: int, cpu_vcore: float, disk_gb: int, template: str = DEFAULT_TEMPLATE):
+    """
+    Creates a new VM with the given resources by cloning a template disk and
+    defining a new domain.
     """
     lv_conn = get_libvirt_connection()
 
-    # 1. Clone the base disk image
+    # 1. Clone the template disk image
     disk_path = os.path.join(VM_DISK_DIR, f"{domain_name}.qcow2")
-    if not os.path.exists(BASE_IMAGE_PATH):
-        raise RuntimeError(f"Base image not found at {BASE_IMAGE_PATH}")
     try:
-        shutil.copyfile(BASE_IMAGE_PATH, disk_path)
-    except IOError as e:
-        raise RuntimeError(f"Failed to clone base image: {e}")
+        template_path = get_template_path(template)
+    except ValueError as e:
+        raise RuntimeError(str(e))
+    clone_disk(template_path, disk_path, disk_gb)
 
     # 2. Define the VM from XML
     vm_uuid = str(uuid.uuid4())
-    xml_config = VM_XML_TEMPLATE.format(
+    xml_config = build_domain_xml(
         name=domain_name,
-        uuid=vm_uuid,
-        disk_path=disk_path
+        vm_uuid=vm_uuid,
+        disk_path=disk_path,
+        ram_mb=ram_mb,
+        cpu_vcore=cpu_vcore,
+        hugepages=settings.VM_HUGEPAGES,
+        iothreads=settings.VM_IOTHREADS,
     )
 
     try:
@@ -114,16 +454,92 @@ def create_vm(domain_name: str):
         os.remove(disk_path)
         raise RuntimeError(f"Failed to define VM: {e}")
 
+@_on_executor
+def _start_block_pull(domain_name: str) -> bool:
+    """
+    Starts pulling the backing data into a running VM's disk. Returns False
+    if the VM is not running.
+    """
+    domain = get_libvirt_connection().lookupByName(domain_name)
+    if not domain.isActive():
+        return False
+    domain.blockPull("vda", 0, 0)
+    return True
+
+@_on_executor
+def _get_block_job(domain_name: str) -> dict:
+    return get_libvirt_connection().lookupByName(domain_name).blockJobInfo("vda", 0)
+
+class VMBusyError(RuntimeError):
+    """
+    The VM's disk is being modified offline, so it cannot be started now.
+    """
+
+@contextlib.contextmanager
+def _disk_locked(domain_name: str, shared: bool = False, wait: bool = True):
+    """
+    Locks a VM's disk against offline modification, across processes.
+    Starting a VM takes the lock `shared` and without waiting, raising
+    VMBusyError while an offline change holds it.
+    """
+    with open(os.path.join(VM_DISK_DIR, f".{domain_name}.lock"), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            raise VMBusyError("The VM's disk is being flattened. Try again once that has finished.")
+        yield
+
+def flatten_vm_disk(domain_name: str, progress: Optional[Callable[[int, int], None]] = None) -> bool:
+    """
+    Copies the template data into a VM's overlay so the disk no longer depends
+    on its template. Running VMs are flattened live with a block pull.
+    Returns False if the disk had no backing file (e.g. a reflink clone).
+    """
+    disk_path = os.path.join(VM_DISK_DIR, f"{domain_name}.qcow2")
+    # -U: the image may be open by a running VM
+    info = json.loads(_qemu_img("info", "-U", "--output=json", disk_path))
+    if not info.get("backing-filename"):
+        return False
+
+    # start_vm refuses to run while this is held, so a VM found stopped here
+    # stays stopped until the offline rebase has finished
+    with _disk_locked(domain_name):
+        try:
+            # Polled from the calling thread, so a long pull does not tie up
+            # a libvirt executor thread
+            if _start_block_pull(domain_name):
+                while True:
+                    job = _get_block_job(domain_name)
+                    if not job:
+                        break # Finished; the overlay is now standalone
+                    if progress and job["end"]:
+                        progress(job["cur"], job["end"])
+                    time.sleep(1)
+                return True
+        except libvirt.libvirtError as e:
+            raise RuntimeError(f"Failed to flatten VM disk: {e}")
+
+        # Offline: an empty backing file makes qemu-img copy the template data in
+        _qemu_img("rebase", "-f", "qcow2", "-b", "", disk_path)
+    return True
+
+@_on_executor
+@_reconnecting
 def start_vm(domain_name: str):
-    """Starts a VM."""
+    """
+    Starts a VM. Raises VMBusyError while its disk is being flattened offline.
+    """
     lv_conn = get_libvirt_connection()
-    try:
-        domain = lv_conn.lookupByName(domain_name)
-        domain.create()
-        return True
-    except libvirt.libvirtError:
-        return False
+    with _disk_locked(domain_name, shared=True, wait=False):
+        try:
+            domain = lv_conn.lookupByName(domain_name)
+            domain.create()
+            return True
+        except libvirt.libvirtError:
+            return False
 
+@_on_executor
+@_reconnecting
 def stop_vm(domain_name: str):
     """Stops a VM."""
     lv_conn = get_libvirt_connection()
@@ -134,6 +550,8 @@ def stop_vm(domain_name: str):
     except libvirt.libvirtError:
         return False
 
+@_on_executor
+@_reconnecting
 def restart_vm(domain_name: str):
     """Restarts a VM."""
     lv_conn = get_libvirt_connection()
@@ -144,6 +562,8 @@ def restart_vm(domain_name: str):
     except libvirt.libvirtError:
         return False
 
+@_on_executor
+@_reconnecting
 def remove_vm(domain_name: str):
     """
     Removes a VM and its associated disk.
@@ -159,13 +579,24 @@ def remove_vm(domain_name: str):
         disk_path = os.path.join(VM_DISK_DIR, f"{domain_name}.qcow2")
         if os.path.exists(disk_path):
             os.remove(disk_path)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(VM_DISK_DIR, f".{domain_name}.lock"))
 
         return True
     except libvirt.libvirtError:
         return False # Domain not found
 
-# Remember to close the connection when the application exits
-# This can be handled in the main application's shutdown event
 def close_connection():
-    if conn:
-        conn.close()
\ No newline at end of file
+    """
+    Closes every pooled connection and the executor. Called on shutdown.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+    with _connections_lock:
+        connections = list(_connections.values())
+        _connections.clear()
+    for lv_conn in connections:
+        _close_quietly(lv_conn)
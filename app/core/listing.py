@@ -0,0 +1,236 @@
+import base64
+import binascii
+import fnmatch
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.core import sandbox
+
+# Directory listings for the file manager. A directory is read once with
+# os.scandir (one lstat per entry; the type comes from the dirent) and the
+# result is cached together with the directory's inode and mtime. Adding,
+# removing or renaming an entry changes the mtime, so a cached listing is
+# reused only while those match. A file growing in place does not touch its
+# directory, so cached sizes are also bounded by a short TTL.
+#
+# Listings are sorted server-side (directories first) and paged with an
+# opaque cursor holding the last entry's sort key, so a page boundary stays
+# put when entries are added or removed in between.
+CACHE_TTL_SECONDS = 5
+MAX_CACHED_ENTRIES = 500_000 # Entries across all cached listings
+DEFAULT_PAGE_SIZE = 500
+SORT_KEYS = ("name", "size", "mtime")
+
+# A directory modified within this window may change again without its
+# mtime moving (coarse timestamp granularity); such listings are not cached.
+_RACY_SECONDS = 1.0
+
+class ListingEntry(NamedTuple):
+    name: str
+    path: str
+    is_dir: bool
+    size_bytes: int
+    modified_at: float
+
+class _Listing:
+    __slots__ = ("identity", "loaded_at", "entries", "views")
+
+    def __init__(self, identity: Tuple[int, int, int], entries: List[ListingEntry]):
+        self.identity = identity
+        self.loaded_at = time.monotonic()
+        self.entries = entries
+        self.views: Dict[Tuple[str, bool], List[ListingEntry]] = {}
+
+_listings: "OrderedDict[Tuple[str, str], _Listing]" = OrderedDict()
+_cached_entries = 0
+_lock = threading.Lock()
+
+def _sort_value(entry: ListingEntry, sort: str):
+    if sort == "size":
+        return entry.size_bytes
+    if sort == "mtime":
+        return entry.modified_at
+    return entry.name.casefold()
+
+def _rank(entry: ListingEntry, sort: str) -> Tuple[int, tuple]:
+    return (0 if entry.is_dir else 1), (_sort_value(entry, sort), entry.name)
+
+def _build_view(entries: List[ListingEntry], sort: str, descending: bool) -> List[ListingEntry]:
+    ordered = sorted(entries, key=lambda entry: (_sort_value(entry, sort), entry.name), reverse=descending)
+    return [entry for entry in ordered if entry.is_dir] + [entry for entry in ordered if not entry.is_dir]
+
+def _scan(dir_fd: int, prefix: str, skip: Optional[str]) -> List[ListingEntry]:
+    entries = []
+    with os.scandir(dir_fd) as it:
+        for entry in it:
+            if entry.name == skip and not prefix:
+                continue
+            try:
+                entry_stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue # Removed while listing
+            entries.append(ListingEntry(
+                entry.name,
+                f"{prefix}/{entry.name}" if prefix else entry.name,
+                entry.is_dir(follow_symlinks=False),
+                entry_stat.st_size,
+                entry_stat.st_mtime,
+            ))
+    return entries
+
+def _store(key: Tuple[str, str], listing: _Listing):
+    global _cached_entries
+    with _lock:
+        old = _listings.pop(key, None)
+        if old is not None:
+            _cached_entries -= len(old.entries)
+        _listings[key] = listing
+        _cached_entries += len(listing.entries)
+        while _cached_entries > MAX_CACHED_ENTRIES and _listings:
+            _, evicted = _listings.popitem(last=False)
+            _cached_entries -= len(evicted.entries)
+
+def _load(root_path: Path, relative_path: str, skip: Optional[str]) -> _Listing:
+    with sandbox.open_directory(root_path, relative_path) as dir_fd:
+        dir_stat = os.fstat(dir_fd)
+        identity = (dir_stat.st_dev, dir_stat.st_ino, dir_stat.st_mtime_ns)
+        prefix = "/".join(sandbox.split_path(relative_path))
+        key = (str(root_path), prefix)
+        with _lock:
+            listing = _listings.get(key)
+            if listing is not None and listing.identity == identity and time.monotonic() - listing.loaded_at < CACHE_TTL_SECONDS:
+                _listings.move_to_end(key)
+                return listing
+        listing = _Listing(identity, _scan(dir_fd, prefix, skip))
+    if time.time() - dir_stat.st_mtime >= _RACY_SECONDS:
+        _store(key, listing)
+    return listing
+
+def invalidate(root_path: Path, relative_dir: str):
+    """
+    Drops the cached listing of a directory after writing into it.
+    """
+    global _cached_entries
+    key = (str(root_path), "/".join(sandbox.split_path(relative_dir)))
+    with _lock:
+        listing = _listings.pop(key, None)
+        if listing is not None:
+            _cached_entries -= len(listing.entries)
+
+def _encode_cursor(entry: ListingEntry, sort: str, descending: bool) -> str:
+    group, (value, name) = _rank(entry, sort)
+    raw = json.dumps([sort, descending, group, value, name], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, sort: str, descending: bool) -> Tuple[int, tuple]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, cursor_descending, group, value, name = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+    if (cursor_sort, cursor_descending) != (sort, descending):
+        raise ValueError("The cursor belongs to a listing with a different sort order.")
+    return group, (value, name)
+
+def _first_after(view: List[ListingEntry], cursor_rank: Tuple[int, tuple], sort: str, descending: bool) -> int:
+    # Binary search for the first entry that the view places after the cursor
+    cursor_group, cursor_key = cursor_rank
+    lo, hi = 0, len(view)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        group, key = _rank(view[mid], sort)
+        if group != cursor_group:
+            after = group > cursor_group
+        else:
+            after = key < cursor_key if descending else key > cursor_key
+        if after:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+class ListingPage:
+    """
+    A page of a directory listing, produced while it is iterated (once).
+    `next_cursor` is set when the iteration ends: the cursor of the next
+    page, or None on the last page.
+    """
+
+    __slots__ = ("_view", "_start", "_matcher", "_limit", "_sort", "_descending", "next_cursor")
+
+    def __init__(self, view: List[ListingEntry], start: int, matcher, limit: Optional[int], sort: str, descending: bool):
+        self._view = view
+        self._start = start
+        self._matcher = matcher
+        self._limit = limit
+        self._sort = sort
+        self._descending = descending
+        self.next_cursor: Optional[str] = None
+
+    def __iter__(self) -> Iterator[ListingEntry]:
+        count = 0
+        last = None
+        for index in range(self._start, len(self._view)):
+            entry = self._view[index]
+            if self._matcher is not None and not self._matcher(entry.name):
+                continue
+            if self._limit is not None and count == self._limit:
+                self.next_cursor = _encode_cursor(last, self._sort, self._descending)
+                return
+            yield entry
+            last = entry
+            count += 1
+
+def open_page(
+    root_path: Path,
+    relative_path: str,
+    sort: str = "name",
+    descending: bool = False,
+    pattern: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = DEFAULT_PAGE_SIZE,
+    skip: Optional[str] = None,
+) -> ListingPage:
+    """
+    Prepares a page of a directory's entries, directories first, raising
+    any error before the first entry is produced. `pattern` is a
+    case-insensitive glob on the entry name; `limit` None returns
+    everything. An entry named `skip` directly in the root is never listed.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unsupported sort key '{sort}'. Use one of: {', '.join(SORT_KEYS)}.")
+    cursor_rank = _decode_cursor(cursor, sort, descending) if cursor else None
+    matcher = re.compile(fnmatch.translate(pattern), re.IGNORECASE).match if pattern else None
+
+    listing = _load(root_path, relative_path, skip)
+    view_key = (sort, descending)
+    view = listing.views.get(view_key)
+    if view is None:
+        view = listing.views[view_key] = _build_view(listing.entries, sort, descending)
+
+    start = _first_after(view, cursor_rank, sort, descending) if cursor_rank else 0
+    return ListingPage(view, start, matcher, limit, sort, descending)
+
+def list_directory(
+    root_path: Path,
+    relative_path: str,
+    sort: str = "name",
+    descending: bool = False,
+    pattern: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = DEFAULT_PAGE_SIZE,
+    skip: Optional[str] = None,
+) -> Tuple[List[ListingEntry], Optional[str]]:
+    """
+    Returns a page of a directory's entries (see open_page) and the cursor
+    of the next page (None on the last page).
+    """
+    page = open_page(root_path, relative_path, sort, descending, pattern, cursor, limit, skip)
+    entries = list(page)
+    return entries, page.next_cursor
@@ -0,0 +1,70 @@
+import threading
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+class RingBuffer:
+    """
+    Fixed-capacity time series with one `array` of doubles per field, so
+    samples cost a few bytes each instead of a dict per point. Once full,
+    new samples overwrite the oldest.
+    """
+
+    def __init__(self, fields: Sequence[str], capacity: int):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._timestamps = array("d", bytes(8 * capacity))
+        self._columns = {field: array("d", bytes(8 * capacity)) for field in self.fields}
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, values: Sequence[float]):
+        with self._lock:
+            i = self._next
+            self._timestamps[i] = timestamp
+            for field, value in zip(self.fields, values):
+                self._columns[field][i] = value
+            self._next = (i + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        """
+        Returns the most recent sample as a dict, or None if the buffer is empty.
+        """
+        with self._lock:
+            if not self._count:
+                return None
+            i = (self._next - 1) % self.capacity
+            sample = {field: column[i] for field, column in self._columns.items()}
+            sample["timestamp"] = self._timestamps[i]
+            return sample
+
+    def series(self, since: float, max_points: int) -> Dict[str, List[float]]:
+        """
+        Returns the samples taken at or after `since` in chronological order,
+        averaged into at most `max_points` buckets.
+        """
+        with self._lock:
+            start = (self._next - self._count) % self.capacity
+            indices = [(start + n) % self.capacity for n in range(self._count)]
+            indices = [i for i in indices if self._timestamps[i] >= since]
+            timestamps = [self._timestamps[i] for i in indices]
+            columns = {field: [column[i] for i in indices] for field, column in self._columns.items()}
+
+        result = {"timestamps": _downsample(timestamps, max_points)}
+        for field, values in columns.items():
+            result[field] = _downsample(values, max_points)
+        return result
+
+def _downsample(values: List[float], max_points: int) -> List[float]:
+    if max_points <= 0 or len(values) <= max_points:
+        return values
+    bucket_size = len(values) / max_points
+    result = []
+    for b in range(max_points):
+        bucket = values[int(b * bucket_size):int((b + 1) * bucket_size)]
+        result.append(sum(bucket) / len(bucket))
+    return result
@@ -0,0 +1,210 @@
+import errno
+import os
+import posixpath
+import stat
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List
+
+# Resolves user-supplied paths inside a root directory without ever leaving
+# it. Each root is opened once and its directory descriptor cached; paths are
+# then walked one component at a time with openat(O_NOFOLLOW) relative to it,
+# so symlinks (e.g. planted from inside a container that mounts the directory)
+# are refused rather than followed, and a component swapped for a symlink
+# between check and use cannot redirect the operation. Callers act on the
+# returned parent descriptor with the *at() family (dir_fd=...).
+#
+# A cached root is checked against the path's inode on every use, because a
+# restore swaps the whole directory for a new one.
+MAX_CACHED_ROOTS = 1024
+
+_WALK_FLAGS = os.O_PATH | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+
+class _Root:
+    __slots__ = ("fd", "dev", "ino", "users", "stale")
+
+    def __init__(self, fd: int, st: os.stat_result):
+        self.fd = fd
+        self.dev = st.st_dev
+        self.ino = st.st_ino
+        self.users = 0
+        self.stale = False
+
+_roots: "OrderedDict[str, _Root]" = OrderedDict()
+_lock = threading.Lock()
+
+def _retire(root: _Root):
+    # Called with _lock held; the descriptor is closed once nobody uses it
+    root.stale = True
+    if root.users == 0:
+        os.close(root.fd)
+
+def _acquire_root(root_path: Path) -> _Root:
+    key = str(root_path)
+    try:
+        st = os.stat(key)
+    except FileNotFoundError:
+        root_path.mkdir(parents=True, exist_ok=True)
+        st = os.stat(key)
+
+    with _lock:
+        root = _roots.get(key)
+        if root is not None and (root.dev, root.ino) == (st.st_dev, st.st_ino):
+            _roots.move_to_end(key)
+            root.users += 1
+            return root
+
+    fd = os.open(key, os.O_PATH | os.O_DIRECTORY | os.O_CLOEXEC)
+    new_root = _Root(fd, os.fstat(fd))
+    with _lock:
+        old = _roots.pop(key, None)
+        if old is not None:
+            _retire(old)
+        _roots[key] = new_root
+        while len(_roots) > MAX_CACHED_ROOTS:
+            _retire(_roots.popitem(last=False)[1])
+        new_root.users += 1
+    return new_root
+
+def _release_root(root: _Root):
+    with _lock:
+        root.users -= 1
+        if root.stale and root.users == 0:
+            os.close(root.fd)
+
+def forget(root_path: Path):
+    """
+    Drops the cached descriptor of a root, e.g. before deleting it.
+    """
+    with _lock:
+        root = _roots.pop(str(root_path), None)
+        if root is not None:
+            _retire(root)
+
+def split_path(relative_path: str) -> List[str]:
+    """
+    Normalizes a user path into its components. Raises PermissionError if
+    it climbs out of the root.
+    """
+    normalized = posixpath.normpath("/" + relative_path.replace("\\", "/")).lstrip("/")
+    parts = [part for part in normalized.split("/") if part not in ("", ".")]
+    if ".." in parts:
+        raise PermissionError("Access denied: Path is outside the service directory.")
+    return parts
+
+def _open_component(dir_fd: int, name: str, create: bool) -> int:
+    try:
+        return os.open(name, _WALK_FLAGS, dir_fd=dir_fd)
+    except FileNotFoundError:
+        if not create:
+            raise
+        try:
+            os.mkdir(name, dir_fd=dir_fd)
+        except FileExistsError:
+            pass # Created concurrently
+        return os.open(name, _WALK_FLAGS, dir_fd=dir_fd)
+    except OSError as e:
+        if e.errno in (errno.ENOTDIR, errno.ELOOP):
+            if _is_symlink(dir_fd, name):
+                raise PermissionError("Access denied: symbolic links are not followed.")
+            raise NotADirectoryError(f"'{name}' is not a directory.")
+        raise
+
+def _is_symlink(dir_fd: int, name: str) -> bool:
+    try:
+        return stat.S_ISLNK(os.stat(name, dir_fd=dir_fd, follow_symlinks=False).st_mode)
+    except FileNotFoundError:
+        return False
+
+class ResolvedPath:
+    """
+    A path inside a root: `dir_fd` is an open descriptor of its parent
+    directory and `name` its last component ("." for the root itself).
+    `relative` is the normalized path and `path` its absolute form, for
+    callers that must hand a path to other code. Use as a context manager.
+    """
+
+    __slots__ = ("_root", "dir_fd", "name", "relative", "path")
+
+    def __init__(self, root: _Root, dir_fd: int, name: str, relative: str, path: Path):
+        self._root = root
+        self.dir_fd = dir_fd
+        self.name = name
+        self.relative = relative
+        self.path = path
+
+    @property
+    def is_root(self) -> bool:
+        return self.name == "."
+
+    def lstat(self) -> os.stat_result:
+        return os.stat(self.name, dir_fd=self.dir_fd, follow_symlinks=False)
+
+    def open(self, flags: int, mode: int = 0o644) -> int:
+        """
+        Opens the path itself, refusing a symlink. Returns a raw descriptor.
+        """
+        try:
+            return os.open(self.name, flags | os.O_NOFOLLOW | os.O_CLOEXEC, mode, dir_fd=self.dir_fd)
+        except OSError as e:
+            # O_DIRECTORY on a symlink fails with ENOTDIR rather than ELOOP
+            if e.errno in (errno.ELOOP, errno.ENOTDIR) and _is_symlink(self.dir_fd, self.name):
+                raise PermissionError("Access denied: symbolic links are not followed.")
+            raise
+
+    def close(self):
+        if self.dir_fd != self._root.fd:
+            os.close(self.dir_fd)
+        _release_root(self._root)
+
+    def __enter__(self) -> "ResolvedPath":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def resolve(root_path: Path, relative_path: str, create_parents: bool = False) -> ResolvedPath:
+    """
+    Walks `relative_path` below `root_path` without following symlinks and
+    returns its parent directory descriptor and name. Missing parent
+    directories raise FileNotFoundError unless `create_parents`.
+    """
+    parts = split_path(relative_path)
+    root = _acquire_root(root_path)
+    dir_fd = root.fd
+    try:
+        for part in parts[:-1]:
+            next_fd = _open_component(dir_fd, part, create_parents)
+            if dir_fd != root.fd:
+                os.close(dir_fd)
+            dir_fd = next_fd
+    except BaseException:
+        if dir_fd != root.fd:
+            os.close(dir_fd)
+        _release_root(root)
+        raise
+    relative = "/".join(parts)
+    return ResolvedPath(root, dir_fd, parts[-1] if parts else ".", relative, root_path / relative if relative else root_path)
+
+@contextmanager
+def open_directory(root_path: Path, relative_path: str, create: bool = False) -> Iterator[int]:
+    """
+    Yields a readable descriptor of a directory below `root_path` (usable
+    with os.scandir and as dir_fd), creating it and its parents if `create`.
+    """
+    with resolve(root_path, relative_path, create_parents=create) as target:
+        if create and not target.is_root:
+            try:
+                os.mkdir(target.name, dir_fd=target.dir_fd)
+            except FileExistsError:
+                pass
+        try:
+            fd = target.open(os.O_RDONLY | os.O_DIRECTORY)
+        except NotADirectoryError:
+            raise ValueError("Path is not a directory.")
+    try:
+        yield fd
+    finally:
+        os.close(fd)
@@ -0,0 +1,253 @@
+import os
+import sqlite3
+import stat
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core import file_manager, sandbox
+from app.core.config import settings
+
+# Content search over a service's text files, backed by a trigram index.
+# Every indexed file goes into a contentless SQLite FTS5 table with the
+# trigram tokenizer, which keeps (case-folded) trigram -> file id lists and
+# not the text itself. A query only reads the lists of its own trigrams and
+# confirms the few candidate files by reading them.
+#
+# The index is a SQLite database next to the service directory (outside it,
+# so services cannot write to it and it does not count towards the quota),
+# built on the first search. Later searches re-check file sizes and mtimes
+# when the index is older than SEARCH_REFRESH_SECONDS, or the file manager
+# changed something, and only re-read files that changed. File ids are never
+# reused: a changed file gets a new id and its old rows are filtered out by
+# joining on the files table until the index is rebuilt.
+INDEX_VERSION = 1
+MIN_QUERY_CHARS = 3
+MAX_LINE_CHARS = 300
+BINARY_SNIFF_BYTES = 8192
+
+# Never text, or too large to be worth reading: world and region data,
+# archives, images and databases
+SKIPPED_EXTENSIONS = frozenset((
+    ".mca", ".mcr", ".mcc", ".dat", ".dat_old", ".nbt", ".schem", ".schematic",
+    ".jar", ".zip", ".gz", ".tgz", ".zst", ".xz", ".bz2", ".7z", ".rar",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico", ".ogg", ".mp3", ".wav",
+    ".db", ".sqlite", ".mv.db", ".lock", ".so", ".dll", ".exe", ".class", ".bin",
+))
+SKIPPED_DIRS = frozenset(("region", "entities", "poi", file_manager.UPLOAD_DIR_NAME))
+
+# Ids of changed or removed files still in the FTS table; past this many
+# (and more than there are live files) the index is rebuilt
+COMPACT_MIN_DEAD_IDS = 1000
+
+_locks: Dict[int, threading.Lock] = {}
+_locks_lock = threading.Lock()
+_refreshed_at: Dict[int, float] = {}
+_stale: Set[int] = set()
+
+def get_index_path(service_id: int) -> Path:
+    service_path = file_manager.get_service_path(service_id)
+    return service_path.with_name(f".{service_path.name}.search.db")
+
+def _lock_for(service_id: int) -> threading.Lock:
+    with _locks_lock:
+        lock = _locks.get(service_id)
+        if lock is None:
+            lock = _locks[service_id] = threading.Lock()
+        return lock
+
+def _connect(service_id: int) -> sqlite3.Connection:
+    index_path = get_index_path(service_id)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(str(index_path))
+    db.execute("PRAGMA journal_mode=WAL")
+    if db.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+        _reset(db)
+    return db
+
+def _reset(db: sqlite3.Connection):
+    try:
+        db.executescript(
+            "DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS content; DROP TABLE IF EXISTS meta;"
+            "CREATE TABLE files (id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT UNIQUE NOT NULL,"
+            " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, indexed INTEGER NOT NULL);"
+            "CREATE VIRTUAL TABLE content USING fts5(body, content='', detail='none', tokenize='trigram');"
+            "CREATE TABLE meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+            f"PRAGMA user_version = {INDEX_VERSION};"
+        )
+    except sqlite3.OperationalError as e:
+        db.close()
+        raise RuntimeError(f"File search needs SQLite 3.34+ with FTS5 (found {sqlite3.sqlite_version}): {e}")
+
+def _is_skipped(name: str) -> bool:
+    lowered = name.lower()
+    return any(lowered.endswith(extension) for extension in SKIPPED_EXTENSIONS)
+
+def _read_text(name: str, dir_fd: int, size: int) -> Optional[bytes]:
+    """
+    Returns the content of a file, or None if it looks binary.
+    """
+    fd = os.open(name, os.O_RDONLY | os.O_NOFOLLOW | os.O_CLOEXEC, dir_fd=dir_fd)
+    with os.fdopen(fd, "rb") as f:
+        data = f.read(size)
+    return None if b"\0" in data[:BINARY_SNIFF_BYTES] else data
+
+def _walk(service_id: int) -> Iterable[Tuple[str, str, int, os.stat_result]]:
+    """
+    Yields (path, name, dir_fd, stat) of every candidate regular file.
+    """
+    with sandbox.open_directory(file_manager.get_service_path(service_id), "/") as root_fd:
+        for dirpath, dirnames, filenames, dir_fd in os.fwalk(".", dir_fd=root_fd):
+            dirnames[:] = [name for name in dirnames if name not in SKIPPED_DIRS]
+            prefix = dirpath[2:]
+            for name in filenames:
+                if _is_skipped(name):
+                    continue
+                try:
+                    file_stat = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if stat.S_ISREG(file_stat.st_mode) and file_stat.st_size <= settings.SEARCH_MAX_FILE_BYTES:
+                    yield (f"{prefix}/{name}" if prefix else name), name, dir_fd, file_stat
+
+def _dead_ids(db: sqlite3.Connection) -> int:
+    row = db.execute("SELECT value FROM meta WHERE key = 'dead_ids'").fetchone()
+    return row[0] if row else 0
+
+def _refresh(service_id: int, db: sqlite3.Connection):
+    # Rows of a contentless FTS table cannot be deleted without their
+    # original text, so once dead ids outnumber live files the index is
+    # simply rebuilt
+    dead = _dead_ids(db)
+    if dead >= COMPACT_MIN_DEAD_IDS and dead >= db.execute("SELECT COUNT(*) FROM files WHERE indexed").fetchone()[0]:
+        _reset(db)
+        db.execute("VACUUM")
+    known = {path: (file_id, size, mtime_ns, indexed) for file_id, path, size, mtime_ns, indexed in db.execute("SELECT id, path, size, mtime_ns, indexed FROM files")}
+    seen = set()
+    dead_ids = 0
+
+    with db:
+        for path, name, dir_fd, file_stat in _walk(service_id):
+            seen.add(path)
+            old = known.get(path)
+            if old is not None and old[1:3] == (file_stat.st_size, file_stat.st_mtime_ns):
+                continue
+            try:
+                data = _read_text(name, dir_fd, file_stat.st_size)
+            except OSError:
+                seen.discard(path)
+                continue
+            if old is not None:
+                db.execute("DELETE FROM files WHERE id = ?", (old[0],))
+                dead_ids += old[3]
+            file_id = db.execute(
+                "INSERT INTO files (path, size, mtime_ns, indexed) VALUES (?, ?, ?, ?)",
+                (path, file_stat.st_size, file_stat.st_mtime_ns, data is not None),
+            ).lastrowid
+            if data is not None:
+                db.execute("INSERT INTO content (rowid, body) VALUES (?, ?)", (file_id, data.decode("utf-8", "replace")))
+
+        for path in known.keys() - seen:
+            file_id, _, _, indexed = known[path]
+            db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            dead_ids += indexed
+
+        if dead_ids:
+            db.execute(
+                "INSERT INTO meta (key, value) VALUES ('dead_ids', ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = value + excluded.value",
+                (dead_ids,),
+            )
+    if not known:
+        # Merge the segments written by a full build
+        with db:
+            db.execute("INSERT INTO content (content) VALUES ('optimize')")
+
+def mark_stale(service_id: int, relative_path: str = ""):
+    """
+    Makes the next search re-check mtimes. Registered with the file manager.
+    """
+    _stale.add(service_id)
+
+file_manager.add_change_listener(mark_stale)
+
+def _ensure_fresh(service_id: int, db: sqlite3.Connection):
+    # Called with the service's lock held
+    refreshed_at = _refreshed_at.get(service_id)
+    if refreshed_at is not None and service_id not in _stale and time.monotonic() - refreshed_at < settings.SEARCH_REFRESH_SECONDS:
+        return
+    _stale.discard(service_id)
+    _refresh(service_id, db)
+    _refreshed_at[service_id] = time.monotonic()
+
+def _candidates(db: sqlite3.Connection, needle: str) -> List[Tuple[int, str]]:
+    # Every trigram of the query as a separate term: detail=none indexes
+    # no positions, and the matches are confirmed against the files anyway
+    trigrams = {needle[i:i + 3] for i in range(len(needle) - 2)}
+    expression = " AND ".join('"' + trigram.replace('"', '""') + '"' for trigram in trigrams)
+    # Ids of changed or removed files are no longer in the files table
+    return db.execute(
+        "SELECT files.id, files.path FROM content JOIN files ON files.id = content.rowid "
+        "WHERE content MATCH ? ORDER BY files.path",
+        (expression,),
+    ).fetchall()
+
+def _find_lines(text: str, needle: str, limit: int) -> List[Tuple[int, str]]:
+    matches = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if needle in line.lower():
+            matches.append((number, line[:MAX_LINE_CHARS]))
+            if len(matches) == limit:
+                break
+    return matches
+
+def search(service_id: int, query: str, path: str = "/", limit: int = 100) -> Tuple[List[dict], bool]:
+    """
+    Returns up to `limit` matching lines (path, line number, text) of text
+    files below `path` containing `query` (case-insensitive), and whether
+    there were more.
+    """
+    needle = query.lower()
+    if len(needle) < MIN_QUERY_CHARS:
+        raise ValueError(f"The search text must be at least {MIN_QUERY_CHARS} characters long.")
+    prefix = "/".join(sandbox.split_path(path))
+    root_path = file_manager.get_service_path(service_id)
+
+    # Creating, refreshing or rebuilding the index drops and recreates its
+    # tables, so nothing touches the database without the service's lock
+    with _lock_for(service_id):
+        db = _connect(service_id)
+        try:
+            _ensure_fresh(service_id, db)
+            candidates = _candidates(db, needle)
+        finally:
+            db.close()
+
+    results = []
+    for _, file_path in candidates:
+        if prefix and not (file_path == prefix or file_path.startswith(prefix + "/")):
+            continue
+        try:
+            with sandbox.resolve(root_path, file_path) as target:
+                fd = target.open(os.O_RDONLY)
+            with os.fdopen(fd, "rb") as f:
+                data = f.read(settings.SEARCH_MAX_FILE_BYTES)
+        except OSError:
+            continue # Changed since it was indexed
+        for line, text in _find_lines(data.decode("utf-8", "replace"), needle, limit - len(results) + 1):
+            if len(results) == limit:
+                return results, True
+            results.append({"path": file_path, "line": line, "text": text})
+    return results, False
+
+def forget(service_id: int):
+    """
+    Deletes the index of a service, e.g. when it is deleted.
+    """
+    with _lock_for(service_id):
+        _refreshed_at.pop(service_id, None)
+        _stale.discard(service_id)
+        index_path = get_index_path(service_id)
+        for suffix in ("", "-wal", "-shm"):
+            index_path.with_name(index_path.name + suffix).unlink(missing_ok=True)
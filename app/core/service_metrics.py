@@ -0,0 +1,141 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.ring_buffer import RingBuffer
+from app.core import docker_manager, libvirt_manager
+from app.db.session import SessionLocal
+from app.models.service_model import Service, ServiceType
+
+# Collects CPU, memory, disk and network usage of every service in one sweep.
+# Snapshots are taken in parallel on a worker pool because docker's
+# stats(stream=False) waits for a second sample before returning.
+FIELDS = (
+    "cpu_percent",
+    "mem_used_bytes",
+    "mem_limit_bytes",
+    "disk_read_bytes_per_s",
+    "disk_write_bytes_per_s",
+    "net_rx_bytes_per_s",
+    "net_tx_bytes_per_s",
+)
+
+_COUNTERS = ("disk_read_bytes", "disk_write_bytes", "net_rx_bytes", "net_tx_bytes")
+
+_buffers: Dict[int, RingBuffer] = {}
+# Previous cumulative counters per service, used to turn them into rates
+_previous: Dict[int, Tuple[float, dict]] = {}
+_lock = threading.Lock()
+_stopping = threading.Event()
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _history_size() -> int:
+    return max(1, settings.SERVICE_METRICS_RETENTION_SECONDS // settings.SERVICE_METRICS_INTERVAL_SECONDS)
+
+def _snapshot(service_id: int, service_type: ServiceType, backend_id: str):
+    try:
+        if service_type == ServiceType.VPS:
+            return service_id, time.time(), libvirt_manager.get_vm_stats(backend_id)
+        return service_id, time.time(), docker_manager.get_container_stats(backend_id)
+    except RuntimeError:
+        return service_id, time.time(), None
+
+def _record(service_id: int, timestamp: float, stats: dict):
+    previous = _previous.get(service_id)
+    _previous[service_id] = (timestamp, stats)
+    elapsed = timestamp - previous[0] if previous else 0
+
+    rates = {}
+    for counter in _COUNTERS:
+        delta = stats[counter] - previous[1][counter] if previous else 0
+        # Counters reset when a container or VM restarts
+        rates[counter] = delta / elapsed if elapsed > 0 and delta >= 0 else 0.0
+
+    cpu_percent = stats.get("cpu_percent")
+    if cpu_percent is None:
+        # libvirt reports cumulative CPU time; 100% is one core busy
+        cpu_delta = stats["cpu_time_ns"] - previous[1]["cpu_time_ns"] if previous else 0
+        cpu_percent = cpu_delta / (elapsed * 1e9) * 100 if elapsed > 0 and cpu_delta >= 0 else 0.0
+
+    with _lock:
+        buffer = _buffers.get(service_id)
+        if buffer is None:
+            buffer = _buffers[service_id] = RingBuffer(FIELDS, _history_size())
+    buffer.append(timestamp, (
+        cpu_percent,
+        stats["mem_used_bytes"],
+        stats["mem_limit_bytes"],
+        rates["disk_read_bytes"],
+        rates["disk_write_bytes"],
+        rates["net_rx_bytes"],
+        rates["net_tx_bytes"],
+    ))
+
+def collect():
+    """
+    Takes one snapshot of every service. Blocking.
+    """
+    db = SessionLocal()
+    try:
+        targets = [
+            (service.id, service.service_type, service.libvirt_domain_name if service.service_type == ServiceType.VPS else service.docker_container_id)
+            for service in db.query(Service).all()
+        ]
+    finally:
+        db.close()
+
+    live_ids = {service_id for service_id, _, _ in targets}
+    with _lock:
+        for service_id in list(_buffers):
+            if service_id not in live_ids:
+                del _buffers[service_id]
+                _previous.pop(service_id, None)
+
+    futures = [_executor.submit(_snapshot, *target) for target in targets if target[2]]
+    for future in futures:
+        service_id, timestamp, stats = future.result()
+        if stats is None:
+            _previous.pop(service_id, None)  # Stopped: next start begins fresh counters
+            continue
+        _record(service_id, timestamp, stats)
+
+def _run():
+    while not _stopping.is_set():
+        started = time.monotonic()
+        try:
+            collect()
+        except Exception as e:
+            print(f"Service metrics sweep failed: {e}")
+        _stopping.wait(max(0, settings.SERVICE_METRICS_INTERVAL_SECONDS - (time.monotonic() - started)))
+
+def start():
+    """
+    Starts the worker pool and the background sweep thread.
+    """
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=settings.SERVICE_METRICS_WORKERS, thread_name_prefix="service-metrics")
+    _stopping.clear()
+    threading.Thread(target=_run, name="service-metrics-sweep", daemon=True).start()
+
+def stop():
+    _stopping.set()
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+
+def get_history(service_id: int, window_seconds: float, max_points: int) -> Dict[str, List[float]]:
+    """
+    Returns the service's samples for the last `window_seconds`, downsampled
+    to at most `max_points` points per series.
+    """
+    with _lock:
+        buffer = _buffers.get(service_id)
+    if buffer is None:
+        return {field: [] for field in ("timestamps",) + FIELDS}
+    return buffer.series(time.time() - window_seconds, max_points)
+
+def get_latest(service_id: int) -> Optional[Dict[str, float]]:
+    with _lock:
+        buffer = _buffers.get(service_id)
+    return buffer.latest() if buffer is not None else None
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from app.models.service_model import Service, ServiceType
+from app.core import docker_api, docker_manager, libvirt_manager, status_monitor
+
+# Service states are read on every dashboard view. A short TTL lets a burst of
+# page loads share one bulk query to docker/libvirt while still reflecting a
+# start or stop within a few seconds.
+STATUS_TTL_SECONDS = 5
+
+_lock = threading.Lock()
+_statuses: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+def status_key(service: Service) -> Tuple[str, str]:
+    """
+    Returns the ("container", id) or ("vm", domain name) key of a service.
+    """
+    if service.service_type == ServiceType.VPS:
+        return ("vm", service.libvirt_domain_name)
+    return ("container", service.docker_container_id)
+
+def invalidate(service: Service):
+    """
+    Forgets the cached status of a service, e.g. after starting or stopping it.
+    """
+    with _lock:
+        _statuses.pop(status_key(service), None)
+
+def _lookup(services: List[Service]) -> Tuple[Dict[int, str], List[str], List[str]]:
+    """
+    Resolves what the status monitor and the TTL cache already know. Returns
+    the partial result and the container ids and domain names still missing.
+    """
+    now = time.monotonic()
+    result = {}
+    missing_containers, missing_vms = [], []
+
+    with _lock:
+        for service in services:
+            key = status_key(service)
+            if not key[1]:
+                result[service.id] = "not_found"
+                continue
+            pushed = status_monitor.get_status(key) if status_monitor.is_running() else None
+            if pushed is not None:
+                result[service.id] = pushed
+                continue
+            cached = _statuses.get(key)
+            if cached and now - cached[1] < STATUS_TTL_SECONDS:
+                result[service.id] = cached[0]
+            elif key[0] == "vm":
+                missing_vms.append(key[1])
+            else:
+                missing_containers.append(key[1])
+    return result, missing_containers, missing_vms
+
+def _fetch_containers(container_ids: List[str]) -> dict:
+    try:
+        return {("container", container_id): status for container_id, status in docker_manager.get_container_statuses(container_ids).items()}
+    except RuntimeError:
+        return {} # Docker unavailable; these services show as unknown
+
+async def _fetch_containers_async(container_ids: List[str]) -> dict:
+    try:
+        found = await docker_api.run_async(docker_api.list_container_statuses(container_ids))
+    except RuntimeError:
+        return {}
+    return {("container", container_id): found.get(container_id, "not_found") for container_id in container_ids}
+
+def _fetch_vms(domain_names: List[str]) -> dict:
+    try:
+        return {("vm", domain_name): status for domain_name, status in libvirt_manager.get_vm_statuses(domain_names).items()}
+    except RuntimeError:
+        return {} # libvirt unavailable; these services show as unknown
+
+def _merge(services: List[Service], result: Dict[int, str], fetched: dict) -> Dict[int, str]:
+    fetched_at = time.monotonic()
+    with _lock:
+        for key, status in fetched.items():
+            _statuses[key] = (status, fetched_at)
+
+    for service in services:
+        if service.id not in result:
+            result[service.id] = fetched.get(status_key(service), "unknown")
+    return result
+
+def get_service_statuses(services: Iterable[Service]) -> Dict[int, str]:
+    """
+    Returns a dict of service id to status. States pushed by the status
+    monitor are plain dict lookups; anything it does not know yet falls back
+    to the TTL cache, and misses there are fetched with at most one docker
+    and one libvirt call. Blocking only in that last case.
+    """
+    services = list(services)
+    result, missing_containers, missing_vms = _lookup(services)
+    fetched = {}
+    if missing_containers:
+        fetched.update(_fetch_containers(missing_containers))
+    if missing_vms:
+        fetched.update(_fetch_vms(missing_vms))
+    return _merge(services, result, fetched)
+
+async def get_service_statuses_async(services: Iterable[Service]) -> Dict[int, str]:
+    """
+    Same as get_service_statuses, for the event loop. Cache misses are
+    fetched concurrently, without tying up the shared threadpool.
+    """
+    services = list(services)
+    result, missing_containers, missing_vms = _lookup(services)
+    lookups = []
+    if missing_containers:
+        lookups.append(_fetch_containers_async(missing_containers))
+    if missing_vms:
+        lookups.append(libvirt_manager.run_async(_fetch_vms, missing_vms))
+    fetched = {}
+    for partial in await asyncio.gather(*lookups):
+        fetched.update(partial)
+    return _merge(services, result, fetched)
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+import libvirt
+from docker.errors import APIError, DockerException
+
+from app.core import docker_api, docker_manager, libvirt_manager
+
+# Keeps an in-memory table of container and VM states, fed by the Docker events
+# stream and libvirt lifecycle callbacks. A periodic full listing seeds the
+# table and repairs anything missed while a stream was reconnecting.
+RECONCILE_INTERVAL_SECONDS = 30
+RECONNECT_DELAY_SECONDS = 5
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Docker event action -> container status as reported by `docker ps`
+DOCKER_ACTION_STATUS = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "die": "exited",
+    "stop": "exited",
+    "destroy": "not_found",
+}
+# A signal or an OOM kill does not necessarily end the process (docker kill
+# -s HUP, an OOM victim that is not PID 1); the container is re-inspected
+# instead, and a die event follows if it did exit
+DOCKER_INSPECT_ACTIONS = frozenset(("kill", "oom"))
+
+# libvirt lifecycle event -> status names used by libvirt_manager.STATE_MAP
+LIBVIRT_EVENT_STATUS = {
+    libvirt.VIR_DOMAIN_EVENT_DEFINED: "shutoff",
+    libvirt.VIR_DOMAIN_EVENT_UNDEFINED: "not_found",
+    libvirt.VIR_DOMAIN_EVENT_STARTED: "running",
+    libvirt.VIR_DOMAIN_EVENT_SUSPENDED: "paused",
+    libvirt.VIR_DOMAIN_EVENT_RESUMED: "running",
+    libvirt.VIR_DOMAIN_EVENT_STOPPED: "shutoff",
+    libvirt.VIR_DOMAIN_EVENT_SHUTDOWN: "shutdown",
+    libvirt.VIR_DOMAIN_EVENT_PMSUSPENDED: "pmsuspended",
+    libvirt.VIR_DOMAIN_EVENT_CRASHED: "crashed",
+}
+
+StatusKey = Tuple[str, str]  # ("container", id) or ("vm", domain name)
+
+_lock = threading.Lock()
+_states: Dict[StatusKey, str] = {}
+_subscribers: Set[asyncio.Queue] = set()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_stopping = threading.Event()
+_docker_events = None
+
+def is_running() -> bool:
+    return _loop is not None and not _stopping.is_set()
+
+def get_status(key: StatusKey) -> Optional[str]:
+    """
+    Returns the last known status for a container or VM, or None if unknown.
+    """
+    return _states.get(key)
+
+def _set_status(key: StatusKey, status: str):
+    with _lock:
+        if _states.get(key) == status:
+            return
+        _states[key] = status
+    if _loop is not None:
+        _loop.call_soon_threadsafe(_publish, key, status)
+
+def _publish(key: StatusKey, status: str):
+    for queue in list(_subscribers):
+        if queue.full():
+            # Slow consumer: drop its oldest change rather than block the others
+            queue.get_nowait()
+        queue.put_nowait((key, status))
+
+def subscribe() -> asyncio.Queue:
+    """
+    Returns a queue that receives (key, status) tuples for every state change.
+    Must be called from the event loop.
+    """
+    queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    _subscribers.add(queue)
+    return queue
+
+def unsubscribe(queue: asyncio.Queue):
+    _subscribers.discard(queue)
+
+def _forget_missing(kind: str, known: Set[StatusKey], present: Set[StatusKey]):
+    # Removed outside the panel (docker rm, virsh undefine): report it once,
+    # then stop tracking the key
+    for key in known - present:
+        if key[0] != kind:
+            continue
+        _set_status(key, "not_found")
+        with _lock:
+            if _states.get(key) == "not_found":
+                del _states[key]
+
+def _reconcile():
+    """
+    Refreshes the whole table with one docker and one libvirt listing.
+    """
+    # Keys added by events while listing are not judged by this listing
+    with _lock:
+        known = set(_states)
+    try:
+        present = set()
+        for container_id, status in docker_api.run(docker_api.list_container_statuses()).items():
+            present.add(("container", container_id))
+            _set_status(("container", container_id), status)
+        _forget_missing("container", known, present)
+    except RuntimeError:
+        pass
+    try:
+        present = set()
+        lv_conn = libvirt_manager.get_libvirt_connection()
+        for domain in lv_conn.listAllDomains(0):
+            state, reason = domain.state()
+            present.add(("vm", domain.name()))
+            _set_status(("vm", domain.name()), libvirt_manager.STATE_MAP.get(state, "unknown"))
+        _forget_missing("vm", known, present)
+    except (RuntimeError, libvirt.libvirtError):
+        pass
+
+def _run_reconciler():
+    while not _stopping.is_set():
+        _reconcile()
+        _stopping.wait(RECONCILE_INTERVAL_SECONDS)
+
+def _inspect_container(container_id: str) -> Optional[str]:
+    try:
+        return docker_api.run(docker_api.get_container_status(container_id))
+    except RuntimeError:
+        return None # The reconciler will catch up
+
+def _run_docker_events():
+    global _docker_events
+    while not _stopping.is_set():
+        try:
+            d_client = docker_manager.get_docker_client()
+            _docker_events = d_client.events(decode=True, filters={"type": "container"})
+            for event in _docker_events:
+                action = event.get("Action") or event.get("status")
+                container_id = event.get("id") or event.get("Actor", {}).get("ID")
+                if not container_id:
+                    continue
+                status = DOCKER_ACTION_STATUS.get(action)
+                if status is None and action in DOCKER_INSPECT_ACTIONS:
+                    status = _inspect_container(container_id)
+                if status:
+                    _set_status(("container", container_id), status)
+        except (RuntimeError, APIError, DockerException, OSError):
+            pass
+        _stopping.wait(RECONNECT_DELAY_SECONDS)
+
+def _on_domain_lifecycle(conn, domain, event, detail, opaque):
+    status = LIBVIRT_EVENT_STATUS.get(event)
+    if status:
+        _set_status(("vm", domain.name()), status)
+
+def _run_libvirt_events():
+    # Callbacks are dispatched by libvirt_manager's event loop thread
+    libvirt_manager.ensure_event_loop()
+    while not _stopping.is_set():
+        conn = None
+        try:
+            conn = libvirt.openReadOnly(libvirt_manager.LIBVIRT_URI)
+            conn.setKeepAlive(5, 3)
+            conn.domainEventRegisterAny(None, libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE, _on_domain_lifecycle, None)
+            while not _stopping.is_set() and conn.isAlive():
+                _stopping.wait(1)
+        except libvirt.libvirtError:
+            pass
+        if conn is not None:
+            try:
+                conn.close()
+            except libvirt.libvirtError:
+                pass
+        _stopping.wait(RECONNECT_DELAY_SECONDS)
+
+def start(loop: asyncio.AbstractEventLoop):
+    """
+    Starts the event listeners and the reconciler on background threads.
+    """
+    global _loop
+    _loop = loop
+    _stopping.clear()
+    for target in (_run_reconciler, _run_docker_events, _run_libvirt_events):
+        threading.Thread(target=target, name=f"status-{target.__name__}", daemon=True).start()
+
+def stop():
+    global _loop
+    _stopping.set()
+    _loop = None
+    if _docker_events is not None:
+        try:
+            _docker_events.close()
+        except Exception:
+            pass
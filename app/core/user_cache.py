@@ -0,0 +1,70 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.models.user_model import User
+
+# Nearly every request resolves the logged-in user by primary key. The column
+# values are kept per worker for a short time and re-attached to the request's
+# session with merge(load=False), which issues no SELECT. Updates made through
+# the ORM in this process invalidate the entry right away (see the mapper
+# events below); the TTL bounds how stale another worker's change can be.
+CACHE_TTL_SECONDS = 30
+MAX_ENTRIES = 10000
+
+# Read from the table rather than the mapper, which cannot be configured
+# before every related model has been imported
+_COLUMNS = tuple(column.key for column in User.__table__.columns)
+
+_lock = threading.Lock()
+_users: Dict[int, Tuple[dict, float]] = {}
+
+def invalidate(user_id: int):
+    with _lock:
+        _users.pop(user_id, None)
+
+def _cached(user_id: int) -> Optional[User]:
+    with _lock:
+        entry = _users.get(user_id)
+    if entry is None or time.monotonic() - entry[1] >= CACHE_TTL_SECONDS:
+        return None
+    user = User(**entry[0])
+    make_transient_to_detached(user)
+    return user
+
+def _store(user: User):
+    values = {key: getattr(user, key) for key in _COLUMNS}
+    with _lock:
+        if len(_users) >= MAX_ENTRIES:
+            _users.pop(next(iter(_users))) # Oldest insertion
+        _users[user.id] = (values, time.monotonic())
+
+def get_user(db: Session, user_id: int) -> Optional[User]:
+    """
+    Returns the user attached to `db`, or None if it does not exist.
+    """
+    cached = _cached(user_id)
+    if cached is not None:
+        return db.merge(cached, load=False)
+    user = db.get(User, user_id)
+    if user is not None:
+        _store(user)
+    return user
+
+async def get_user_async(db: AsyncSession, user_id: int) -> Optional[User]:
+    cached = _cached(user_id)
+    if cached is not None:
+        return await db.merge(cached, load=False)
+    user = await db.get(User, user_id)
+    if user is not None:
+        _store(user)
+    return user
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _on_user_changed(mapper, connection, target: User):
+    invalidate(target.id)
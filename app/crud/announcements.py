@@ -0,0 +1,48 @@
+import uuid
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List
+
+from app.models.announcement import Announcement
+from app.core import announcement_cache
+
+def list_announcements(db: Session) -> List[Announcement]:
+    """
+    List all announcements, newest first (admin view).
+    """
+    return db.query(Announcement).order_by(Announcement.created_at.desc()).all()
+
+def create_announcement(db: Session, content: str, is_active: bool = True) -> Announcement:
+    new_announcement = Announcement(
+        id=str(uuid.uuid4()),
+        content=content,
+        is_active=is_active
+    )
+    db.add(new_announcement)
+    db.commit()
+    announcement_cache.invalidate()
+    db.refresh(new_announcement)
+    return new_announcement
+
+def update_announcement(db: Session, announcement_id: str, update_data: dict) -> Announcement:
+    announcement = db.query(Announcement).filter(Announcement.id == announcement_id).first()
+    if not announcement:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Announcement not found")
+
+    for field, value in update_data.items():
+        setattr(announcement, field, value)
+
+    db.add(announcement)
+    db.commit()
+    announcement_cache.invalidate()
+    db.refresh(announcement)
+    return announcement
+
+def delete_announcement(db: Session, announcement_id: str):
+    announcement = db.query(Announcement).filter(Announcement.id == announcement_id).first()
+    if not announcement:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Announcement not found")
+
+    db.delete(announcement)
+    db.commit()
+    announcement_cache.invalidate()
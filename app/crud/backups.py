@@ -0,0 +1,101 @@
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.models.user_model import User
+from app.models.service_model import Service
+from app.models.backup import Backup
+from app.models.job import Job
+from app.core import backup_manager, compression, disk_usage, file_manager, job_queue
+from app.crud import services as crud_services
+from app.core.config import settings
+
+def get_backup_for_user(db: Session, backup_id: int, user: User) -> Backup:
+    """
+    Get a backup of a service the user owns.
+    """
+    backup = db.query(Backup).filter(Backup.id == backup_id).first()
+    if not backup:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Backup not found")
+
+    service = db.query(Service).filter(Service.id == backup.service_id, Service.owner_id == user.id).first()
+    if not service:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    return backup
+
+def create_backup(db: Session, service: Service, user: User, codec: Optional[str] = None, level: Optional[int] = None) -> Job:
+    """
+    Schedule a backup of the service's files, compressed with the given codec
+    or the configured default.
+    """
+    codec = codec or settings.BACKUP_CODEC
+    if level is None and codec == settings.BACKUP_CODEC:
+        level = settings.BACKUP_COMPRESSION_LEVEL
+    try:
+        level = compression.validate(codec, level)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return job_queue.enqueue(db, "create_backup", user.id, service_id=service.id, params={"codec": codec, "level": level})
+
+def restore_backup(db: Session, backup: Backup, user: User, path: Optional[str] = None) -> Job:
+    """
+    Schedule a restore of the service's files from a backup, or of only the
+    file or directory at `path`.
+    """
+    if path is not None:
+        try:
+            path = backup_manager.normalize_restore_path(path)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    _ensure_restore_fits(db, backup, path)
+    return job_queue.enqueue(db, "restore_backup", user.id, service_id=backup.service_id, params={"backup_id": backup.id, "path": path})
+
+def _ensure_restore_fits(db: Session, backup: Backup, path: Optional[str]):
+    """
+    Rejects a restore that would leave the service above its disk quota. The
+    restored files replace what is at `path` (or everything).
+    """
+    try:
+        restore_bytes = backup_manager.get_restore_size(backup.service_id, backup.filename, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Backup file not found")
+    if restore_bytes is None:
+        return # Legacy archive: size unknown until extracted
+    service = db.get(Service, backup.service_id)
+    quota = crud_services.get_disk_quota_bytes(db, service)
+    if quota is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No active subscription found.")
+    replaced_bytes = disk_usage.get_path_bytes(backup.service_id, path or "/")
+    if path is None:
+        # In-progress uploads are kept across a full restore
+        replaced_bytes -= disk_usage.get_path_bytes(backup.service_id, file_manager.UPLOAD_DIR_NAME)
+    if disk_usage.get_service_bytes(backup.service_id) - replaced_bytes + restore_bytes > quota:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Restoring this backup would exceed the disk quota for your plan.")
+
+@job_queue.register("create_backup")
+def _create_backup(ctx: job_queue.JobContext) -> dict:
+    ctx.report_progress(5, "Backing up service files")
+    codec = ctx.params.get("codec", settings.BACKUP_CODEC)
+    level = compression.validate(codec, ctx.params.get("level"))
+    filename, size_bytes = backup_manager.create_backup(ctx.job.service_id, codec, level, progress=ctx.progress_reporter())
+
+    new_backup = Backup(
+        service_id=ctx.job.service_id,
+        filename=filename,
+        size_bytes=size_bytes,
+        codec=codec,
+    )
+    ctx.db.add(new_backup)
+    ctx.db.commit()
+    ctx.db.refresh(new_backup)
+    return {"backup_id": new_backup.id}
+
+@job_queue.register("restore_backup")
+def _restore_backup(ctx: job_queue.JobContext) -> dict:
+    backup = ctx.db.query(Backup).filter(Backup.id == ctx.params["backup_id"]).first()
+    if not backup:
+        raise RuntimeError("Backup no longer exists.")
+    path = ctx.params.get("path")
+    ctx.report_progress(5, f"Restoring {path}" if path else "Restoring service files")
+    backup_manager.restore_from_backup(backup.service_id, backup.filename, path=path, progress=ctx.progress_reporter())
+    return {"backup_id": backup.id, "service_id": backup.service_id, "path": path}
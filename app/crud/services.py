@@ -0,0 +1,261 @@
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+
+from app.models.user_model import User
+from app.models.service_model import Service, ServiceType
+from app.models.subscription import Subscription, SubscriptionStatus, Plan
+from app.models.job import Job, JobStatus
+from app.core import disk_usage, docker_api, docker_manager, libvirt_manager, file_manager, search_index, status_cache, job_queue
+from app.core.config import settings
+
+IMAGE_MAP = {
+    ServiceType.MINECRAFT_PAPER: "itzg/minecraft-server",
+    # We can add other images here later
+}
+
+def get_service_for_user(db: Session, service_id: int, user: User) -> Service:
+    """
+    Get a service owned by the user, or raise 404.
+    """
+    service = db.query(Service).filter(Service.id == service_id, Service.owner_id == user.id).first()
+    if not service:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
+    return service
+
+async def get_service_for_user_async(db: AsyncSession, service_id: int, user: User) -> Service:
+    result = await db.execute(select(Service).where(Service.id == service_id, Service.owner_id == user.id))
+    service = result.scalars().first()
+    if not service:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
+    return service
+
+def get_active_plan(db: Session, user_id: int) -> Optional[Plan]:
+    """
+    Returns the plan of the user's active subscription, if any.
+    """
+    return (
+        db.query(Plan)
+        .join(Subscription, Subscription.plan_id == Plan.id)
+        .filter(Subscription.user_id == user_id, Subscription.status == SubscriptionStatus.ACTIVE)
+        .first()
+    )
+
+def get_disk_quota_bytes(db: Session, service: Service) -> Optional[int]:
+    """
+    Returns the disk quota of the service owner's plan in bytes, or None when
+    the owner has no active plan.
+    """
+    plan = get_active_plan(db, service.owner_id)
+    if not plan:
+        return None
+    return plan.disk_gb * 1024 ** 3
+
+def ensure_disk_space(db: Session, service: Service, extra_bytes: int) -> int:
+    """
+    Checks that `extra_bytes` more data fits in the service's disk quota and
+    returns how many bytes may still be written. Usage comes from the disk
+    usage index, so this does not walk the service's files.
+    """
+    quota = get_disk_quota_bytes(db, service)
+    if quota is None:
+        raise HTTPException(status_code=403, detail="No active subscription found.")
+    remaining = quota - disk_usage.get_service_bytes(service.id)
+    if extra_bytes > remaining:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Disk quota exceeded for your plan.")
+    return remaining
+
+def list_services(db: Session, owner: User) -> List[Service]:
+    return db.query(Service).filter(Service.owner_id == owner.id).all()
+
+async def list_services_async(db: AsyncSession, owner: User) -> List[Service]:
+    result = await db.execute(select(Service).where(Service.owner_id == owner.id))
+    return list(result.scalars().all())
+
+def get_service_statuses(services: List[Service]) -> Dict[int, str]:
+    """
+    Returns the status of each service, batched and cached (see status_cache).
+    """
+    return status_cache.get_service_statuses(services)
+
+async def get_service_statuses_async(services: List[Service]) -> Dict[int, str]:
+    return await status_cache.get_service_statuses_async(services)
+
+def create_service(db: Session, owner: User, name: str, service_type: ServiceType, template: Optional[str] = None) -> Job:
+    """
+    Create a new service for the user, checking plan limits. The backend
+    (Docker or KVM) is provisioned by a background job, which is returned.
+    VPS disks are cloned from `template`, or the default template.
+    """
+    # 1. Check user's subscription and plan
+    plan = get_active_plan(db, owner.id)
+    if not plan:
+        raise HTTPException(status_code=403, detail="No active subscription found.")
+
+    # 2. Check service count limit
+    service_count = db.query(Service).filter(Service.owner_id == owner.id).count()
+    if service_count >= plan.max_services:
+        raise HTTPException(status_code=403, detail=f"Service limit reached for your plan ({plan.max_services} services).")
+
+    if service_type != ServiceType.VPS and service_type not in IMAGE_MAP:
+        raise HTTPException(status_code=400, detail="Unsupported service type")
+    if service_type == ServiceType.VPS:
+        template = template or libvirt_manager.DEFAULT_TEMPLATE
+        try:
+            libvirt_manager.get_template_path(template)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # 3. Create service in DB
+    new_service = Service(name=name, service_type=service_type, owner_id=owner.id)
+    db.add(new_service)
+    db.commit()
+    db.refresh(new_service)
+
+    # 4. Provision the backend in the background
+    return job_queue.enqueue(db, "provision_service", owner.id, service_id=new_service.id, params={"plan_id": plan.id, "template": template})
+
+@job_queue.register("provision_service")
+def _provision_service(ctx: job_queue.JobContext) -> dict:
+    """
+    Creates the Docker container or KVM domain of a new service with the
+    plan's resources. The service row is removed if this fails.
+    """
+    db = ctx.db
+    service = db.query(Service).filter(Service.id == ctx.job.service_id).first()
+    if not service:
+        raise RuntimeError("Service no longer exists.")
+    plan = db.query(Plan).filter(Plan.id == ctx.params["plan_id"]).first()
+
+    service_type = service.service_type
+    backend_id = None
+    try:
+        if service.service_type == ServiceType.VPS:
+            ctx.report_progress(10, "Creating virtual machine")
+            domain_name = f"cz7host-vps-{service.id}"
+            libvirt_manager.create_vm(
+                domain_name,
+                ram_mb=plan.ram_mb,
+                cpu_vcore=plan.cpu_vcore,
+                disk_gb=plan.disk_gb,
+                template=ctx.params.get("template") or libvirt_manager.DEFAULT_TEMPLATE,
+            )
+            backend_id = domain_name
+            service.libvirt_domain_name = domain_name
+        else:
+            ctx.report_progress(10, "Creating container")
+            container_name = f"cz7host-container-{service.id}"
+            environment = {}
+            if service.service_type in [ServiceType.MINECRAFT_PAPER, ServiceType.MINECRAFT_FORGE, ServiceType.MINECRAFT_VANILLA]:
+                environment["EULA"] = "TRUE"
+
+            container = docker_manager.create_container(
+                service_id=service.id,
+                image=IMAGE_MAP[service.service_type],
+                name=container_name,
+                environment=environment,
+                mem_limit=f"{plan.ram_mb}m",
+                cpu_shares=int(plan.cpu_vcore * 1024) # Convert vCore share to Docker's relative value
+            )
+            backend_id = container.id
+            service.docker_container_id = container.id
+
+        db.commit()
+    except Exception as e:
+        # Anything from docker, qemu-img or the database: don't leave the
+        # row stuck without a backend, or a backend without its row
+        db.rollback()
+        if backend_id is not None:
+            try:
+                _remove_backend(service_type, backend_id)
+            except RuntimeError:
+                pass
+        service = db.query(Service).filter(Service.id == ctx.job.service_id).first()
+        if service:
+            db.delete(service)
+            db.commit()
+        raise RuntimeError(f"Failed to create service backend: {e}")
+
+    if service.service_type == ServiceType.VPS and settings.VM_FLATTEN_AFTER_PROVISION:
+        job_queue.enqueue(db, "flatten_vm_disk", service.owner_id, service_id=service.id)
+    return {"service_id": service.id}
+
+def flatten_service_disk(db: Session, service: Service, user: User) -> Job:
+    """
+    Schedule copying a VPS's template data into its own disk, so it no
+    longer depends on the template image.
+    """
+    if service.service_type != ServiceType.VPS:
+        raise HTTPException(status_code=400, detail="Only VPS disks can be flattened.")
+    return job_queue.enqueue(db, "flatten_vm_disk", user.id, service_id=service.id)
+
+@job_queue.register("flatten_vm_disk")
+def _flatten_vm_disk(ctx: job_queue.JobContext) -> dict:
+    service = ctx.db.query(Service).filter(Service.id == ctx.job.service_id).first()
+    if not service or not service.libvirt_domain_name:
+        raise RuntimeError("Service no longer exists.")
+    ctx.report_progress(5, "Flattening disk")
+    flattened = libvirt_manager.flatten_vm_disk(service.libvirt_domain_name, progress=ctx.progress_reporter())
+    return {"service_id": service.id, "flattened": flattened}
+
+def start_service(service: Service):
+    if service.service_type == ServiceType.VPS:
+        try:
+            libvirt_manager.start_vm(service.libvirt_domain_name)
+        except libvirt_manager.VMBusyError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    else:
+        docker_manager.start_container(service.docker_container_id)
+    status_cache.invalidate(service)
+
+def stop_service(service: Service):
+    if service.service_type == ServiceType.VPS:
+        libvirt_manager.stop_vm(service.libvirt_domain_name)
+    else:
+        docker_manager.stop_container(service.docker_container_id)
+    status_cache.invalidate(service)
+
+async def start_service_async(service: Service):
+    if service.service_type == ServiceType.VPS:
+        try:
+            await libvirt_manager.run_async(libvirt_manager.start_vm, service.libvirt_domain_name)
+        except libvirt_manager.VMBusyError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    else:
+        await docker_api.run_async(docker_api.start_container(service.docker_container_id))
+    status_cache.invalidate(service)
+
+async def stop_service_async(service: Service):
+    if service.service_type == ServiceType.VPS:
+        await libvirt_manager.run_async(libvirt_manager.stop_vm, service.libvirt_domain_name)
+    else:
+        await docker_api.run_async(docker_api.stop_container(service.docker_container_id))
+    status_cache.invalidate(service)
+
+def _remove_backend(service_type: ServiceType, backend_id: str):
+    if service_type == ServiceType.VPS:
+        libvirt_manager.remove_vm(backend_id)
+    else:
+        docker_manager.remove_container(backend_id)
+
+def delete_service(db: Session, service: Service):
+    backend_id = service.libvirt_domain_name if service.service_type == ServiceType.VPS else service.docker_container_id
+    if backend_id is None:
+        # The provisioning job cannot be interrupted while it creates the backend
+        provisioning = db.query(Job.id).filter(
+            Job.kind == "provision_service",
+            Job.service_id == service.id,
+            Job.status.in_((JobStatus.PENDING, JobStatus.RUNNING)),
+        ).first()
+        if provisioning:
+            raise HTTPException(status_code=409, detail="The service is still being provisioned. Try again once it has finished.")
+    else:
+        _remove_backend(service.service_type, backend_id)
+    status_cache.invalidate(service)
+    disk_usage.forget(service.id)
+    search_index.forget(service.id)
+
+    db.delete(service)
+    db.commit()
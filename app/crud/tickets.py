@@ -0,0 +1,137 @@
+from fastapi import HTTPException, status
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session, aliased, selectinload
+from typing import List, Optional, Tuple
+
+from app.models.user_model import User
+from app.models.ticket import Ticket, TicketMessage
+
+# Shared by the JSON API (app/api/tickets.py) and the HTML frontend, so page
+# views run in-process on the request's session instead of calling the API.
+
+# Characters of the last message shown in ticket lists
+PREVIEW_LENGTH = 140
+
+def create_ticket(db: Session, owner: User, title: str, initial_message: str) -> Ticket:
+    """
+    Create a new ticket with an initial message.
+    """
+    new_ticket = Ticket(title=title, owner_id=owner.id)
+    db.add(new_ticket)
+    db.flush()
+
+    first_message = TicketMessage(
+        content=initial_message,
+        ticket_id=new_ticket.id,
+        author_id=owner.id
+    )
+    db.add(first_message)
+    db.commit()
+    return _load_ticket_with_messages(db, new_ticket.id)
+
+def list_tickets(db: Session, owner: User, skip: int = 0, limit: int = 100) -> List[Ticket]:
+    """
+    Retrieve tickets owned by a user, with their messages and authors
+    loaded in two extra queries instead of one per ticket and message.
+    """
+    return (
+        db.query(Ticket)
+        .options(selectinload(Ticket.messages).selectinload(TicketMessage.author))
+        .filter(Ticket.owner_id == owner.id)
+        .order_by(Ticket.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+def list_ticket_summaries(db: Session, owner: User, skip: int = 0, limit: int = 100) -> list:
+    """
+    Retrieve lightweight ticket rows (message count, last activity and a
+    preview of the last message) for a user in a single query.
+    """
+    owned_ticket_ids = select(Ticket.id).where(Ticket.owner_id == owner.id)
+    stats = (
+        select(
+            TicketMessage.ticket_id,
+            func.count(TicketMessage.id).label("message_count"),
+            func.max(TicketMessage.id).label("last_message_id"),
+            func.max(TicketMessage.created_at).label("last_activity"),
+        )
+        .where(TicketMessage.ticket_id.in_(owned_ticket_ids))
+        .group_by(TicketMessage.ticket_id)
+        .subquery()
+    )
+    last_message = aliased(TicketMessage)
+    last_activity = func.coalesce(stats.c.last_activity, Ticket.created_at)
+    statement = (
+        select(
+            Ticket.id,
+            Ticket.title,
+            Ticket.status,
+            Ticket.created_at,
+            Ticket.updated_at,
+            func.coalesce(stats.c.message_count, 0).label("message_count"),
+            last_activity.label("last_activity"),
+            func.substr(last_message.content, 1, PREVIEW_LENGTH).label("last_message_preview"),
+        )
+        .outerjoin(stats, stats.c.ticket_id == Ticket.id)
+        .outerjoin(last_message, last_message.id == stats.c.last_message_id)
+        .where(Ticket.owner_id == owner.id)
+        .order_by(last_activity.desc(), Ticket.id.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return db.execute(statement).all()
+
+def get_ticket_for_user(db: Session, ticket_id: int, user: User) -> Ticket:
+    """
+    Get a ticket the user owns (or any ticket for superusers).
+    """
+    ticket = db.query(Ticket).filter(Ticket.id == ticket_id).first()
+    if not ticket:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
+    if ticket.owner_id != user.id and not user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    return ticket
+
+def get_ticket_messages(db: Session, ticket: Ticket, after_id: Optional[int] = None, limit: int = 50) -> Tuple[List[TicketMessage], Optional[int]]:
+    """
+    Get a page of a ticket's messages in order, with authors eager-loaded.
+    Pages are keyed on the message id: pass the returned cursor as
+    `after_id` to get the next page. The cursor is None on the last page.
+    """
+    query = (
+        db.query(TicketMessage)
+        .options(selectinload(TicketMessage.author))
+        .filter(TicketMessage.ticket_id == ticket.id)
+    )
+    if after_id is not None:
+        query = query.filter(TicketMessage.id > after_id)
+    messages = query.order_by(TicketMessage.id).limit(limit + 1).all()
+    if len(messages) > limit:
+        return messages[:limit], messages[limit - 1].id
+    return messages, None
+
+def _load_ticket_with_messages(db: Session, ticket_id: int) -> Ticket:
+    return (
+        db.query(Ticket)
+        .options(selectinload(Ticket.messages).selectinload(TicketMessage.author))
+        .filter(Ticket.id == ticket_id)
+        .populate_existing()
+        .one()
+    )
+
+def add_message(db: Session, ticket_id: int, author: User, content: str) -> Ticket:
+    """
+    Add a new message to an existing ticket.
+    """
+    ticket = get_ticket_for_user(db, ticket_id, author)
+
+    new_message = TicketMessage(
+        content=content,
+        ticket_id=ticket.id,
+        author_id=author.id
+    )
+    db.add(new_message)
+    db.commit()
+    return _load_ticket_with_messages(db, ticket.id)
\ No newline at end of file
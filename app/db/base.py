@@ -6,4 +6,5 @@ from app.models.service_model import Service
 from app.models.ticket import Ticket, TicketMessage
 from app.models.announcement import Announcement
 from app.models.backup import Backup
-from app.models.subscription import Plan, Subscription
\ No newline at end of file
+from app.models.subscription import Plan, Subscription
+from app.models.job import Job
\ No newline at end of file
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Type
+
+from sqlalchemy.pool import Pool
+
+# Connection pool gauges for the sync and async engines. Checkout wait time is
+# measured around the pool's own _do_get, i.e. only the time spent waiting for
+# (or opening) a connection, not the pre-ping. No pool event fires before a
+# checkout starts waiting, so this relies on that private method:
+# requirements.txt pins SQLAlchemy to the versions known to have it, and
+# tests/test_pool_metrics.py fails if it goes away.
+RECENT_CHECKOUTS = 1000
+
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.recent = deque(maxlen=RECENT_CHECKOUTS)
+
+    def record(self, wait: float):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+            self.recent.append(wait)
+
+_stats: Dict[str, PoolStats] = {}
+_engines = {}
+
+def timed_pool_class(base: Type[Pool], name: str) -> Type[Pool]:
+    """
+    Returns a subclass of `base` that records checkout wait times under `name`.
+    Pass it as `poolclass`; it survives engine.dispose(), which recreates the pool.
+    """
+    stats = _stats.setdefault(name, PoolStats())
+
+    def _do_get(self):
+        started = time.perf_counter()
+        connection = base._do_get(self)
+        stats.record(time.perf_counter() - started)
+        return connection
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get})
+
+def register(name: str, engine):
+    _engines[name] = engine
+    _stats.setdefault(name, PoolStats())
+
+def snapshot() -> List[dict]:
+    """
+    Returns the current gauges of every registered engine's pool.
+    """
+    result = []
+    for name, engine in _engines.items():
+        pool = engine.pool
+        stats = _stats[name]
+        with stats.lock:
+            recent = sorted(stats.recent)
+            checkouts = stats.checkouts
+            wait_total = stats.wait_seconds_total
+            wait_max = stats.wait_seconds_max
+        # Only queue pools have these gauges (SQLite's pools lack them, or
+        # have a plain `size` attribute)
+        size = getattr(pool, "size", None)
+        checked_out = getattr(pool, "checkedout", None)
+        overflow = getattr(pool, "overflow", None)
+        idle = getattr(pool, "checkedin", None)
+        result.append({
+            "name": name,
+            "size": size() if callable(size) else None,
+            "checked_out": checked_out() if callable(checked_out) else None,
+            "overflow": max(0, overflow()) if callable(overflow) else None,
+            "idle": idle() if callable(idle) else None,
+            "checkouts": checkouts,
+            "wait_seconds_total": wait_total,
+            "wait_seconds_max": wait_max,
+            "wait_seconds_p50": recent[len(recent) // 2] if recent else 0.0,
+            "wait_seconds_p99": recent[min(len(recent) - 1, len(recent) * 99 // 100)] if recent else 0.0,
+        })
+    return result
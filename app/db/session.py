@@ -1,9 +1,45 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from app.core.config import settings
+from app.db import pool_metrics
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+# Sync sessions serve def routes, jobs and background threads; async routes use
+# AsyncSessionLocal so their queries never block the event loop. Each engine
+# has its own pool sized by the DB_POOL_* settings.
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def _async_url(url: str):
+    parsed = make_url(url)
+    return parsed.set(drivername=_ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername))
+
+def _pool_options(name: str, poolclass) -> dict:
+    if make_url(settings.DATABASE_URL).get_backend_name() == "sqlite":
+        return {} # SQLite picks a pool suited to file or memory databases
+    return {
+        "poolclass": pool_metrics.timed_pool_class(poolclass, name),
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    }
+
+engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True, **_pool_options("sync", QueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+async_engine = create_async_engine(_async_url(settings.DATABASE_URL), pool_pre_ping=True, **_pool_options("async", AsyncAdaptedQueuePool))
+# Objects stay usable after commit: attribute refreshes would need an await
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+pool_metrics.register("sync", engine)
+pool_metrics.register("async", async_engine.sync_engine)
+
+Base = declarative_base()
@@ -1,17 +1,20 @@
+import asyncio
+
 from fastapi import FastAPI, Depends, Request
 from fastapi.responses import HTMLResponse
 from starlette.middleware.sessions import SessionMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 
-from app.api import auth, tickets, announcements, status, services, files, console, backups, frontend, admin_frontend
+from app.api import auth, tickets, announcements, status, services, files, console, backups, jobs, frontend, admin_frontend
 from app.core.config import settings
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_async_db, get_current_user, get_announcements
 from app.models.user_model import User
 from app.schemas.user import User as UserSchema
 from app.core.libvirt_manager import close_connection as close_libvirt_connection
-from app.models.announcement import Announcement
+from app.core import status_monitor, host_metrics, service_metrics, job_queue, docker_api, user_cache, disk_usage
 from app.db.session import SessionLocal
 
 app = FastAPI(
@@ -21,20 +24,41 @@ app = FastAPI(
 
 @app.middleware("http")
 async def db_session_middleware(request: Request, call_next):
-    db = SessionLocal()
-    request.state.db = db
-    announcements = db.query(Announcement).filter(Announcement.is_active == True).all()
-    request.state.announcements = announcements
-    response = await call_next(request)
-    db.close()
-    return response
+    # The request's unit of work, handed out by get_db/get_async_db. Creating
+    # a session is cheap; it only checks out a connection on first query.
+    request.state.db = SessionLocal()
+    try:
+        return await call_next(request)
+    finally:
+        db = request.state.db
+        if db.in_transaction():
+            await run_in_threadpool(db.close) # Rolls back over the network
+        else:
+            db.close()
+        async_db = getattr(request.state, "async_db", None)
+        if async_db is not None:
+            await async_db.close()
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
+@app.on_event("startup")
+async def startup_event():
+    status_monitor.start(asyncio.get_running_loop())
+    host_metrics.start()
+    service_metrics.start()
+    job_queue.start()
+    disk_usage.start()
+
 @app.on_event("shutdown")
 def shutdown_event():
+    status_monitor.stop()
+    host_metrics.stop()
+    service_metrics.stop()
+    job_queue.stop()
+    disk_usage.stop()
     close_libvirt_connection()
+    docker_api.close()
 
 # Add session middleware
 app.add_middleware(
@@ -52,17 +76,18 @@ app.include_router(services.router, prefix="/api/v1/services", tags=["services"]
 app.include_router(files.router, prefix="/api/v1", tags=["files"])
 app.include_router(console.router, prefix="/api/v1", tags=["console"])
 app.include_router(backups.router, prefix="/api/v1", tags=["backups"])
+app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["jobs"])
 app.include_router(frontend.router, tags=["frontend"])
 app.include_router(admin_frontend.router, tags=["admin_frontend"])
 
 @app.get("/", response_class=HTMLResponse)
-async def read_root(request: Request, db: Session = Depends(get_db)):
+async def read_root(request: Request, db: AsyncSession = Depends(get_async_db), announcements: list = Depends(get_announcements)):
     user_id = request.session.get("user_id")
     current_user = None
     if user_id:
-        current_user = db.query(User).filter(User.id == user_id).first()
+        current_user = await user_cache.get_user_async(db, user_id)
 
-    return templates.TemplateResponse("index.html", {"request": request, "user": current_user})
+    return templates.TemplateResponse("index.html", {"request": request, "user": current_user, "announcements": announcements})
 
 @app.get("/api/v1/users/me", response_model=UserSchema)
 def read_user_me(current_user: User = Depends(get_current_user)):
@@ -11,6 +11,7 @@ class Backup(Base):
     service_id = Column(BigInteger, ForeignKey("services.id"), nullable=False)
     filename = Column(String, nullable=False)
     size_bytes = Column(BigInteger, nullable=False)
+    codec = Column(String, nullable=False, server_default="gzip")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     service = relationship("Service")
\ No newline at end of file
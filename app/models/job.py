@@ -0,0 +1,35 @@
+import enum
+from sqlalchemy import Column, String, BigInteger, ForeignKey, DateTime, Enum, Integer, Text, JSON
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+
+from app.db.session import Base
+
+class JobStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(BigInteger, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    status = Column(Enum(JobStatus), default=JobStatus.PENDING, nullable=False, index=True)
+    node = Column(String, nullable=False)
+    owner_id = Column(BigInteger, ForeignKey("users.id"), nullable=False)
+    service_id = Column(BigInteger, ForeignKey("services.id", ondelete="SET NULL"), nullable=True)
+    params = Column(JSON, nullable=False, default=dict)
+    result = Column(JSON, nullable=True)
+    progress = Column(Integer, nullable=False, default=0)
+    message = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # The worker process running the job, and when it last confirmed so
+    worker_id = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+
+    owner = relationship("User")
+    service = relationship("Service")
\ No newline at end of file
@@ -1,12 +1,21 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 class Backup(BaseModel):
     id: int
     service_id: int
     filename: str
     size_bytes: int
+    codec: str
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class BackupCreate(BaseModel):
+    codec: Optional[str] = None
+    level: Optional[int] = None
+
+class BackupRestore(BaseModel):
+    path: Optional[str] = None
@@ -1,9 +1,35 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import List
 
 class FileItem(BaseModel):
     name: str
     path: str
     is_dir: bool
     size_bytes: int
-    modified_at: datetime
\ No newline at end of file
+    modified_at: datetime
+
+class FileListing(BaseModel):
+    items: List[FileItem]
+    # Pass as `cursor` to fetch the next page; None on the last page
+    next_cursor: str | None = None
+
+class SearchMatch(BaseModel):
+    path: str
+    line: int
+    text: str
+
+class SearchResults(BaseModel):
+    matches: List[SearchMatch]
+    # True when more lines matched than `limit`
+    truncated: bool
+
+class UploadCreate(BaseModel):
+    path: str
+    size: int = Field(..., ge=0)
+
+class UploadStatus(BaseModel):
+    upload_id: str
+    path: str
+    size: int
+    offset: int
@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Any
+
+from app.models.job import JobStatus
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    status: JobStatus
+    node: str
+    service_id: int | None = None
+    progress: int
+    message: str | None = None
+    result: dict[str, Any] | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
\ No newline at end of file
@@ -6,7 +6,7 @@ class ServiceBase(BaseModel):
     service_type: ServiceType
 
 class ServiceCreate(ServiceBase):
-    pass
+    template: str | None = None # VM template for VPS services
 
 class Service(ServiceBase):
     id: int
@@ -15,4 +15,37 @@ class Service(ServiceBase):
     libvirt_domain_name: str | None = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ServiceStatus(BaseModel):
+    service_id: int
+    status: str
+
+class DirectoryUsage(BaseModel):
+    name: str
+    path: str
+    size_bytes: int
+    inodes: int
+
+class DiskUsage(BaseModel):
+    service_id: int
+    path: str
+    size_bytes: int
+    inodes: int
+    quota_bytes: int | None = None
+    # Largest subdirectories first
+    directories: list[DirectoryUsage]
+
+class ServiceMetrics(BaseModel):
+    service_id: int
+    window: int
+    plan_ram_mb: int | None = None
+    plan_cpu_vcore: float | None = None
+    timestamps: list[float]
+    cpu_percent: list[float]
+    mem_used_bytes: list[float]
+    mem_limit_bytes: list[float]
+    disk_read_bytes_per_s: list[float]
+    disk_write_bytes_per_s: list[float]
+    net_rx_bytes_per_s: list[float]
+    net_tx_bytes_per_s: list[float]
@@ -4,4 +4,31 @@ class SystemStatus(BaseModel):
     cpu_percent: float
     mem_total_gb: float
     mem_used_gb: float
-    mem_percent: float
\ No newline at end of file
+    mem_percent: float
+    disk_total_gb: float
+    disk_used_gb: float
+    disk_percent: float
+    net_sent_bytes_per_s: float
+    net_recv_bytes_per_s: float
+    sampled_at: float
+
+class SystemStatusHistory(BaseModel):
+    window: int
+    timestamps: list[float]
+    cpu_percent: list[float]
+    mem_percent: list[float]
+    disk_percent: list[float]
+    net_sent_bytes_per_s: list[float]
+    net_recv_bytes_per_s: list[float]
+
+class DatabasePoolStatus(BaseModel):
+    name: str
+    size: int | None
+    checked_out: int | None
+    overflow: int | None
+    idle: int | None
+    checkouts: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+    wait_seconds_p50: float
+    wait_seconds_p99: float
@@ -34,4 +34,20 @@ class Ticket(TicketBase):
     messages: list[TicketMessage] = []
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class TicketSummary(TicketBase):
+    id: int
+    status: TicketStatus
+    created_at: datetime
+    updated_at: datetime | None = None
+    message_count: int
+    last_activity: datetime | None = None
+    last_message_preview: str | None = None
+
+    class Config:
+        from_attributes = True
+
+class TicketDetail(Ticket):
+    # Pass as `after_id` to fetch the next page of messages; None on the last page
+    next_after_id: int | None = None
\ No newline at end of file
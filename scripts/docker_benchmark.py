@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import docker
+from aiohttp import web
+
+# Add the project root to the python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.core import docker_api, docker_manager
+
+# Measures container start/stop/status throughput of docker-py (get() then the
+# action, as docker_manager used to do) against docker_api's pooled asyncio
+# client and its sync wrappers. Runs against a fake Docker API server on a
+# unix socket, so no containers are touched:
+#
+#   python scripts/docker_benchmark.py --ops 2000 --concurrency 32 --latency-ms 2
+
+def make_app(latency: float, containers: int) -> web.Application:
+    states = {f"{n:064x}": "exited" for n in range(containers)}
+
+    async def delay():
+        if latency:
+            await asyncio.sleep(latency)
+
+    def lookup(request):
+        container_id = request.match_info["id"]
+        if container_id not in states:
+            raise web.HTTPNotFound(text='{"message": "No such container"}', content_type="application/json")
+        return container_id
+
+    async def inspect(request):
+        container_id = lookup(request)
+        await delay()
+        return web.json_response({"Id": container_id, "State": {"Status": states[container_id]}, "Config": {}})
+
+    async def start(request):
+        container_id = lookup(request)
+        await delay()
+        states[container_id] = "running"
+        return web.Response(status=204)
+
+    async def stop(request):
+        container_id = lookup(request)
+        await delay()
+        states[container_id] = "exited"
+        return web.Response(status=204)
+
+    async def list_containers(request):
+        await delay()
+        return web.json_response([{"Id": container_id, "State": state} for container_id, state in states.items()])
+
+    app = web.Application()
+    app.router.add_get("/v{version}/containers/json", list_containers)
+    app.router.add_get("/v{version}/containers/{id}/json", inspect)
+    app.router.add_post("/v{version}/containers/{id}/start", start)
+    app.router.add_post("/v{version}/containers/{id}/stop", stop)
+    return app
+
+def serve(socket_path: str, latency: float, containers: int):
+    web.run_app(make_app(latency, containers), path=socket_path, print=None, handle_signals=True)
+
+def legacy_op(client: docker.DockerClient, op: str, container_id: str):
+    container = client.containers.get(container_id)
+    if op == "start":
+        container.start()
+    elif op == "stop":
+        container.stop()
+    else:
+        return container.status
+
+def run_threads(func, ops, concurrency: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda op: func(*op), ops))
+    return time.perf_counter() - started
+
+async def run_async(ops, concurrency: int) -> float:
+    coroutines = {
+        "start": docker_api.start_container,
+        "stop": docker_api.stop_container,
+        "status": docker_api.get_container_status,
+    }
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(op, container_id):
+        async with semaphore:
+            await docker_api.run_async(coroutines[op](container_id))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(*op) for op in ops))
+    return time.perf_counter() - started
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="cz7-docker-bench-")
+    socket_path = os.path.join(workdir, "docker.sock")
+    server = multiprocessing.Process(target=serve, args=(socket_path, args.latency_ms / 1000, args.containers), daemon=True)
+    server.start()
+    try:
+        while not os.path.exists(socket_path):
+            time.sleep(0.05)
+        settings.DOCKER_SOCKET = socket_path
+        settings.DOCKER_POOL_SIZE = args.concurrency
+        container_ids = [f"{n:064x}" for n in range(args.containers)]
+
+        print(f"{'op':<8} {'client':<18} {'seconds':>8} {'ops/s':>9}")
+        for op in ("start", "status", "stop"):
+            ops = [(op, container_ids[n % len(container_ids)]) for n in range(args.ops)]
+
+            legacy = docker.DockerClient(base_url=f"unix://{socket_path}", version=settings.DOCKER_API_VERSION, max_pool_size=args.concurrency)
+            results = {
+                "docker-py get+op": run_threads(lambda o, c: legacy_op(legacy, o, c), ops, args.concurrency),
+                "sync wrappers": run_threads(
+                    lambda o, c: {"start": docker_manager.start_container, "stop": docker_manager.stop_container, "status": docker_manager.get_container_status}[o](c),
+                    ops, args.concurrency,
+                ),
+                "asyncio": asyncio.run(run_async(ops, args.concurrency)),
+            }
+            legacy.close()
+            for client, seconds in results.items():
+                print(f"{op:<8} {client:<18} {seconds:>8.2f} {args.ops / seconds:>9.0f}")
+    finally:
+        docker_api.close()
+        server.terminate()
+        server.join()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        os.rmdir(workdir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Docker API clients against a fake daemon.")
+    parser.add_argument("--ops", type=int, default=1000, help="Operations per kind")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--containers", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="Simulated daemon time per request")
+    run(parser.parse_args())
@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+
+# Small HTTP load generator used to compare the panel before and after
+# performance changes. Start a server from each revision on its own port and
+# pass every URL; they are measured one after the other with the same load:
+#
+#   python scripts/loadtest.py --cookie session=... \
+#       --url http://127.0.0.1:8000/tickets --url http://127.0.0.1:8001/tickets
+
+async def worker(client: httpx.AsyncClient, url: str, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get(url)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - started)
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+async def measure(url: str, args) -> dict:
+    cookies = dict(c.split("=", 1) for c in args.cookie)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(cookies=cookies, limits=limits, timeout=30) as client:
+        # Warm up connections and any in-process caches before measuring
+        await asyncio.gather(*(client.get(url) for _ in range(args.concurrency)))
+
+        latencies, errors = [], []
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(worker(client, url, deadline, latencies, errors) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "url": url,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+async def run(args):
+    urls = args.url or ["http://127.0.0.1:8000/api/v1/services/"]
+    results = [await measure(url, args) for url in urls]
+
+    print(f"Concurrency: {args.concurrency}, duration: {args.duration:.0f}s per URL")
+    print(f"{'URL':<50} {'req':>8} {'err':>6} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for r in results:
+        print(f"{r['url']:<50} {r['requests']:>8} {r['errors']:>6} {r['rps']:>10.1f} {r['p50_ms']:>10.2f} {r['p99_ms']:>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure throughput and latency of a panel endpoint.")
+    parser.add_argument("--url", action="append", default=[], help="Endpoint to hit (repeatable, measured in order).")
+    parser.add_argument("--cookie", action="append", default=[], help="Cookie as name=value (repeatable).")
+    parser.add_argument("--concurrency", type=int, default=32, help="Number of concurrent clients.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measurement duration in seconds.")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the project root to the python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core import file_manager, sandbox
+
+# Compares path resolution in the file manager before and after the move to
+# cached root descriptors: the old mkdir + resolve() + prefix check against
+# sandbox.resolve(), each followed by the stat a download does. Runs on a
+# throwaway tree with paths of increasing depth:
+#
+#   python scripts/sandbox_benchmark.py --ops 50000 --depth 1 --depth 4 --depth 8
+
+SERVICE_ID = 1
+
+def legacy_safe_path(service_id: int, relative_path: str) -> Path:
+    # The resolver file_manager used before app.core.sandbox
+    service_base_path = file_manager.BASE_SERVICE_PATH / str(service_id)
+    service_base_path.mkdir(parents=True, exist_ok=True)
+    safe_relative_path = os.path.normpath(relative_path.lstrip('/'))
+    absolute_path = (service_base_path / safe_relative_path).resolve()
+    if not str(absolute_path).startswith(str(service_base_path.resolve())):
+        raise PermissionError("Access denied: Path is outside the service directory.")
+    return absolute_path
+
+def legacy_stat(relative_path: str):
+    file_path = legacy_safe_path(SERVICE_ID, relative_path)
+    if not stat.S_ISREG(file_path.stat().st_mode):
+        raise ValueError("Path is not a file.")
+
+def sandbox_stat(relative_path: str):
+    with sandbox.resolve(file_manager.get_service_path(SERVICE_ID), relative_path) as target:
+        if not stat.S_ISREG(target.lstat().st_mode):
+            raise ValueError("Path is not a file.")
+
+def make_tree(depth: int) -> str:
+    parts = [f"dir{level}" for level in range(depth - 1)] + ["file.txt"]
+    relative = "/".join(parts)
+    file_path = file_manager.get_service_path(SERVICE_ID) / relative
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_bytes(b"x")
+    return relative
+
+def measure(func, relative: str, ops: int) -> float:
+    started = time.perf_counter()
+    for _ in range(ops):
+        func(relative)
+    return time.perf_counter() - started
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="cz7-sandbox-bench-")
+    file_manager.BASE_SERVICE_PATH = Path(workdir)
+    try:
+        print(f"{'depth':>5} {'resolver':<14} {'seconds':>8} {'ops/s':>10}")
+        for depth in args.depth or [1, 4, 8]:
+            relative = make_tree(depth)
+            for name, func in (("legacy", legacy_stat), ("sandbox", sandbox_stat)):
+                seconds = measure(func, relative, args.ops)
+                print(f"{depth:>5} {name:<14} {seconds:>8.2f} {args.ops / seconds:>10.0f}")
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark file manager path resolution.")
+    parser.add_argument("--ops", type=int, default=20000, help="Resolutions per depth and resolver")
+    parser.add_argument("--depth", type=int, action="append", help="Path depth in components (repeatable)")
+    run(parser.parse_args())
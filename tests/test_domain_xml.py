@@ -0,0 +1,55 @@
+import os
+
+for name in ("DISCORD_CLIENT_ID", "DISCORD_CLIENT_SECRET", "SESSION_SECRET", "STRIPE_PUBLIC_KEY", "STRIPE_SECRET_KEY", "STRIPE_WEBHOOK_SECRET"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from app.core.libvirt_manager import CPU_PERIOD_US, build_domain_xml
+
+def build(**kwargs) -> ET.Element:
+    params = dict(name="vm-1", vm_uuid="00000000-0000-0000-0000-000000000001", disk_path="/images/vm-1.qcow2", ram_mb=2048, cpu_vcore=2)
+    params.update(kwargs)
+    return ET.fromstring(build_domain_xml(**params))
+
+def test_memory_and_hugepages():
+    domain = build(ram_mb=2048)
+    assert domain.find("memory").text == str(2048 * 1024)
+    assert domain.find("memory").get("unit") == "KiB"
+    assert domain.find("currentMemory").text == str(2048 * 1024)
+    assert domain.find("memoryBacking") is None
+
+    assert build(hugepages=True).find("memoryBacking/hugepages") is not None
+
+@pytest.mark.parametrize("cpu_vcore, vcpus, quota", [(1, 1, None), (2, 2, None), (1.5, 2, int(1.5 * CPU_PERIOD_US)), (0.5, 1, int(0.5 * CPU_PERIOD_US))])
+def test_vcpus_and_cpu_cap(cpu_vcore, vcpus, quota):
+    domain = build(cpu_vcore=cpu_vcore)
+    assert domain.find("vcpu").text == str(vcpus)
+    assert domain.find("cpu/topology").get("cores") == str(vcpus)
+    if quota is None:
+        assert domain.find("cputune") is None
+    else:
+        assert domain.find("cputune/global_period").text == str(CPU_PERIOD_US)
+        assert domain.find("cputune/global_quota").text == str(quota)
+
+@pytest.mark.parametrize("cpu_vcore, queues", [(1, None), (1.5, "2"), (4, "4")])
+def test_virtio_net_queues(cpu_vcore, queues):
+    interface = build(cpu_vcore=cpu_vcore).find("devices/interface")
+    assert interface.find("model").get("type") == "virtio"
+    driver = interface.find("driver")
+    assert (driver.get("queues") if driver is not None else None) == queues
+
+def test_disk_on_iothread():
+    domain = build(iothreads=2)
+    assert domain.find("iothreads").text == "2"
+    driver = domain.find("devices/disk/driver")
+    assert driver.get("iothread") == "1"
+    assert (driver.get("cache"), driver.get("io")) == ("none", "native")
+
+def test_no_iothreads():
+    domain = build(iothreads=0)
+    assert domain.find("iothreads") is None
+    assert domain.find("devices/disk/driver").get("iothread") is None
@@ -0,0 +1,41 @@
+import os
+
+for name in ("DISCORD_CLIENT_ID", "DISCORD_CLIENT_SECRET", "SESSION_SECRET", "STRIPE_PUBLIC_KEY", "STRIPE_SECRET_KEY", "STRIPE_WEBHOOK_SECRET"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.db import pool_metrics
+
+# Checkout waits are timed around the pools' private _do_get; these fail if
+# a SQLAlchemy upgrade removes or bypasses it.
+
+@pytest.mark.parametrize("poolclass", [QueuePool, AsyncAdaptedQueuePool])
+def test_pools_still_check_out_through_do_get(poolclass):
+    assert callable(getattr(poolclass, "_do_get", None))
+
+def test_checkout_wait_is_recorded(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        poolclass=pool_metrics.timed_pool_class(QueuePool, "test"),
+        pool_size=1,
+        max_overflow=0,
+    )
+    pool_metrics.register("test", engine)
+    try:
+        held = engine.connect()
+        threading.Timer(0.2, held.close).start()
+        with engine.connect():
+            pass
+        stats = next(stats for stats in pool_metrics.snapshot() if stats["name"] == "test")
+        assert stats["checkouts"] == 2
+        assert stats["wait_seconds_max"] >= 0.15
+        assert stats["size"] == 1
+    finally:
+        engine.dispose()
@@ -0,0 +1,94 @@
+import os
+
+for name in ("DISCORD_CLIENT_ID", "DISCORD_CLIENT_SECRET", "SESSION_SECRET", "STRIPE_PUBLIC_KEY", "STRIPE_SECRET_KEY", "STRIPE_WEBHOOK_SECRET"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import BigInteger, create_engine, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import tickets
+from app.api.deps import get_current_user, get_db
+from app.db.session import Base
+from app.models.ticket import Ticket, TicketMessage
+from app.models.user_model import User
+
+# The ticket endpoints must not lazy-load per ticket or per message: the
+# number of queries a request runs stays the same as tickets and messages
+# are added.
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_big_integer(type_, compiler, **kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY columns
+    return "INTEGER"
+
+@pytest.fixture
+def env():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[User.__table__, Ticket.__table__, TicketMessage.__table__])
+    db = sessionmaker(bind=engine)()
+    owner = User(discord_id="1", username="owner", email="owner@example.com")
+    staff = User(discord_id="2", username="staff", email="staff@example.com")
+    db.add_all([owner, staff])
+    db.commit()
+
+    app = FastAPI()
+    app.include_router(tickets.router, prefix="/api/v1/tickets")
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: owner
+
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    yield TestClient(app), db, owner, staff, queries
+    db.close()
+    engine.dispose()
+
+def add_ticket(db, owner, staff, messages: int) -> Ticket:
+    ticket = Ticket(title="Help", owner_id=owner.id)
+    db.add(ticket)
+    db.flush()
+    for index in range(messages):
+        author = owner if index % 2 == 0 else staff
+        db.add(TicketMessage(ticket_id=ticket.id, author_id=author.id, content=f"message {index}"))
+    db.commit()
+    return ticket
+
+def count_queries(client, db, queries, url: str) -> int:
+    db.expire_all()
+    queries.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    return len(queries)
+
+@pytest.mark.parametrize("url", ["/api/v1/tickets/", "/api/v1/tickets/summary"])
+def test_ticket_lists_run_constant_queries(env, url):
+    client, db, owner, staff, queries = env
+    add_ticket(db, owner, staff, messages=1)
+    baseline = count_queries(client, db, queries, url)
+
+    for _ in range(20):
+        add_ticket(db, owner, staff, messages=5)
+    assert count_queries(client, db, queries, url) == baseline
+
+def test_ticket_detail_runs_constant_queries(env):
+    client, db, owner, staff, queries = env
+    small = add_ticket(db, owner, staff, messages=1)
+    large = add_ticket(db, owner, staff, messages=40)
+
+    baseline = count_queries(client, db, queries, f"/api/v1/tickets/{small.id}")
+    assert count_queries(client, db, queries, f"/api/v1/tickets/{large.id}?limit=40") == baseline
+
+def test_ticket_detail_pages_messages(env):
+    client, db, owner, staff, queries = env
+    ticket = add_ticket(db, owner, staff, messages=5)
+
+    first = client.get(f"/api/v1/tickets/{ticket.id}?limit=3").json()
+    assert [message["content"] for message in first["messages"]] == ["message 0", "message 1", "message 2"]
+    second = client.get(f"/api/v1/tickets/{ticket.id}?limit=3&after_id={first['next_after_id']}").json()
+    assert [message["content"] for message in second["messages"]] == ["message 3", "message 4"]
+    assert second["next_after_id"] is None